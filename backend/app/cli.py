@@ -0,0 +1,119 @@
+"""
+Các lệnh quản trị chạy ngoài web server.
+
+Ví dụ:
+    python -m app.cli backfill-sales
+    python -m app.cli rebuild-ratings
+    python -m app.cli rebuild-trending
+    python -m app.cli rebuild-copurchase
+    python -m app.cli import-books books.csv
+    python -m app.cli import-books books.ndjson --format ndjson --dry-run
+    python -m app.cli purge-idempotency-keys
+"""
+import argparse
+import asyncio
+
+from app.core.database import SessionLocal, init_db
+from app.core.file_formats import FORMATS
+from app.services.sales_rollup import rebuild_sales_daily
+from app.services.rating_stats import rebuild_book_rating_stats
+from app.services.trending import rebuild_trending
+from app.services.copurchase import rebuild_copurchase
+from app.services.book_import import import_books
+from app.services.idempotency import purge_expired
+
+# Kích thước mỗi lần đọc file nhập
+IMPORT_CHUNK_SIZE = 64 * 1024
+
+
+async def _backfill_sales(args):
+    await init_db()
+    async with SessionLocal() as db:
+        rows = await rebuild_sales_daily(db)
+    print(f"✅ Đã tính lại sales_daily: {rows} dòng")
+
+
+async def _rebuild_ratings(args):
+    await init_db()
+    async with SessionLocal() as db:
+        rows = await rebuild_book_rating_stats(db)
+    print(f"✅ Đã tính lại book_rating_stats: {rows} sách")
+
+
+async def _rebuild_trending(args):
+    await init_db()
+    async with SessionLocal() as db:
+        lines = await rebuild_trending(db)
+    print(f"✅ Đã tính lại book_trending từ {lines} dòng đơn hàng")
+
+
+async def _rebuild_copurchase(args):
+    await init_db()
+    async with SessionLocal() as db:
+        rows = await rebuild_copurchase(db)
+    print(f"✅ Đã tính lại book_copurchase: {rows} cặp sách")
+
+
+async def _read_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, IMPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def _import_books(args):
+    await init_db()
+    file_format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    async with SessionLocal() as db:
+        report = await import_books(db, _read_chunks(args.path), file_format, args.dry_run)
+    for error in report["errors"]:
+        print(f"  Dòng {error['row']}: {error['error']}")
+    action = "Hợp lệ" if args.dry_run else "Đã nhập"
+    print(f"✅ {action} {report['imported']}/{report['total_rows']} dòng, lỗi {report['failed']} dòng")
+
+
+async def _purge_idempotency_keys(args):
+    await init_db()
+    async with SessionLocal() as db:
+        rows = await purge_expired(db)
+    print(f"✅ Đã xóa {rows} Idempotency-Key hết hạn")
+
+
+def _import_books_arguments(subparser):
+    subparser.add_argument("path", help="File CSV (có dòng tiêu đề) hoặc NDJSON")
+    subparser.add_argument("--format", choices=FORMATS, help="Mặc định đoán theo đuôi file")
+    subparser.add_argument("--dry-run", action="store_true", help="Chỉ kiểm tra, không ghi")
+
+
+COMMANDS = {
+    "backfill-sales": (_backfill_sales, "Tính lại bảng tổng hợp sales_daily từ orders"),
+    "rebuild-ratings": (_rebuild_ratings, "Tính lại bảng tổng hợp book_rating_stats từ reviews"),
+    "rebuild-trending": (_rebuild_trending, "Tính lại xếp hạng bán chạy/xu hướng từ order_details"),
+    "rebuild-copurchase": (_rebuild_copurchase, "Tính lại ma trận sách mua cùng từ các đơn đã hoàn thành"),
+    "import-books": (_import_books, "Nhập sách hàng loạt từ file CSV/NDJSON"),
+    "purge-idempotency-keys": (_purge_idempotency_keys, "Xóa các Idempotency-Key đã hết hạn"),
+}
+
+# Tham số riêng của từng lệnh
+ARGUMENTS = {
+    "import-books": _import_books_arguments,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Book Shop admin commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        if name in ARGUMENTS:
+            ARGUMENTS[name](subparser)
+
+    args = parser.parse_args(argv)
+    handler, _ = COMMANDS[args.command]
+    asyncio.run(handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,42 @@ load_dotenv(dotenv_path=env_path)
 class Settings:
     # Lấy DATABASE_URL từ .env, nếu không có sẽ dùng mặc định
     DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://root@localhost/book_shop")
+    # URL cho async engine (aiomysql), mặc định suy ra từ DATABASE_URL
+    ASYNC_DATABASE_URL = os.getenv(
+        "ASYNC_DATABASE_URL",
+        DATABASE_URL.replace("mysql+pymysql://", "mysql+aiomysql://")
+    )
+    # Replica chỉ đọc (tùy chọn): catalog, review, dashboard, lịch sử đơn đọc từ đây
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+    if DATABASE_REPLICA_URL:
+        DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace("mysql+pymysql://", "mysql+aiomysql://")
+    # Sau khi ghi, client đọc từ primary trong chừng này giây (read-your-writes)
+    READ_AFTER_WRITE_STICKY_SECONDS = float(os.getenv("READ_AFTER_WRITE_STICKY_SECONDS", 5))
+    # Replica trễ quá mốc này (hoặc mất kết nối) thì mọi truy vấn đọc về primary
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+    REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", 5))
+
+    # Pool kết nối (áp dụng cho cả primary và replica, mỗi worker một pool):
+    # số kết nối giữ sẵn, số kết nối vượt mức, số giây chờ lấy kết nối trước khi báo lỗi
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    # Đóng và mở lại kết nối sau chừng này giây (nhỏ hơn wait_timeout của MySQL), -1 để tắt
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    # Kiểm tra kết nối (ping) trước khi dùng để tránh lỗi "MySQL server has gone away"
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+    # Đếm truy vấn theo request (header X-DB-Query-Count, X-DB-Time-Ms) và cảnh báo N+1
+    QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+    # Một dạng câu SQL lặp từ chừng này lần trong một request thì ghi cảnh báo N+1
+    N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 10))
+    # Truy vấn chậm hơn mốc này (ms) được ghi log kèm EXPLAIN (mỗi dạng câu tối đa 1 lần / interval)
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+    SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", 300))
+
+    # Đo latency/status theo route và xuất ở /metrics (định dạng Prometheus)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
     
     # Cấu hình bảo mật
     SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key")
@@ -17,12 +53,68 @@ class Settings:
     # Chuyển đổi sang kiểu int thủ công
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
 
+    # Băm mật khẩu: cost của bcrypt, số luồng băm và số yêu cầu được xếp hàng tối đa
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+
+    # Số ID mỗi worker giữ trước trong bộ nhớ (hi/lo)
+    ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", 50))
+
+    # Thời gian sống của cache bảng tham chiếu (trạng thái, thanh toán, thể loại)
+    REFERENCE_CACHE_TTL_SECONDS = int(os.getenv("REFERENCE_CACHE_TTL_SECONDS", 300))
+
+    # Cache thông tin user đăng nhập (get_current_user): thời gian sống và số user tối đa
+    PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+    PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", 10000))
+    # TTL riêng, ngắn hơn cho admin: hạ quyền/xóa admin chỉ xóa cache của worker xử lý request đó
+    PRINCIPAL_CACHE_ADMIN_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_ADMIN_TTL_SECONDS", 5))
+
+    # Chu kỳ nạp lại chỉ mục tìm kiếm sách trong bộ nhớ (0 = chỉ cập nhật khi admin sửa)
+    SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", 300))
+
+    # Xếp hạng bán chạy có suy giảm theo thời gian (chu kỳ bán rã tính bằng ngày)
+    TRENDING_HOT_HALF_LIFE_DAYS = float(os.getenv("TRENDING_HOT_HALF_LIFE_DAYS", 30))
+    TRENDING_HALF_LIFE_DAYS = float(os.getenv("TRENDING_HALF_LIFE_DAYS", 3))
+    TRENDING_REFRESH_SECONDS = int(os.getenv("TRENDING_REFRESH_SECONDS", 300))
+    # Đơn mới hơn (now - LAG) chưa được tính, tránh bỏ sót đơn commit trễ
+    TRENDING_LAG_SECONDS = int(os.getenv("TRENDING_LAG_SECONDS", 60))
+
+    # Tổng hợp doanh số: đơn hàng chỉ ghi delta, worker gộp vào sales_daily theo chu kỳ / theo lô
+    SALES_ROLLUP_FOLD_SECONDS = float(os.getenv("SALES_ROLLUP_FOLD_SECONDS", 5))
+    SALES_ROLLUP_FOLD_BATCH_SIZE = int(os.getenv("SALES_ROLLUP_FOLD_BATCH_SIZE", 5000))
+
+    # Sách thường được mua cùng: số sách liên quan giữ cho mỗi sách và cache trong bộ nhớ
+    COPURCHASE_TOP_N = int(os.getenv("COPURCHASE_TOP_N", 20))
+    COPURCHASE_CACHE_TTL_SECONDS = int(os.getenv("COPURCHASE_CACHE_TTL_SECONDS", 600))
+    COPURCHASE_CACHE_MAX_SIZE = int(os.getenv("COPURCHASE_CACHE_MAX_SIZE", 20000))
+
+    # Nhập sách hàng loạt: số dòng mỗi lần ghi (một executemany + một commit)
+    BOOK_IMPORT_BATCH_SIZE = int(os.getenv("BOOK_IMPORT_BATCH_SIZE", 1000))
+
+    # Idempotency-Key của POST /api/orders: thời gian lưu kết quả, thời gian chờ yêu cầu trùng
+    # đang xử lý, và sau bao lâu thì coi yêu cầu đang xử lý là đã chết (cho phép chạy lại)
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 10))
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))
+
     # Cấu hình email
     MAIL_USERNAME = os.getenv("MAIL_USERNAME")
     MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
     MAIL_FROM = os.getenv("MAIL_FROM")
     MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
     MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+    MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "true").lower() == "true"
+    MAIL_TIMEOUT = int(os.getenv("MAIL_TIMEOUT", 10))
+
+    # Cấu hình hàng đợi email (outbox)
+    MAIL_OUTBOX_ENABLED = os.getenv("MAIL_OUTBOX_ENABLED", "true").lower() == "true"
+    MAIL_OUTBOX_BATCH_SIZE = int(os.getenv("MAIL_OUTBOX_BATCH_SIZE", 50))
+    MAIL_OUTBOX_POLL_SECONDS = float(os.getenv("MAIL_OUTBOX_POLL_SECONDS", 2))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS", 5))
+    MAIL_OUTBOX_RETRY_SECONDS = int(os.getenv("MAIL_OUTBOX_RETRY_SECONDS", 30))
+    # Thời gian giữ email đã nhận để gửi; worker chết giữa chừng thì email đến hạn lại sau khoảng này
+    MAIL_OUTBOX_LEASE_SECONDS = int(os.getenv("MAIL_OUTBOX_LEASE_SECONDS", 300))
 
 # Khởi tạo object để các file khác sử dụng
 settings = Settings()
\ No newline at end of file
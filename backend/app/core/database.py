@@ -1,22 +1,34 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from .config import settings
+from .pool_metrics import engine_options, instrument
+from .query_stats import instrument_queries
 from app.models.base import Base
 # Đảm bảo các model đã được import để Base nhận diện
-from app.models import User, Book, Category,Order, OrderDetail, PaymentMethod, Review, Discount, DiscountApplication, Contact, OrderStatus
+from app.models import User, Book, Category,Order, OrderDetail, PaymentMethod, Review, Discount, DiscountApplication, Contact, OrderStatus, EmailOutbox, IdSequence, SalesDaily, SalesDailyDelta, BookRatingStats, BookTrending, TrendingState, TrendingCancellation, BookCopurchase, IdempotencyKey
 
-# Tạo Engine kết nối cho MySQL
-engine = create_engine(settings.DATABASE_URL)
+# Tạo Async Engine kết nối cho MySQL (aiomysql) - không chặn event loop
+# Kích thước pool, timeout, recycle, pre-ping lấy từ Settings (DB_POOL_*)
+engine = create_async_engine(settings.ASYNC_DATABASE_URL, **engine_options(settings.ASYNC_DATABASE_URL))
+instrument(engine, "primary")
+instrument_queries(engine)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: tránh lazy load ngầm sau commit (không hỗ trợ trong AsyncSession)
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
-def init_db():
+async def init_db():
     # Lệnh này sẽ tự động tạo các bảng trong MySQL nếu chưa có
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def close_db():
+    # Đóng các kết nối đang giữ trong pool khi tắt server
+    await engine.dispose()
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -1,19 +1,21 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Optional
+import time
 
 from app.core.database import get_db
 from app.core.security import decode_access_token
+from app.core.principal_cache import Principal, principal_cache
 from app.models.user import User
 
 security = HTTPBearer(auto_error=False)
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
 
     if not credentials:
         raise HTTPException(
@@ -39,11 +41,36 @@ async def get_current_user(
             detail="Token không hợp lệ",
         )
 
-    stmt = select(User).where(User.user_id == user_id)
-    result = db.execute(stmt)
-    user = result.scalar_one_or_none()
+    principal = principal_cache.get(user_id)
+    if principal:
+        return principal
+
+    started = time.perf_counter()
+    stmt = select(User.user_id, User.role, User.full_name, User.email).where(User.user_id == user_id)
+    row = (await db.execute(stmt)).first()
+
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User không tồn tại",
+        )
+
+    principal = Principal(user_id=row.user_id, role=row.role, full_name=row.full_name, email=row.email)
+    principal_cache.put(principal, time.perf_counter() - started)
+    return principal
+
+
+async def get_current_user_record(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Bản ghi User đầy đủ (phone, address, ...) cho các endpoint cần đọc/sửa hồ sơ"""
+    user = (await db.execute(
+        select(User).where(User.user_id == current_user.user_id)
+    )).scalar_one_or_none()
 
     if not user:
+        principal_cache.invalidate(current_user.user_id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User không tồn tại",
@@ -52,14 +79,16 @@ async def get_current_user(
     return user
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     return current_user
 
 
 async def require_admin(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
+    # current_user có thể đến từ principal_cache. Hạ quyền/xóa admin chỉ xóa cache của worker
+    # xử lý request đó; worker khác còn nhận quyền admin cũ tối đa PRINCIPAL_CACHE_ADMIN_TTL_SECONDS (mặc định 5 giây)
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -69,8 +98,8 @@ async def require_admin(
 
 
 async def require_customer(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     if current_user.role != "customer":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,13 @@
+from typing import Literal, get_args
+
+# Định dạng file nhập/xuất dữ liệu. Dùng làm kiểu tham số để FastAPI từ chối giá trị khác với 422
+# (enum= của Query chỉ ghi vào tài liệu OpenAPI, không kiểm tra giá trị)
+FileFormat = Literal["csv", "ndjson"]
+
+FORMATS = get_args(FileFormat)
+
+
+def check_format(file_format: str):
+    """Báo lỗi với định dạng không hỗ trợ (gọi từ service, không mặc định sang CSV)"""
+    if file_format not in FORMATS:
+        raise ValueError(f"Định dạng không hỗ trợ: {file_format} (hỗ trợ: {', '.join(FORMATS)})")
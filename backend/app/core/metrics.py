@@ -0,0 +1,217 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Mốc (giây) mặc định cho histogram thời gian xử lý request
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Mốc (byte) cho histogram kích thước response
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng; giá trị nhãn truyền theo thứ tự labelnames"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Histogram kiểu Prometheus: đếm theo từng mốc, khi xuất mới cộng dồn"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # nhãn -> [số lần theo từng mốc (+Inf ở cuối), tổng]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Danh sách metric của tiến trình và các collector (hàm đọc số liệu từ cache/pool lúc scrape).
+    Mỗi worker uvicorn có registry riêng: Prometheus scrape từng worker hoặc chạy 1 worker mỗi container.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, func: Callable[[], Iterable[str]]):
+        """Đăng ký hàm trả về các dòng metric (định dạng text) được tính lúc scrape"""
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+def sample(name: str, documentation: str, type_name: str, values: Dict[Tuple[Tuple[str, str], ...], float]) -> List[str]:
+    """Các dòng của một metric tính lúc scrape; values: ((tên nhãn, giá trị), ...) -> số"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {type_name}"]
+    for labels, value in values.items():
+        names = tuple(label for label, _ in labels)
+        label_values = tuple(label_value for _, label_value in labels)
+        lines.append(f"{name}{_labels(names, label_values)} {_number(value)}")
+    return lines
+
+
+# Registry dùng chung cho toàn ứng dụng
+registry = Registry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "Số request HTTP theo route và mã trạng thái", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "Thời gian xử lý request HTTP (giây)", ("method", "route")
+)
+http_response_size_bytes = registry.histogram(
+    "http_response_size_bytes", "Kích thước body response (byte)", ("method", "route"), SIZE_BUCKETS
+)
+http_requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "Số request HTTP đang xử lý", ("method",)
+)
+
+orders_created_total = registry.counter("orders_created_total", "Số đơn hàng được tạo")
+emails_sent_total = registry.counter("emails_sent_total", "Số email gửi thành công từ outbox")
+emails_failed_total = registry.counter(
+    "emails_failed_total", "Số lần gửi email lỗi (final=true khi đã hết số lần thử)", ("final",)
+)
+
+
+def _route_template(scope) -> str:
+    # Router của Starlette ghi route khớp vào scope; không khớp thì gộp chung để tránh bùng nổ nhãn
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware đo từng request HTTP theo route template (vd /api/books/{book_id}):
+    thời gian xử lý, mã trạng thái, kích thước response, số request đang xử lý.
+    Viết dạng ASGI thuần (không qua BaseHTTPMiddleware) để chi phí mỗi request chỉ vài micro giây.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_progress.dec(method)
+            route = _route_template(scope)
+            http_requests_total.inc(method, route, str(status_code))
+            http_request_duration_seconds.observe(time.perf_counter() - started, method, route)
+            http_response_size_bytes.observe(size, method, route)
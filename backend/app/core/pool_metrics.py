@@ -0,0 +1,177 @@
+import time
+from bisect import bisect_left
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .config import settings
+from .metrics import registry, sample
+
+# Mốc (giây) của histogram thời gian chờ lấy kết nối từ pool
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolMetrics:
+    """
+    Số liệu của một pool kết nối:
+    - Histogram thời gian chờ checkout (gồm cả thời gian mở kết nối mới khi pool chưa đầy)
+    - Số lần hết thời gian chờ (pool cạn), số kết nối mở mới, số kết nối bị hủy (ping lỗi, recycle)
+    Gauge (đang dùng, vượt mức, rảnh) đọc trực tiếp từ pool khi cần.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool: Optional["InstrumentedPool"] = None
+        self.bucket_counts = [0] * (len(CHECKOUT_WAIT_BUCKETS) + 1)
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def observe_wait(self, seconds: float):
+        self.bucket_counts[bisect_left(CHECKOUT_WAIT_BUCKETS, seconds)] += 1
+        self.wait_count += 1
+        self.wait_sum += seconds
+        if seconds > self.wait_max:
+            self.wait_max = seconds
+
+    def histogram(self) -> Dict[str, int]:
+        """Số lần checkout theo mốc, cộng dồn như histogram Prometheus ("+Inf" = tổng)"""
+        result = {}
+        total = 0
+        for bound, count in zip(CHECKOUT_WAIT_BUCKETS, self.bucket_counts):
+            total += count
+            result[str(bound)] = total
+        result["+Inf"] = total + self.bucket_counts[-1]
+        return result
+
+    def stats(self) -> dict:
+        pool = self.pool
+        checked_out = pool.checkedout() if pool else 0
+        size = pool.size() if pool else 0
+        max_overflow = pool._max_overflow if pool else 0
+        capacity = size + max(max_overflow, 0)
+        return {
+            "pool_size": size,
+            "max_overflow": max_overflow,
+            "timeout_seconds": pool.timeout() if pool else None,
+            "checked_out": checked_out,
+            "checked_in": pool.checkedin() if pool else 0,
+            # Số kết nối đang mở vượt pool_size (âm nghĩa là pool chưa mở đủ pool_size kết nối)
+            "overflow": pool.overflow() if pool else 0,
+            "utilization": round(checked_out / capacity, 3) if capacity else None,
+            "checkouts": self.wait_count,
+            "checkout_wait_avg_ms": round(self.wait_sum / self.wait_count * 1000, 3) if self.wait_count else 0.0,
+            "checkout_wait_max_ms": round(self.wait_max * 1000, 3),
+            "checkout_wait_histogram": self.histogram(),
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+        }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool có đo thời gian chờ checkout; metrics được gắn sau khi tạo engine"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        if self.metrics is not None:
+            self.metrics.observe_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() tạo pool mới: giữ nguyên số liệu đã đếm
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+# Tên engine ("primary", "replica") -> số liệu pool
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def engine_options(url: str) -> dict:
+    """Tham số pool cho create_async_engine theo Settings"""
+    if ":memory:" in url:
+        # SQLite trong bộ nhớ: mỗi kết nối là một DB riêng, để SQLAlchemy tự chọn pool
+        return {}
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def instrument(engine, name: str) -> PoolMetrics:
+    """Gắn số liệu cho pool của engine (đếm kết nối mở mới / bị hủy qua pool events)"""
+    metrics = PoolMetrics(name)
+    pool = engine.sync_engine.pool
+    if isinstance(pool, InstrumentedPool):
+        pool.metrics = metrics
+        metrics.pool = pool
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(engine.sync_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    pool_metrics[name] = metrics
+    return metrics
+
+
+def pool_stats() -> dict:
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
+
+
+@registry.collector
+def _collect() -> list:
+    """Gauge và histogram của các pool cho /metrics"""
+    gauges = {
+        "db_pool_size": ("Số kết nối giữ sẵn của pool", lambda m: m.pool.size()),
+        "db_pool_checked_out": ("Số kết nối đang được dùng", lambda m: m.pool.checkedout()),
+        "db_pool_checked_in": ("Số kết nối rảnh trong pool", lambda m: m.pool.checkedin()),
+        "db_pool_overflow": ("Số kết nối mở vượt pool_size", lambda m: m.pool.overflow()),
+    }
+    active = {name: metrics for name, metrics in pool_metrics.items() if metrics.pool is not None}
+    lines = []
+    for metric, (documentation, read) in gauges.items():
+        lines += sample(metric, documentation, "gauge", {(("pool", name),): read(m) for name, m in active.items()})
+    for metric, documentation, attribute in (
+        ("db_pool_checkout_timeouts_total", "Số lần hết thời gian chờ lấy kết nối", "timeouts"),
+        ("db_pool_connects_total", "Số kết nối DB được mở mới", "connects"),
+        ("db_pool_invalidations_total", "Số kết nối bị hủy (ping lỗi, lỗi kết nối)", "invalidations"),
+    ):
+        lines += sample(metric, documentation, "counter", {
+            (("pool", name),): getattr(m, attribute) for name, m in pool_metrics.items()
+        })
+
+    lines += [
+        "# HELP db_pool_checkout_wait_seconds Thời gian chờ lấy kết nối từ pool (giây)",
+        "# TYPE db_pool_checkout_wait_seconds histogram",
+    ]
+    for name, m in pool_metrics.items():
+        for bound, count in m.histogram().items():
+            lines.append(f'db_pool_checkout_wait_seconds_bucket{{pool="{name}",le="{bound}"}} {count}')
+        lines.append(f'db_pool_checkout_wait_seconds_sum{{pool="{name}"}} {m.wait_sum!r}')
+        lines.append(f'db_pool_checkout_wait_seconds_count{{pool="{name}"}} {m.wait_count}')
+    return lines
@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Thông tin tối thiểu của user đăng nhập mà các handler cần"""
+    user_id: str
+    role: str
+    full_name: str
+    email: str
+
+
+class PrincipalCache:
+    """
+    Cache LRU có TTL cho get_current_user, khóa theo user_id.
+    - Giới hạn số phần tử (bỏ phần tử ít dùng nhất khi đầy)
+    - Bị xóa khi user đổi thông tin hoặc bị xóa (invalidate)
+    - TTL giới hạn độ trễ giữa các worker uvicorn khác nhau: invalidate chỉ xóa cache của tiến trình
+      hiện tại, worker khác vẫn dùng bản cũ tới khi hết TTL. Principal của admin dùng TTL ngắn hơn
+      (admin_ttl_seconds) để hạ quyền hoặc xóa admin có hiệu lực nhanh trên mọi worker.
+    - Đếm hit/miss và thời gian truy vấn DB khi miss để đo hiệu quả
+    """
+
+    def __init__(self, ttl_seconds: int = None, max_size: int = None, admin_ttl_seconds: int = None):
+        self._ttl = ttl_seconds if ttl_seconds is not None else settings.PRINCIPAL_CACHE_TTL_SECONDS
+        self._admin_ttl = (
+            admin_ttl_seconds if admin_ttl_seconds is not None else settings.PRINCIPAL_CACHE_ADMIN_TTL_SECONDS
+        )
+        self._max_size = max_size or settings.PRINCIPAL_CACHE_MAX_SIZE
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._load_seconds = 0.0
+
+    def get(self, user_id: str) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            principal, expires_at = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return principal
+            del self._entries[user_id]
+        self.misses += 1
+        return None
+
+    def put(self, principal: Principal, load_seconds: float = 0.0):
+        self._load_seconds += load_seconds
+        ttl = self._admin_ttl if principal.role == "admin" else self._ttl
+        self._entries[principal.user_id] = (principal, time.monotonic() + ttl)
+        self._entries.move_to_end(principal.user_id)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str = None):
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        avg_load_ms = (self._load_seconds / self.misses * 1000) if self.misses else 0.0
+        return {
+            "size": len(self._entries),
+            "max_size": self._max_size,
+            "ttl_seconds": self._ttl,
+            "admin_ttl_seconds": self._admin_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_load_ms": round(avg_load_ms, 3),
+            # Thời gian truy vấn DB ước tính đã tiết kiệm nhờ các lần hit
+            "saved_ms": round(self.hits * avg_load_ms, 1),
+        }
+
+
+# Cache dùng chung cho toàn ứng dụng
+principal_cache = PrincipalCache()
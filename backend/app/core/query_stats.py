@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s)"
+_PLACEHOLDER_LIST = re.compile(rf"{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+")
+_NUMBER = re.compile(r"\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+db_slow_queries_total = registry.counter("db_slow_queries_total", "Số truy vấn chậm hơn SLOW_QUERY_MS")
+
+# Câu EXPLAIN theo dialect (SQLite khi chạy thử không có EXPLAIN kiểu MySQL)
+_EXPLAIN_PREFIX = {"mysql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Dạng chuẩn của câu SQL: gộp danh sách tham số IN (...) và số cố định để đếm truy vấn lặp"""
+    shape = _PLACEHOLDER_LIST.sub("?+", statement)
+    shape = _NUMBER.sub("N", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+class QueryStats:
+    """Số truy vấn, tổng thời gian DB và số lần lặp của từng dạng câu SQL trong một request"""
+
+    def __init__(self, parent: "QueryStats" = None):
+        # parent: thống kê bao ngoài (vd count_queries quanh một request) cũng được cộng dồn
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.slow = 0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+        if self.parent is not None:
+            self.parent.record(statement, seconds)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Các dạng câu SQL chạy từ threshold lần trở lên (dấu hiệu N+1)"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def assert_budget(self, max_queries: int):
+        """Dùng khi kiểm thử: báo lỗi kèm các câu lặp nhiều nhất nếu vượt số truy vấn cho phép"""
+        if self.count > max_queries:
+            top = "\n".join(f"  {count}x {shape[:200]}" for shape, count in self.shapes.most_common(5))
+            raise AssertionError(f"{self.count} truy vấn, vượt giới hạn {max_queries}:\n{top}")
+
+
+# Thống kê của request hiện tại (None khi chạy ngoài request, vd worker nền)
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def count_queries():
+    """
+    Đếm truy vấn trong khối with (script, kiểm thử):
+        with count_queries() as stats:
+            await client.get("/api/books/")
+        stats.assert_budget(3)
+    """
+    stats = QueryStats(_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class SlowQueryLog:
+    """
+    Ghi log truy vấn chậm hơn SLOW_QUERY_MS kèm kế hoạch thực thi:
+    - EXPLAIN chạy trên kết nối riêng trong task nền (không chen vào kết nối đang đọc kết quả)
+    - Mỗi dạng câu chỉ EXPLAIN tối đa một lần trong SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+    Không ghi tham số vào log (có thể chứa dữ liệu người dùng).
+    """
+
+    # Số dạng câu được nhớ mốc EXPLAIN gần nhất
+    _MAX_SHAPES = 1000
+
+    def __init__(self):
+        self._engines: Dict[object, object] = {}
+        self._explained_at: Dict[str, float] = {}
+        self._tasks = set()
+        self.slow_queries = 0
+
+    def register(self, engine):
+        self._engines[engine.sync_engine] = engine
+
+    def record(self, sync_engine, statement: str, parameters, seconds: float, executemany: bool):
+        self.slow_queries += 1
+        db_slow_queries_total.inc()
+        prefix = _EXPLAIN_PREFIX.get(sync_engine.dialect.name)
+        shape = statement_shape(statement)
+        now = time.monotonic()
+        can_explain = (
+            settings.SLOW_QUERY_EXPLAIN
+            and prefix is not None
+            and not executemany
+            and statement.lstrip()[:6].upper() == "SELECT"
+            and now - self._explained_at.get(shape, float("-inf")) >= settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+        )
+        engine = self._engines.get(sync_engine)
+        if not can_explain or engine is None:
+            logger.warning(f"Truy vấn chậm {seconds * 1000:.1f} ms: {shape[:1000]}")
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logger.warning(f"Truy vấn chậm {seconds * 1000:.1f} ms: {shape[:1000]}")
+            return
+
+        if len(self._explained_at) >= self._MAX_SHAPES:
+            self._explained_at.clear()
+        self._explained_at[shape] = now
+        task = loop.create_task(self._explain(engine, prefix, statement, parameters, seconds))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, engine, prefix: str, statement: str, parameters, seconds: float):
+        try:
+            async with engine.connect() as conn:
+                rows = (await conn.exec_driver_sql(prefix + statement, parameters or ())).all()
+            plan = "\n".join("  " + " | ".join(str(value) for value in row) for row in rows)
+        except Exception as e:
+            plan = f"  (không lấy được EXPLAIN: {e})"
+        logger.warning(f"Truy vấn chậm {seconds * 1000:.1f} ms: {statement_shape(statement)[:1000]}\n{plan}")
+
+
+# Log truy vấn chậm dùng chung cho toàn ứng dụng
+slow_query_log = SlowQueryLog()
+
+
+def instrument_queries(engine):
+    """Gắn event đo thời gian từng truy vấn của engine (đếm theo request + log truy vấn chậm)"""
+    slow_query_log.register(engine)
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None or statement.startswith("EXPLAIN"):
+            return
+        seconds = time.perf_counter() - started
+        stats = _current.get()
+        if stats is not None:
+            stats.record(statement, seconds)
+        if seconds * 1000 >= settings.SLOW_QUERY_MS:
+            if stats is not None:
+                stats.slow += 1
+            slow_query_log.record(sync_engine, statement, parameters, seconds, executemany)
+
+
+def begin_request() -> Tuple[QueryStats, object]:
+    """Bắt đầu đếm cho một request; trả về (stats, token để end_request)"""
+    stats = QueryStats(_current.get())
+    return stats, _current.set(stats)
+
+
+def end_request(token, stats: QueryStats, method: str, path: str):
+    """Kết thúc đếm: cảnh báo các câu SQL lặp nhiều lần trong cùng request (N+1)"""
+    _current.reset(token)
+    for shape, count in stats.repeated(settings.N_PLUS_ONE_THRESHOLD):
+        logger.warning(
+            f"Nghi N+1 ở {method} {path}: câu SQL lặp {count} lần "
+            f"({stats.count} truy vấn, {stats.seconds * 1000:.1f} ms DB): {shape[:300]}"
+        )
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from .config import settings
+from .database import SessionLocal
+from .pool_metrics import engine_options, instrument
+from .query_stats import instrument_queries
+from .security import decode_access_token
+
+logger = logging.getLogger(__name__)
+
+# Engine đọc (replica), không cấu hình thì mọi truy vấn đọc đi vào primary
+replica_engine = (
+    create_async_engine(settings.DATABASE_REPLICA_URL, **engine_options(settings.DATABASE_REPLICA_URL))
+    if settings.DATABASE_REPLICA_URL else None
+)
+if replica_engine is not None:
+    instrument(replica_engine, "replica")
+    instrument_queries(replica_engine)
+
+# Số client (user/IP) tối đa được nhớ mốc ghi gần nhất
+_MAX_STICKY_CLIENTS = 100000
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def client_key(request: Request) -> str:
+    """user_id trong token (không truy vấn DB), không đăng nhập thì dùng IP"""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        payload = decode_access_token(authorization[7:])
+        if payload and payload.get("user_id"):
+            return f"user:{payload['user_id']}"
+    return f"ip:{request.client.host if request.client else ''}"
+
+
+class ReplicaRouter:
+    """
+    Chọn primary hay replica cho các endpoint chỉ đọc:
+    - Client vừa ghi (POST/PUT/PATCH/DELETE thành công) đọc từ primary trong
+      READ_AFTER_WRITE_STICKY_SECONDS giây để thấy ngay dữ liệu mình vừa ghi
+    - Replica trễ hơn REPLICA_MAX_LAG_SECONDS hoặc không kết nối được thì mọi truy vấn đọc về primary
+    Mốc ghi được giữ trong tiến trình; với nhiều worker, request đọc có thể rơi vào worker khác
+    nên thời gian dính nên lớn hơn độ trễ replica thông thường.
+    """
+
+    def __init__(self, engine=None, sticky_seconds: float = None, max_lag_seconds: float = None):
+        self._engine = engine
+        self._read_sessions = async_sessionmaker(
+            bind=engine,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        ) if engine is not None else SessionLocal
+        self._sticky_seconds = (
+            sticky_seconds if sticky_seconds is not None else settings.READ_AFTER_WRITE_STICKY_SECONDS
+        )
+        self._max_lag = max_lag_seconds if max_lag_seconds is not None else settings.REPLICA_MAX_LAG_SECONDS
+        self._sticky: "OrderedDict[str, float]" = OrderedDict()
+        self.healthy = engine is not None
+        self.lag_seconds: Optional[float] = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._engine is not None
+
+    def mark_write(self, key: str):
+        if not self.enabled or self._sticky_seconds <= 0:
+            return
+        self._sticky[key] = time.monotonic() + self._sticky_seconds
+        self._sticky.move_to_end(key)
+        while len(self._sticky) > _MAX_STICKY_CLIENTS:
+            self._sticky.popitem(last=False)
+
+    def _is_sticky(self, key: str) -> bool:
+        until = self._sticky.get(key)
+        if until is None:
+            return False
+        if time.monotonic() < until:
+            return True
+        del self._sticky[key]
+        return False
+
+    def session_factory(self, key: str = None):
+        """Session factory cho một truy vấn đọc (key = client_key của request, nếu có)"""
+        if self.enabled and self.healthy and (key is None or not self._is_sticky(key)):
+            self.replica_reads += 1
+            return self._read_sessions
+        self.primary_reads += 1
+        return SessionLocal
+
+    async def _measure_lag(self) -> Optional[float]:
+        """Độ trễ replica (giây); None nếu replica không chạy replication"""
+        async with self._engine.connect() as conn:
+            if conn.dialect.name != "mysql":
+                # Không có khái niệm replication (vd 2 file SQLite khi chạy thử): chỉ kiểm tra kết nối
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+            for statement, column in (
+                ("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                ("SHOW SLAVE STATUS", "Seconds_Behind_Master"),
+            ):
+                try:
+                    row = (await conn.execute(text(statement))).mappings().first()
+                except Exception:
+                    continue
+                if row is None:
+                    # Không phải replica (vd cùng server với primary khi phát triển)
+                    return 0.0
+                lag = row.get(column)
+                return float(lag) if lag is not None else None
+            return 0.0
+
+    async def check(self):
+        try:
+            lag = await self._measure_lag()
+        except Exception as e:
+            lag = None
+            logger.error(f"Không kết nối được replica: {e}")
+        healthy = lag is not None and lag <= self._max_lag
+        if healthy != self.healthy:
+            logger.warning(
+                "Replica hoạt động lại, đọc từ replica" if healthy
+                else f"Replica trễ {lag if lag is not None else '?'} giây, chuyển đọc về primary"
+            )
+        self.lag_seconds = lag
+        self.healthy = healthy
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._engine is not None:
+            await self._engine.dispose()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            await self.check()
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.REPLICA_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": self._max_lag,
+            "sticky_seconds": self._sticky_seconds,
+            "sticky_clients": len(self._sticky),
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+        }
+
+
+# Bộ định tuyến dùng chung cho toàn ứng dụng
+replica_router = ReplicaRouter(replica_engine)
+
+
+def get_read_session_factory(request: Request):
+    """
+    Session factory cho truy vấn đọc của request: replica nếu có và đủ mới,
+    primary nếu replica trễ hoặc client vừa ghi. Dùng trực tiếp khi session phải sống lâu hơn
+    dependency (vd response stream)
+    """
+    key = client_key(request) if replica_router.enabled else None
+    return replica_router.session_factory(key)
+
+
+async def get_read_db(request: Request):
+    """Session cho endpoint chỉ đọc: replica nếu có và đủ mới, ngược lại primary"""
+    async with get_read_session_factory(request)() as db:
+        yield db
@@ -0,0 +1,83 @@
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def upsert_increment(db: AsyncSession, model, keys: Dict[str, Any], deltas: Dict[str, Any]):
+    """
+    Cộng dồn các cột đếm của một dòng tổng hợp trong một câu lệnh:
+    chưa có dòng thì INSERT (keys + deltas), đã có thì cột = cột + delta.
+    """
+    values = {**keys, **deltas}
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql_insert(model).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            **{name: getattr(model, name) + stmt.inserted[name] for name in deltas}
+        )
+    else:
+        stmt = sqlite_insert(model).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[getattr(model, name) for name in keys],
+            set_={name: getattr(model, name) + stmt.excluded[name] for name in deltas}
+        )
+    await db.execute(stmt)
+
+
+async def upsert_increment_rows(
+    db: AsyncSession,
+    model,
+    rows: List[Dict[str, Any]],
+    keys: Iterable[str],
+    delta_columns: Iterable[str]
+):
+    """
+    Như upsert_increment cho nhiều dòng trong một câu lệnh executemany.
+    Người gọi nên sắp xếp rows theo khóa để các transaction khóa dòng cùng thứ tự (tránh deadlock).
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql_insert(model)
+        stmt = stmt.on_duplicate_key_update(
+            {name: getattr(model, name) + stmt.inserted[name] for name in delta_columns}
+        )
+    else:
+        stmt = sqlite_insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[getattr(model, name) for name in keys],
+            set_={name: getattr(model, name) + stmt.excluded[name] for name in delta_columns}
+        )
+    await db.execute(stmt, rows)
+
+
+async def upsert_rows(
+    db: AsyncSession,
+    model,
+    rows: List[Dict[str, Any]],
+    keys: Iterable[str],
+    update_columns: Iterable[str]
+):
+    """
+    Ghi nhiều dòng bằng một câu lệnh executemany: dòng mới thì INSERT,
+    trùng khóa thì ghi đè update_columns bằng giá trị mới. Các dòng phải có cùng tập cột.
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql_insert(model)
+        stmt = stmt.on_duplicate_key_update({name: stmt.inserted[name] for name in update_columns})
+    else:
+        stmt = sqlite_insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[getattr(model, name) for name in keys],
+            set_={name: stmt.excluded[name] for name in update_columns}
+        )
+    await db.execute(stmt, rows)
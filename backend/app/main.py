@@ -1,8 +1,22 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from app.core.database import get_db, init_db
+from app.core.database import get_db, init_db, close_db
+from app.core.config import settings
+from app.services.email_outbox import outbox_worker
+from app.services.reference_cache import reference_cache
+from app.services.book_search import book_search_index
+from app.services.trending import trending_worker
+from app.services.sales_rollup import sales_rollup_worker
+from app.core.principal_cache import principal_cache
+from app.core.security import password_hasher
+from app.core.replica import replica_router, client_key, SAFE_METHODS
+from app.core.pool_metrics import pool_stats
+from app.core import query_stats
+from app.core.metrics import registry, sample, MetricsMiddleware, CONTENT_TYPE
+from app.services.copurchase import related_books_cache
 from app.routers.user import router as user_router
 from app.routers.book import router as book_router
 from app.routers.book_admin import router as book_admin_router
@@ -12,6 +26,7 @@ from app.routers.user_admin  import router as user_admin_router  # ← THÊM DÒ
 from app.routers.order import router as order_router
 from app.routers.review import router as review_router
 from app.routers.dashboard import router as dashboard_router
+from app.routers.export import router as export_router
 
 app = FastAPI(
     title="Book Shop API",
@@ -29,15 +44,90 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "X-DB-Query-Count", "X-DB-Time-Ms"],
 )
 
+@app.middleware("http")
+async def track_writes(request: Request, call_next):
+    """Ghi nhận client vừa ghi để các lần đọc ngay sau đó đi vào primary (read-your-writes)"""
+    response = await call_next(request)
+    if replica_router.enabled and request.method not in SAFE_METHODS and response.status_code < 400:
+        replica_router.mark_write(client_key(request))
+    return response
+
+@app.middleware("http")
+async def count_queries(request: Request, call_next):
+    """Đếm số truy vấn và thời gian DB của request, cảnh báo câu SQL lặp nhiều lần (N+1)"""
+    if not settings.QUERY_STATS_ENABLED:
+        return await call_next(request)
+    stats, token = query_stats.begin_request()
+    try:
+        response = await call_next(request)
+    finally:
+        query_stats.end_request(token, stats, request.method, request.url.path)
+    # Response dạng stream (export) còn truy vấn sau thời điểm này, header chỉ tính phần trước đó
+    response.headers["X-DB-Query-Count"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.1f}"
+    return response
+
+# Thêm sau cùng nên bọc ngoài mọi middleware khác: đo cả thời gian của chúng
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+@registry.collector
+def _service_metrics():
+    """Tỉ lệ cache hit và trạng thái replica, đọc lúc Prometheus scrape"""
+    caches = {
+        "principal": principal_cache,
+        "reference": reference_cache,
+        "related_books": related_books_cache,
+    }
+    lines = []
+    lines += sample("cache_hits_total", "Số lần đọc trúng cache", "counter",
+                    {(("cache", name),): cache.hits for name, cache in caches.items()})
+    lines += sample("cache_misses_total", "Số lần đọc trượt cache", "counter",
+                    {(("cache", name),): cache.misses for name, cache in caches.items()})
+    lines += sample("cache_hit_ratio", "Tỉ lệ đọc trúng cache từ khi khởi động", "gauge", {
+        (("cache", name),): cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0.0
+        for name, cache in caches.items()
+    })
+    if replica_router.enabled:
+        lines += sample("replica_healthy", "Replica đủ mới để phục vụ đọc (1/0)", "gauge",
+                        {(): int(replica_router.healthy)})
+        if replica_router.lag_seconds is not None:
+            lines += sample("replica_lag_seconds", "Độ trễ replica (giây)", "gauge",
+                            {(): replica_router.lag_seconds})
+        lines += sample("replica_reads_total", "Số truy vấn đọc theo nơi phục vụ", "counter", {
+            (("target", "replica"),): replica_router.replica_reads,
+            (("target", "primary"),): replica_router.primary_reads,
+        })
+    return lines
+
 @app.on_event("startup")
-def on_startup():
-    init_db()
+async def on_startup():
+    await init_db()
     print("✅ Database tables created successfully!")
+    await reference_cache.warm()
+    book_search_index.start()
+    trending_worker.start()
+    sales_rollup_worker.start()
+    replica_router.start()
+    if settings.MAIL_OUTBOX_ENABLED:
+        outbox_worker.start()
+        print("📧 Email outbox worker started")
     print("🚀 Server is running on http://127.0.0.1:8000")
     print("📚 API Docs: http://127.0.0.1:8000/docs")
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await outbox_worker.stop()
+    await book_search_index.stop()
+    await trending_worker.stop()
+    await sales_rollup_worker.stop()
+    await replica_router.stop()
+    password_hasher.shutdown()
+    await close_db()
+
 # Include routers
 app.include_router(user_router, prefix="/api")
 app.include_router(book_router, prefix="/api")
@@ -48,6 +138,7 @@ app.include_router(user_admin_router, prefix="/api")  # ← THÊM DÒNG NÀY
 app.include_router(order_router, prefix="/api")
 app.include_router(review_router, prefix="/api")
 app.include_router(dashboard_router, prefix="/api")
+app.include_router(export_router, prefix="/api")
 @app.get("/", tags=["Root"])
 def root():
     return {
@@ -57,10 +148,10 @@ def root():
     }
 
 @app.get("/test-db", tags=["Health"])
-def test_db(db: Session = Depends(get_db)):
+async def test_db(db: AsyncSession = Depends(get_db)):
     """Test database connection"""
     try:
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {"status": "success", "message": "✅ MySQL connected!"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -72,4 +163,24 @@ def health_check():
         "status": "healthy",
         "service": "Book Shop API",
         "version": "1.0.0"
-    }
\ No newline at end of file
+    }
+
+@app.get("/health/principal-cache", tags=["Health"])
+def principal_cache_stats():
+    """Thống kê cache user đăng nhập (hit rate, thời gian DB tiết kiệm được)"""
+    return principal_cache.stats()
+
+@app.get("/health/replica", tags=["Health"])
+def replica_stats():
+    """Trạng thái replica đọc (độ trễ, số truy vấn đọc vào replica/primary)"""
+    return replica_router.stats()
+
+@app.get("/health/pool", tags=["Health"])
+def pool_health():
+    """Pool kết nối DB: số kết nối đang dùng/vượt mức, histogram thời gian chờ checkout, số lần timeout"""
+    return pool_stats()
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+def metrics():
+    """Số liệu định dạng Prometheus (theo từng worker)"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
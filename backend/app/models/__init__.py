@@ -10,4 +10,14 @@ from .review import Review
 from .favorite import Favorite
 from .discount import Discount
 from .discount_application import DiscountApplication
-from .contact import Contact
\ No newline at end of file
+from .contact import Contact
+from .email_outbox import EmailOutbox
+from .id_sequence import IdSequence
+from .sales_daily import SalesDaily
+from .book_rating_stats import BookRatingStats
+from .book_trending import BookTrending
+from .trending_state import TrendingState
+from .book_copurchase import BookCopurchase
+from .idempotency_key import IdempotencyKey
+from .sales_daily_delta import SalesDailyDelta
+from .trending_cancellation import TrendingCancellation
\ No newline at end of file
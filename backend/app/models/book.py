@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, CheckConstraint, Numeric
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, CheckConstraint, Numeric, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -24,6 +24,8 @@ class Book(Base):
         CheckConstraint('price >= 0', name='check_price'),
         CheckConstraint('stock_quantity >= 0', name='check_stock'),
         CheckConstraint('sold_quantity >= 0', name='check_sold'),
+        # Danh sách sách admin sắp xếp theo ngày tạo
+        Index('ix_books_created_at', 'created_at', 'book_id'),
     )
     
     # Relationships
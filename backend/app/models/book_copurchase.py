@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from .base import Base
+
+class BookCopurchase(Base):
+    __tablename__ = "book_copurchase"
+    
+    # Ma trận đồng mua dạng thưa: số đơn hoàn thành có cả book_id và related_book_id.
+    # Lưu cả hai chiều (a, b) và (b, a) để lấy sách liên quan chỉ bằng một range scan
+    book_id = Column(String(10), ForeignKey("books.book_id", ondelete="CASCADE"), primary_key=True)
+    related_book_id = Column(String(10), ForeignKey("books.book_id", ondelete="CASCADE"), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('ix_book_copurchase_rank', 'book_id', 'order_count'),
+    )
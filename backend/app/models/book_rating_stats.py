@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from .base import Base
+
+class BookRatingStats(Base):
+    __tablename__ = "book_rating_stats"
+    
+    # Tổng hợp đánh giá của từng sách, cập nhật cùng transaction với reviews
+    book_id = Column(String(10), ForeignKey("books.book_id", ondelete="CASCADE"), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    star_1 = Column(Integer, nullable=False, default=0)
+    star_2 = Column(Integer, nullable=False, default=0)
+    star_3 = Column(Integer, nullable=False, default=0)
+    star_4 = Column(Integer, nullable=False, default=0)
+    star_5 = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, Double, ForeignKey, Index
+from .base import Base
+
+class BookTrending(Base):
+    __tablename__ = "book_trending"
+    
+    # Tốc độ bán có suy giảm theo thời gian, quy về mốc epoch trong trending_state:
+    # điểm = Σ số lượng * exp(λ * (thời điểm đặt - epoch)), nên thứ hạng không đổi theo thời gian
+    # và chỉ cần cộng thêm phần đơn mới, không phải giảm điểm toàn bảng.
+    # Double (DOUBLE trên MySQL, không phải FLOAT 4 byte): điểm được cộng/trừ dồn nhiều lần
+    book_id = Column(String(10), ForeignKey("books.book_id", ondelete="CASCADE"), primary_key=True)
+    hot_score = Column(Double, nullable=False, default=0)    # chu kỳ bán rã dài -> "Sách hot"
+    trend_score = Column(Double, nullable=False, default=0)  # chu kỳ bán rã ngắn -> "Xu hướng"
+    
+    __table_args__ = (
+        Index('ix_book_trending_hot', 'hot_score', 'book_id'),
+        Index('ix_book_trending_trend', 'trend_score', 'book_id'),
+    )
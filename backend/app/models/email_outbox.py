@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from datetime import datetime
+from .base import Base
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    
+    email_id = Column(Integer, primary_key=True, autoincrement=True)
+    recipient = Column(String(150), nullable=False)
+    subject = Column(String(200), nullable=False)
+    html_body = Column(Text, nullable=False)
+    status = Column(String(20), default='pending')  # 'pending', 'sent', 'failed'
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index('ix_email_outbox_status_next', 'status', 'next_attempt_at'),
+    )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, BigInteger
+from .base import Base
+
+class IdSequence(Base):
+    __tablename__ = "id_sequences"
+    
+    # Tên chuỗi: 'order', 'book', 'user'
+    name = Column(String(20), primary_key=True)
+    # Giá trị đầu tiên chưa được cấp phát cho bất kỳ worker nào
+    next_value = Column(BigInteger, nullable=False)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from datetime import datetime
+from .base import Base
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    # Khóa do client gửi trong header Idempotency-Key, phạm vi theo từng user
+    user_id = Column(String(10), primary_key=True)
+    idempotency_key = Column(String(100), primary_key=True)
+    request_hash = Column(String(64), nullable=False)   # sha256 của body, phát hiện dùng lại khóa cho yêu cầu khác
+    status = Column(String(20), nullable=False, default='pending')  # 'pending', 'completed'
+    resource_id = Column(String(10))                    # order_id, ghi cùng transaction với đơn hàng
+    response_status = Column(Integer)
+    response_body = Column(Text)
+    locked_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index('ix_idempotency_keys_expires', 'expires_at'),
+    )
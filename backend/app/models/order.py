@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -16,6 +16,10 @@ class Order(Base):
     
     __table_args__ = (
         CheckConstraint('total_amount >= 0', name='check_total_amount'),
+        # Lịch sử đơn của user, phân trang keyset theo (created_at, order_id).
+        # create_all không thêm index vào bảng đã có, DB cũ cần chạy:
+        # CREATE INDEX ix_orders_user_created ON orders (user_id, created_at, order_id);
+        Index('ix_orders_user_created', 'user_id', 'created_at', 'order_id'),
     )
     
     # Relationships
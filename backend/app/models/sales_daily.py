@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, Date, Numeric
+from .base import Base
+
+class SalesDaily(Base):
+    __tablename__ = "sales_daily"
+    
+    # Tổng hợp đơn hàng theo ngày tạo đơn và trạng thái hiện tại
+    sales_date = Column(Date, primary_key=True)
+    status_id = Column(String(10), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
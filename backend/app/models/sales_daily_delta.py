@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, Date, Numeric
+from .base import Base
+
+class SalesDailyDelta(Base):
+    __tablename__ = "sales_daily_deltas"
+    
+    # Thay đổi chưa cộng vào sales_daily: mỗi đơn mới / đổi trạng thái chỉ INSERT một dòng mới,
+    # worker nền gộp định kỳ vào sales_daily rồi xóa (không tranh chấp dòng nóng khi đặt hàng)
+    delta_id = Column(Integer, primary_key=True, autoincrement=True)
+    sales_date = Column(Date, nullable=False)
+    status_id = Column(String(10), nullable=False)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
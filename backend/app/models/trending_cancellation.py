@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from .base import Base
+
+class TrendingCancellation(Base):
+    __tablename__ = "trending_cancellations"
+    
+    # Đơn bị hủy chờ job xu hướng trừ khỏi book_trending: hủy đơn chỉ INSERT một dòng,
+    # không đọc/khóa trending_state (epoch chỉ job biết và đổi)
+    cancel_id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(String(10), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
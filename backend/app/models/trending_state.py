@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, DateTime
+from .base import Base
+
+class TrendingState(Base):
+    __tablename__ = "trending_state"
+    
+    # Chỉ có một dòng (state_id = 1)
+    state_id = Column(Integer, primary_key=True)
+    # Mốc thời gian mà điểm trong book_trending được quy về
+    epoch = Column(DateTime, nullable=False)
+    # Đơn có created_at <= mốc này đã được cộng vào book_trending
+    high_water_mark = Column(DateTime)
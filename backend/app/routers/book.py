@@ -1,33 +1,185 @@
-from fastapi import APIRouter, Depends, HTTPException,Query
-from sqlalchemy.orm import Session, joinedload
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, or_, and_
+from typing import List, Optional
+from app.core.replica import get_read_db
+from app.core.pagination import encode_cursor, decode_cursor
 from app.models.book import Book
-from app.schemas.book import BookList, BookDetail
+from app.models.book_trending import BookTrending
+from app.schemas.book import BookList, BookDetail, BookSuggestion, BookBrowseResponse
+from app.services.book_search import book_search_index, PRICE_BANDS
+from app.services.reference_cache import reference_cache
+from app.services.copurchase import related_books_cache
 
 router = APIRouter(prefix="/books", tags=["Books"])
 
 
-@router.get("/")
-def get_books(
+# Cột điểm trong book_trending của từng bộ lọc
+_SORT_KEYS = {
+    "Sách hot": BookTrending.hot_score,
+    "Xu hướng": BookTrending.trend_score,
+}
+
+_PRICE_BAND_LABELS = {code: label for code, _, _, label in PRICE_BANDS}
+
+# Số giá trị tối đa trả về cho facet tác giả
+_AUTHOR_FACET_LIMIT = 20
+
+
+async def _load_cards(db: AsyncSession, book_ids: List[str]) -> List[BookList]:
+    """Nạp dữ liệu thẻ sách bằng một truy vấn IN, giữ nguyên thứ tự book_ids"""
+    if not book_ids:
+        return []
+    rows = (await db.execute(
+        select(
+            Book.book_id, Book.title, Book.stock_quantity, Book.price, Book.cover_image_url
+        ).where(Book.book_id.in_(book_ids))
+    )).mappings().all()
+    by_id = {row["book_id"]: row for row in rows}
+    return [BookList.model_validate(by_id[book_id]) for book_id in book_ids if book_id in by_id]
+
+
+@router.get("/", response_model=List[BookList])
+async def get_books(
+    response: Response,
     filter: str = Query("Tất cả", enum=["Tất cả", "Sách hot", "Xu hướng"]),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=100, description="Mặc định 20 khi có cursor"),
+    cursor: Optional[str] = Query(None, description="Giá trị header X-Next-Cursor của trang trước"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = db.query(Book)
+    """
+    Danh sách sách dạng thẻ, phân trang bằng cursor theo (khóa sắp xếp, book_id).
+    Cursor của trang kế tiếp được trả trong header X-Next-Cursor (không có nếu là trang cuối).
+    Không truyền limit lẫn cursor: trả toàn bộ danh sách như trước (frontend hiện tại không phân trang).
+    """
+    # Chỉ lấy các cột của BookList, không tải description (TEXT)
+    stmt = select(
+        Book.book_id, Book.title, Book.stock_quantity, Book.price, Book.cover_image_url
+    )
+    sort_column = _SORT_KEYS.get(filter)
+
+    if sort_column is None:
+        # "Tất cả": duyệt theo khóa chính
+        if cursor:
+            (last_id,) = decode_cursor(cursor, str)
+            stmt = stmt.where(Book.book_id > last_id)
+        stmt = stmt.order_by(Book.book_id)
+    else:
+        # "Sách hot"/"Xu hướng": đọc top-K theo chỉ mục (điểm, book_id) của book_trending
+        stmt = (
+            stmt.add_columns(sort_column.label("sort_key"))
+            .join(BookTrending, BookTrending.book_id == Book.book_id)
+            .where(sort_column > 0)
+        )
+        if cursor:
+            # Điểm được mã hóa dạng hex của double: so sánh == với giá trị đã lưu là chính xác,
+            # sách cùng điểm không bị bỏ sót hay lặp lại giữa hai trang
+            last_key, last_id = decode_cursor(cursor, float.fromhex, str)
+            stmt = stmt.where(or_(
+                sort_column < last_key,
+                and_(sort_column == last_key, BookTrending.book_id < last_id)
+            ))
+        stmt = stmt.order_by(sort_column.desc(), BookTrending.book_id.desc())
+
+    if limit is None and not cursor:
+        rows = (await db.execute(stmt)).mappings().all()
+        return [BookList.model_validate(row) for row in rows]
+    limit = limit or 20
+
+    # Lấy dư một dòng để biết còn trang sau hay không
+    rows = (await db.execute(stmt.limit(limit + 1))).mappings().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if sort_column is None:
+            response.headers["X-Next-Cursor"] = encode_cursor(last["book_id"])
+        else:
+            response.headers["X-Next-Cursor"] = encode_cursor(float(last["sort_key"]).hex(), last["book_id"])
+
+    return [BookList.model_validate(row) for row in rows]
+
+
+@router.get("/search", response_model=List[BookList])
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200, description="Từ khóa, không cần dấu"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Tìm sách theo tên, tác giả, nhà xuất bản, mô tả (xếp hạng BM25, không phân biệt dấu)"""
+    ranked = book_search_index.search(q, limit)
+
+    # Giữ thứ tự theo điểm liên quan
+    return await _load_cards(db, [book_id for book_id, _ in ranked])
+
+
+@router.get("/suggest", response_model=List[BookSuggestion])
+async def suggest_books(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=20)
+):
+    """Gợi ý tên sách/tác giả khi đang gõ (không truy vấn DB)"""
+    return book_search_index.suggest(prefix, limit)
 
-    if filter == "Sách hot":
-        query = query.filter(Book.sold_quantity >= 150)
-    elif filter == "Xu hướng":
-        query = query.order_by(Book.created_at.desc())
-    
-    return query.all()
+
+@router.get("/browse", response_model=BookBrowseResponse)
+async def browse_books(
+    category_id: Optional[List[str]] = Query(None),
+    price_band: Optional[List[str]] = Query(None, description="Mã khoảng giá, ví dụ 50000-100000"),
+    year: Optional[List[int]] = Query(None, description="Năm xuất bản"),
+    author: Optional[List[str]] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Lọc sách theo thể loại, khoảng giá, năm xuất bản, tác giả và trả về số sách của từng
+    lựa chọn trong cùng một lần gọi. Chọn nhiều giá trị trong một facet là OR, giữa các facet là AND.
+    """
+    filters = {
+        "category": category_id,
+        "price_band": price_band,
+        "year": [str(value) for value in year] if year else None,
+        "author": author,
+    }
+    total, book_ids, counts = book_search_index.browse(filters, skip, limit)
+
+    refs = await reference_cache.get(db)
+    labels = {
+        "category": lambda value: refs.category_names.get(value, value),
+        "price_band": lambda value: _PRICE_BAND_LABELS.get(value, value),
+    }
+    facets = {}
+    for facet, values in counts.items():
+        label = labels.get(facet, str)
+        if facet == "price_band":
+            order = list(_PRICE_BAND_LABELS)
+            items = sorted(values.items(), key=lambda item: order.index(item[0]))
+        elif facet == "year":
+            items = sorted(values.items(), key=lambda item: item[0], reverse=True)
+        else:
+            items = sorted(values.items(), key=lambda item: (-item[1], item[0]))
+            if facet == "author":
+                items = items[:_AUTHOR_FACET_LIMIT]
+        facets[facet] = [
+            {"value": value, "label": label(value), "count": count}
+            for value, count in items
+        ]
+
+    return {
+        "total": total,
+        "books": await _load_cards(db, book_ids),
+        "facets": facets,
+    }
 
 
 @router.get("/{book_id}", response_model=BookDetail)
-def get_book_detail(book_id: str, db: Session = Depends(get_db)):
+async def get_book_detail(book_id: str, db: AsyncSession = Depends(get_read_db)):
     """Lấy chi tiết một cuốn sách"""
-    book = db.query(Book).options(
-        joinedload(Book.category)
-    ).filter(Book.book_id == book_id).first()
+    result = await db.execute(
+        select(Book).options(joinedload(Book.category)).where(Book.book_id == book_id)
+    )
+    book = result.scalar_one_or_none()
     
     if not book:
         raise HTTPException(status_code=404, detail="Không tìm thấy sách")
@@ -45,4 +197,14 @@ def get_book_detail(book_id: str, db: Session = Depends(get_db)):
         description=book.description,
         cover_image_url=book.cover_image_url,
         category_name=book.category.category_name if book.category else None
-    )
\ No newline at end of file
+    )
+
+@router.get("/{book_id}/related", response_model=List[BookList])
+async def get_related_books(
+    book_id: str,
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Sách khách hàng thường mua cùng (theo số đơn hoàn thành có cả hai sách)"""
+    related = await related_books_cache.get(db, book_id)
+    return await _load_cards(db, related[:limit])
@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-import uuid
 
 from app.core.database import get_db
 from app.core.dependencies import require_admin
+from app.core.file_formats import FileFormat
 from app.models.book import Book
-from app.models.category import Category
-from app.models.user import User
+from app.models.order_detail import OrderDetail
+from app.core.principal_cache import Principal
+from app.services.id_allocator import next_book_id
+from app.services.reference_cache import reference_cache
+from app.services.book_search import book_search_index
+from app.services.book_import import import_books
+from app.services.inventory import apply_stock_adjustments
 from app.schemas.book_admin import (
     BookCreateAdmin, 
     BookUpdateAdmin, 
     BookResponseAdmin,
-    BookListResponseAdmin
+    BookListResponseAdmin,
+    BookImportReport,
+    BulkStockRequest,
+    BulkStockResponse
 )
 
 router = APIRouter(prefix="/admin/books", tags=["Admin - Books"])
@@ -22,18 +31,18 @@ router = APIRouter(prefix="/admin/books", tags=["Admin - Books"])
 async def get_all_books_admin(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Lấy danh sách tất cả sách (Admin) - có phân trang"""
     
     try:
         stmt = select(Book).options(joinedload(Book.category))
         count_stmt = select(func.count()).select_from(Book)
-        total = db.execute(count_stmt).scalar()
+        total = (await db.execute(count_stmt)).scalar()
         
         stmt = stmt.offset(skip).limit(limit).order_by(Book.created_at.desc())
-        result = db.execute(stmt)
+        result = await db.execute(stmt)
         books = result.scalars().all()
         
         books_data = []
@@ -66,14 +75,14 @@ async def get_all_books_admin(
 @router.get("/{book_id}", response_model=BookResponseAdmin)
 async def get_book_detail_admin(
     book_id: str,
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Lấy chi tiết một cuốn sách (Admin)"""
     
     try:
         stmt = select(Book).options(joinedload(Book.category)).where(Book.book_id == book_id)
-        result = db.execute(stmt)
+        result = await db.execute(stmt)
         book = result.scalar_one_or_none()
         
         if not book:
@@ -110,21 +119,20 @@ async def get_book_detail_admin(
 @router.post("/", response_model=BookResponseAdmin, status_code=status.HTTP_201_CREATED)
 async def create_book_admin(
     book_data: BookCreateAdmin,
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Tạo sách mới (Admin)"""
     
     try:
-        stmt = select(Category).where(Category.category_id == book_data.category_id)
-        category = db.execute(stmt).scalar_one_or_none()
-        if not category:
+        category_name = await reference_cache.category_name(db, book_data.category_id)
+        if category_name is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Thể loại không tồn tại"
             )
         
-        new_book_id = f"B{str(uuid.uuid4().int)[:8]}"
+        new_book_id = await next_book_id()
         
         new_book = Book(
             book_id=new_book_id,
@@ -141,12 +149,10 @@ async def create_book_admin(
         )
         
         db.add(new_book)
-        db.commit()
-        db.refresh(new_book)
-        
-        stmt = select(Book).options(joinedload(Book.category)).where(Book.book_id == new_book_id)
-        result = db.execute(stmt)
-        book = result.scalar_one()
+        await db.commit()
+        await db.refresh(new_book)
+        book_search_index.upsert(new_book)
+        book = new_book
         
         return {
             "book_id": book.book_id,
@@ -155,7 +161,7 @@ async def create_book_admin(
             "publisher": book.publisher,
             "publication_year": book.publication_year,
             "category_id": book.category_id,
-            "category_name": book.category.category_name if book.category else None,
+            "category_name": category_name,
             "price": book.price,
             "stock_quantity": book.stock_quantity,
             "sold_quantity": book.sold_quantity,
@@ -168,25 +174,55 @@ async def create_book_admin(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi tạo sách: {str(e)}"
         )
 
 
+@router.post("/import", response_model=BookImportReport)
+async def import_books_admin(
+    request: Request,
+    file_format: FileFormat = Query("csv", alias="format"),
+    dry_run: bool = Query(False, description="Chỉ kiểm tra dữ liệu, không ghi"),
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
+):
+    """
+    Nhập sách hàng loạt (Admin). Body là nội dung file CSV (có dòng tiêu đề) hoặc NDJSON,
+    được đọc theo luồng và ghi theo lô. Trả về số dòng thành công/thất bại và lỗi của từng dòng.
+    """
+    
+    try:
+        report = await import_books(db, request.stream(), file_format, dry_run)
+        if report["imported"] and not dry_run:
+            # Nạp lại chỉ mục tìm kiếm ở nền thay vì cập nhật từng sách
+            book_search_index.start()
+        return report
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi nhập sách: {str(e)}"
+        )
+
+
 @router.put("/{book_id}", response_model=BookResponseAdmin)
 async def update_book_admin(
     book_id: str,
     book_data: BookUpdateAdmin,
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Cập nhật thông tin sách (Admin)"""
     
     try:
         stmt = select(Book).where(Book.book_id == book_id)
-        result = db.execute(stmt)
+        result = await db.execute(stmt)
         book = result.scalar_one_or_none()
         
         if not book:
@@ -196,9 +232,7 @@ async def update_book_admin(
             )
         
         if book_data.category_id:
-            stmt = select(Category).where(Category.category_id == book_data.category_id)
-            category = db.execute(stmt).scalar_one_or_none()
-            if not category:
+            if await reference_cache.category_name(db, book_data.category_id) is None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Thể loại không tồn tại"
@@ -208,12 +242,10 @@ async def update_book_admin(
         for key, value in update_data.items():
             setattr(book, key, value)
         
-        db.commit()
-        db.refresh(book)
-        
-        stmt = select(Book).options(joinedload(Book.category)).where(Book.book_id == book_id)
-        result = db.execute(stmt)
-        book = result.scalar_one()
+        await db.commit()
+        await db.refresh(book)
+        book_search_index.upsert(book)
+        refs = await reference_cache.get(db)
         
         return {
             "book_id": book.book_id,
@@ -222,7 +254,7 @@ async def update_book_admin(
             "publisher": book.publisher,
             "publication_year": book.publication_year,
             "category_id": book.category_id,
-            "category_name": book.category.category_name if book.category else None,
+            "category_name": refs.category_names.get(book.category_id),
             "price": book.price,
             "stock_quantity": book.stock_quantity,
             "sold_quantity": book.sold_quantity,
@@ -235,7 +267,7 @@ async def update_book_admin(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cập nhật sách: {str(e)}"
@@ -245,14 +277,14 @@ async def update_book_admin(
 @router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_book_admin(
     book_id: str,
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Xóa sách (Admin)"""
     
     try:
         stmt = select(Book).where(Book.book_id == book_id)
-        result = db.execute(stmt)
+        result = await db.execute(stmt)
         book = result.scalar_one_or_none()
         
         if not book:
@@ -261,38 +293,70 @@ async def delete_book_admin(
                 detail="Không tìm thấy sách"
             )
         
-        if book.order_details:
+        # Kiểm tra tồn tại bằng truy vấn nhẹ thay vì lazy load cả collection
+        has_orders = (await db.execute(
+            select(OrderDetail.detail_id).where(OrderDetail.book_id == book_id).limit(1)
+        )).first()
+        if has_orders:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Không thể xóa sách đã có trong đơn hàng"
             )
         
-        db.delete(book)
-        db.commit()
+        await db.delete(book)
+        await db.commit()
+        book_search_index.remove(book_id)
         return None
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi xóa sách: {str(e)}"
         )
 
 
+@router.patch("/stock", response_model=BulkStockResponse)
+async def bulk_update_stock_admin(
+    payload: BulkStockRequest,
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
+):
+    """
+    Cập nhật tồn kho nhiều sách trong một transaction (Admin, đồng bộ kho).
+    Mỗi dòng đặt tồn kho tuyệt đối (stock_quantity) hoặc cộng/trừ (delta).
+    Trả về danh sách sách thay đổi (cũ -> mới), sách không tồn tại và dòng bị từ chối.
+    """
+    
+    try:
+        result = await apply_stock_adjustments(db, payload.items)
+        await db.commit()
+        return result
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi cập nhật tồn kho: {str(e)}"
+        )
+
+
 @router.patch("/{book_id}/stock", response_model=BookResponseAdmin)
 async def update_stock_admin(
     book_id: str,
     stock_quantity: int = Query(..., ge=0),
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Cập nhật số lượng tồn kho (Admin)"""
     
     try:
         stmt = select(Book).where(Book.book_id == book_id)
-        result = db.execute(stmt)
+        result = await db.execute(stmt)
         book = result.scalar_one_or_none()
         
         if not book:
@@ -302,12 +366,9 @@ async def update_stock_admin(
             )
         
         book.stock_quantity = stock_quantity
-        db.commit()
-        db.refresh(book)
-        
-        stmt = select(Book).options(joinedload(Book.category)).where(Book.book_id == book_id)
-        result = db.execute(stmt)
-        book = result.scalar_one()
+        await db.commit()
+        await db.refresh(book)
+        refs = await reference_cache.get(db)
         
         return {
             "book_id": book.book_id,
@@ -316,7 +377,7 @@ async def update_stock_admin(
             "publisher": book.publisher,
             "publication_year": book.publication_year,
             "category_id": book.category_id,
-            "category_name": book.category.category_name if book.category else None,
+            "category_name": refs.category_names.get(book.category_id),
             "price": book.price,
             "stock_quantity": book.stock_quantity,
             "sold_quantity": book.sold_quantity,
@@ -329,7 +390,7 @@ async def update_stock_admin(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cập nhật tồn kho: {str(e)}"
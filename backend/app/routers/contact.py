@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.core.database import get_db
 from app.core.dependencies import require_admin, get_current_user
-from app.models.user import User
+from app.core.principal_cache import Principal
 from app.schemas.contact import (
     ContactCreate, 
     ContactReply, 
@@ -21,8 +21,8 @@ router = APIRouter(prefix="/contacts", tags=["Contacts"])
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
 async def create_contact(
     contact_data: ContactCreate, 
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[Principal] = Depends(get_current_user)
 ):
     """
     Gửi liên hệ mới.
@@ -35,7 +35,7 @@ async def create_contact(
         contact_data.full_name = current_user.full_name
         contact_data.email = current_user.email
     
-    return contact_service.create(db, contact_data)
+    return await contact_service.create(db, contact_data)
 
 
 # 2. Lấy danh sách liên hệ (ADMIN) - Có phân trang và lọc
@@ -44,13 +44,13 @@ async def get_contacts_admin(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
     status_filter: Optional[str] = Query(None, description="Filter by status: pending, resolved"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Lấy danh sách liên hệ (ADMIN) - có phân trang và filter
     """
-    contacts = contact_service.get_all(db, skip, limit, status_filter)
-    total = contact_service.count_contacts(db, status_filter)
+    contacts = await contact_service.get_all(db, skip, limit, status_filter)
+    total = await contact_service.count_contacts(db, status_filter)
     
     return {
         "total": total,
@@ -62,10 +62,10 @@ async def get_contacts_admin(
 @router.get("/admin/{contact_id}", response_model=ContactResponse, dependencies=[Depends(require_admin)])
 async def get_contact_detail_admin(
     contact_id: int, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Lấy chi tiết liên hệ theo ID (ADMIN)"""
-    contact = contact_service.get_by_id(db, contact_id)
+    contact = await contact_service.get_by_id(db, contact_id)
     if not contact:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
@@ -79,10 +79,10 @@ async def get_contact_detail_admin(
 async def reply_contact_admin(
     contact_id: int, 
     reply_data: ContactReply, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Phản hồi liên hệ (ADMIN)"""
-    contact = contact_service.respond(db, contact_id, reply_data)
+    contact = await contact_service.respond(db, contact_id, reply_data)
     if not contact:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
@@ -95,10 +95,10 @@ async def reply_contact_admin(
 @router.delete("/admin/{contact_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_admin)])
 async def delete_contact_admin(
     contact_id: int, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Xoá liên hệ (ADMIN)"""
-    success = contact_service.delete(db, contact_id)
+    success = await contact_service.delete(db, contact_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
@@ -110,21 +110,21 @@ async def delete_contact_admin(
 # 6. Lấy danh sách liên hệ của user hiện tại (Khách hàng)
 @router.get("/my-contacts", response_model=List[ContactResponse])
 async def get_my_contacts(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Lấy danh sách liên hệ của user hiện tại"""
-    return contact_service.get_by_user_id(db, current_user.user_id)
+    return await contact_service.get_by_user_id(db, current_user.user_id)
 
 
 # 7. MỚI: Lấy thông báo (chỉ những liên hệ đã được admin trả lời)
 @router.get("/notifications", response_model=List[NotificationResponse])
 async def get_notifications(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Lấy thông báo cho user hiện tại
     Chỉ trả về những liên hệ đã được admin phản hồi (status = 'resolved')
     """
-    return contact_service.get_user_notifications(db, current_user.user_id)
\ No newline at end of file
+    return await contact_service.get_user_notifications(db, current_user.user_id)
\ No newline at end of file
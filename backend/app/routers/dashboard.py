@@ -1,71 +1,76 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, extract
 from datetime import datetime, timedelta
 
-from app.core.database import get_db
+from app.core.replica import get_read_db
 from app.core.dependencies import require_admin
+from app.core.principal_cache import Principal
 from app.models.user import User
-from app.models.order import Order
-from app.models.order_status import OrderStatus
 from app.models.book import Book
+from app.services.sales_rollup import sales_source
+from app.services.reference_cache import reference_cache
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
 
 @router.get("/stats")
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_read_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Lấy thống kê tổng quan cho dashboard"""
-    
+
     try:
-        # Tổng số users
-        total_users = db.execute(select(func.count()).select_from(User)).scalar()
-        total_customers = db.execute(
-            select(func.count()).select_from(User).where(User.role == 'customer')
-        ).scalar()
-        total_admins = db.execute(
-            select(func.count()).select_from(User).where(User.role == 'admin')
-        ).scalar()
-        
-        # Tổng số đơn hàng
-        total_orders = db.execute(select(func.count()).select_from(Order)).scalar()
-        
+        refs = await reference_cache.get(db)
+
+        # Số users theo role (1 GROUP BY)
+        users_by_role = dict((await db.execute(
+            select(User.role, func.count()).group_by(User.role)
+        )).all())
+
+        # Đơn hàng và doanh thu theo trạng thái từ sales_daily + delta chưa gộp (1 GROUP BY)
+        sales = sales_source()
+        orders_by_status = {
+            status_id: (count, amount)
+            for status_id, count, amount in (await db.execute(
+                select(
+                    sales.c.status_id,
+                    func.sum(sales.c.order_count),
+                    func.sum(sales.c.revenue)
+                ).group_by(sales.c.status_id)
+            )).all()
+        }
+        total_orders = sum(count or 0 for count, _ in orders_by_status.values())
+
         # Tổng doanh thu (chỉ đơn hoàn thành)
-        total_revenue = db.execute(
-            select(func.coalesce(func.sum(Order.total_amount), 0))
-            .select_from(Order)
-            .join(OrderStatus)
-            .where(OrderStatus.status_name == 'completed')
-        ).scalar()
-        
-        # Tổng số sách
-        total_books = db.execute(select(func.count()).select_from(Book)).scalar()
-        total_stock = db.execute(
-            select(func.coalesce(func.sum(Book.stock_quantity), 0)).select_from(Book)
-        ).scalar()
-        total_sold = db.execute(
-            select(func.coalesce(func.sum(Book.sold_quantity), 0)).select_from(Book)
-        ).scalar()
-        
+        _, total_revenue = orders_by_status.get(refs.status_ids.get('completed'), (0, 0))
+
+        # Tổng số sách, tồn kho, đã bán (1 truy vấn)
+        total_books, total_stock, total_sold = (await db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(Book.stock_quantity), 0),
+                func.coalesce(func.sum(Book.sold_quantity), 0)
+            ).select_from(Book)
+        )).one()
+
         return {
             "users": {
-                "total": total_users or 0,
-                "customers": total_customers or 0,
-                "admins": total_admins or 0
+                "total": sum(users_by_role.values()),
+                "customers": users_by_role.get('customer', 0),
+                "admins": users_by_role.get('admin', 0)
             },
             "orders": {
-                "total": total_orders or 0
+                "total": int(total_orders)
             },
             "revenue": {
                 "total": float(total_revenue or 0)
             },
             "books": {
                 "total": total_books or 0,
-                "stock": total_stock or 0,
-                "sold": total_sold or 0
+                "stock": int(total_stock or 0),
+                "sold": int(total_sold or 0)
             }
         }
     except Exception as e:
@@ -78,37 +83,34 @@ async def get_dashboard_stats(
 
 @router.get("/order-status")
 async def get_order_status_stats(
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_read_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Lấy thống kê đơn hàng theo trạng thái"""
-    
+
     try:
+        refs = await reference_cache.get(db)
         status_list = ['processing', 'confirmed', 'shipping', 'completed', 'cancelled']
-        
+
+        # Một GROUP BY trên bảng tổng hợp thay vì 2 truy vấn cho mỗi trạng thái
+        sales = sales_source()
+        rows = (await db.execute(
+            select(
+                sales.c.status_id,
+                func.sum(sales.c.order_count),
+                func.sum(sales.c.revenue)
+            ).group_by(sales.c.status_id)
+        )).all()
+        by_status = {status_id: (count, amount) for status_id, count, amount in rows}
+
         result = {}
         for status_name in status_list:
-            # Đếm số đơn hàng
-            count = db.execute(
-                select(func.count())
-                .select_from(Order)
-                .join(OrderStatus)
-                .where(OrderStatus.status_name == status_name)
-            ).scalar() or 0
-            
-            # Tính tổng tiền
-            total = db.execute(
-                select(func.coalesce(func.sum(Order.total_amount), 0))
-                .select_from(Order)
-                .join(OrderStatus)
-                .where(OrderStatus.status_name == status_name)
-            ).scalar()
-            
+            count, total = by_status.get(refs.status_ids.get(status_name), (0, 0))
             result[status_name] = {
-                "count": count,
+                "count": int(count or 0),
                 "amount": float(total or 0)
             }
-        
+
         return result
     except Exception as e:
         print(f"❌ Error in get_order_status_stats: {str(e)}")
@@ -121,76 +123,69 @@ async def get_order_status_stats(
 @router.get("/monthly-trends")
 async def get_monthly_trends(
     months: int = 5,
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_read_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Lấy xu hướng theo tháng"""
-    
+
     try:
+        refs = await reference_cache.get(db)
+        completed_id = refs.status_ids.get('completed')
+        cancelled_id = refs.status_ids.get('cancelled')
+
+        # Tính các tháng cần lấy (N tháng gần nhất)
+        month_starts = []
+        for i in range(months, 0, -1):
+            target_date = datetime.now() - timedelta(days=30 * i)
+            month_starts.append(target_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+
+        if not month_starts:
+            return {"months": [], "delivered": [], "cancelled": [], "revenue": []}
+
+        last_start = month_starts[-1]
+        if last_start.month == 12:
+            range_end = last_start.replace(year=last_start.year + 1, month=1)
+        else:
+            range_end = last_start.replace(month=last_start.month + 1)
+
+        # Một GROUP BY (năm, tháng, trạng thái) trên bảng tổng hợp cho toàn bộ khoảng thời gian
+        sales = sales_source()
+        year_col = extract('year', sales.c.sales_date)
+        month_col = extract('month', sales.c.sales_date)
+        rows = (await db.execute(
+            select(
+                year_col,
+                month_col,
+                sales.c.status_id,
+                func.sum(sales.c.order_count),
+                func.sum(sales.c.revenue)
+            )
+            .where(
+                sales.c.sales_date >= month_starts[0].date(),
+                sales.c.sales_date < range_end.date(),
+                sales.c.status_id.in_([completed_id, cancelled_id])
+            )
+            .group_by(year_col, month_col, sales.c.status_id)
+        )).all()
+        by_month = {
+            (int(year), int(month), status_id): (count, amount)
+            for year, month, status_id, count, amount in rows
+        }
+
         month_labels = []
         delivered = []
         cancelled = []
         revenue = []
-        
-        # Lấy dữ liệu cho N tháng gần nhất
-        for i in range(months, 0, -1):
-            # Tính tháng
-            target_date = datetime.now() - timedelta(days=30 * i)
-            month_label = target_date.strftime('T%m')
-            month_labels.append(month_label)
-            
-            # Tính khoảng thời gian của tháng
-            month_start = target_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            if month_start.month == 12:
-                month_end = month_start.replace(year=month_start.year + 1, month=1)
-            else:
-                month_end = month_start.replace(month=month_start.month + 1)
-            
-            # Đơn đã giao
-            delivered_count = db.execute(
-                select(func.count())
-                .select_from(Order)
-                .join(OrderStatus)
-                .where(
-                    and_(
-                        OrderStatus.status_name == 'completed',
-                        Order.created_at >= month_start,
-                        Order.created_at < month_end
-                    )
-                )
-            ).scalar() or 0
-            delivered.append(delivered_count)
-            
-            # Đơn đã hủy
-            cancelled_count = db.execute(
-                select(func.count())
-                .select_from(Order)
-                .join(OrderStatus)
-                .where(
-                    and_(
-                        OrderStatus.status_name == 'cancelled',
-                        Order.created_at >= month_start,
-                        Order.created_at < month_end
-                    )
-                )
-            ).scalar() or 0
-            cancelled.append(cancelled_count)
-            
-            # Doanh thu (chỉ đơn hoàn thành)
-            month_revenue = db.execute(
-                select(func.coalesce(func.sum(Order.total_amount), 0))
-                .select_from(Order)
-                .join(OrderStatus)
-                .where(
-                    and_(
-                        OrderStatus.status_name == 'completed',
-                        Order.created_at >= month_start,
-                        Order.created_at < month_end
-                    )
-                )
-            ).scalar()
+        for month_start in month_starts:
+            key = (month_start.year, month_start.month)
+            delivered_count, month_revenue = by_month.get(key + (completed_id,), (0, 0))
+            cancelled_count, _ = by_month.get(key + (cancelled_id,), (0, 0))
+
+            month_labels.append(month_start.strftime('T%m'))
+            delivered.append(int(delivered_count or 0))
+            cancelled.append(int(cancelled_count or 0))
             revenue.append(float(month_revenue or 0))
-        
+
         return {
             "months": month_labels,
             "delivered": delivered,
@@ -202,4 +197,4 @@ async def get_monthly_trends(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi lấy xu hướng tháng: {str(e)}"
-        )
\ No newline at end of file
+        )
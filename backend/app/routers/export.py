@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from app.core.dependencies import require_admin
+from app.core.file_formats import FileFormat
+from app.core.principal_cache import Principal
+from app.core.replica import get_read_session_factory
+from app.services.data_export import stream_export
+
+router = APIRouter(prefix="/admin/export", tags=["Admin - Export"])
+
+_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _export_response(
+    name: str, file_format: str, after: Optional[str], gzip: bool, session_factory
+) -> StreamingResponse:
+    filename = f"{name}.{file_format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        # Xuất toàn bảng là truy vấn đọc nặng nhất: chạy trên replica nếu có
+        # (cùng quy tắc dính primary sau khi ghi và kiểm tra độ trễ như get_read_db)
+        stream_export(name, file_format, after, gzip, session_factory),
+        media_type="application/gzip" if gzip else _MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/books")
+async def export_books(
+    file_format: FileFormat = Query("csv", alias="format"),
+    after: Optional[str] = Query(None, description="book_id cuối cùng đã nhận, để tải tiếp"),
+    gzip: bool = Query(False),
+    session_factory=Depends(get_read_session_factory),
+    current_admin: Principal = Depends(require_admin)
+):
+    """Xuất toàn bộ sách (Admin), đọc theo luồng và sắp xếp theo book_id"""
+    return _export_response("books", file_format, after, gzip, session_factory)
+
+
+@router.get("/orders")
+async def export_orders(
+    file_format: FileFormat = Query("csv", alias="format"),
+    after: Optional[str] = Query(None, description="order_id cuối cùng đã nhận, để tải tiếp"),
+    gzip: bool = Query(False),
+    session_factory=Depends(get_read_session_factory),
+    current_admin: Principal = Depends(require_admin)
+):
+    """Xuất toàn bộ đơn hàng (Admin), đọc theo luồng và sắp xếp theo order_id"""
+    return _export_response("orders", file_format, after, gzip, session_factory)
+
+
+@router.get("/users")
+async def export_users(
+    file_format: FileFormat = Query("csv", alias="format"),
+    after: Optional[str] = Query(None, description="user_id cuối cùng đã nhận, để tải tiếp"),
+    gzip: bool = Query(False),
+    session_factory=Depends(get_read_session_factory),
+    current_admin: Principal = Depends(require_admin)
+):
+    """Xuất toàn bộ người dùng (Admin, không gồm mật khẩu), đọc theo luồng và sắp xếp theo user_id"""
+    return _export_response("users", file_format, after, gzip, session_factory)
@@ -1,98 +1,200 @@
 # backend/app/routers/order.py
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import select, func, desc
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, desc, or_, and_
+from typing import Optional, Union
+from datetime import datetime
 
 from app.core.database import get_db
+from app.core.replica import get_read_db
 from app.core.dependencies import get_current_user, require_admin
-from app.models.user import User
+from app.core.principal_cache import Principal
+from app.core.pagination import encode_cursor, decode_cursor
 from app.models.order import Order
 from app.models.order_detail import OrderDetail  # ← FIX: Thêm import này
-from app.models.order_status import OrderStatus  # ← FIX: Thêm import này
-from app.schemas.order import OrderCreate, OrderResponse, UserOrderHistoryResponse
+from app.models.book import Book
+from app.schemas.order import OrderCreate, OrderResponse, UserOrderHistoryResponse, UserOrderSummaryResponse
 from app.services import order as order_service
+from app.services import idempotency
+from app.services.reference_cache import reference_cache
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
 
+def _created_order_response(result: Order) -> dict:
+    return {
+        "order_id": result.order_id,
+        "user_id": result.user_id,
+        "total_amount": float(result.total_amount),
+        "status_id": result.status_id,
+        "order_status": result.status.status_name if result.status else "processing",
+        "shipping_address": result.shipping_address,
+        "payment_method_id": result.payment_method_id,
+        "payment_method_name": result.payment_method.method_name if result.payment_method else None,
+        "created_at": result.created_at.isoformat(),
+        "order_details": [
+            {
+                "detail_id": detail.detail_id,
+                "book_id": detail.book_id,
+                "quantity": detail.quantity,
+                "unit_price": float(detail.unit_price),
+                "book": {
+                    "book_id": detail.book.book_id,
+                    "title": detail.book.title,
+                    "cover_image_url": detail.book.cover_image_url
+                } if detail.book else None
+            }
+            for detail in result.order_details
+        ]
+    }
+
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_order(
     order_data: OrderCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", min_length=1, max_length=100,
+        description="Gửi lại cùng khóa khi retry để không tạo đơn trùng"
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Tạo đơn hàng mới"""
+    user_id = current_user.user_id
+    claim = None
+    if idempotency_key:
+        outcome = await idempotency.begin(
+            user_id, idempotency_key,
+            idempotency.request_hash(order_data.model_dump(mode="json", exclude={"user_id"}))
+        )
+        if isinstance(outcome, idempotency.StoredResult):
+            body = outcome.body
+            if body is None:
+                # Đơn đã tạo nhưng response chưa kịp lưu -> dựng lại từ đơn
+                body = _created_order_response(await order_service.get_order_by_id(db, outcome.resource_id))
+                await idempotency.complete(user_id, idempotency_key, outcome.status_code, body)
+            return JSONResponse(
+                status_code=outcome.status_code, content=body, headers={"Idempotent-Replayed": "true"}
+            )
+        claim = outcome
+
     try:
-        order_data.user_id = current_user.user_id
-        result = order_service.create_order(db, order_data)
-        
-        return {
-            "order_id": result.order_id,
-            "user_id": result.user_id,
-            "total_amount": float(result.total_amount),
-            "status_id": result.status_id,
-            "order_status": result.status.status_name if result.status else "processing",
-            "shipping_address": result.shipping_address,
-            "payment_method_id": result.payment_method_id,
-            "payment_method_name": result.payment_method.method_name if result.payment_method else None,
-            "created_at": result.created_at.isoformat(),
-            "order_details": [
-                {
-                    "detail_id": detail.detail_id,
-                    "book_id": detail.book_id,
-                    "quantity": detail.quantity,
-                    "unit_price": float(detail.unit_price),
-                    "book": {
-                        "book_id": detail.book.book_id,
-                        "title": detail.book.title,
-                        "cover_image_url": detail.book.cover_image_url
-                    } if detail.book else None
-                }
-                for detail in result.order_details
-            ]
-        }
-    except HTTPException:
-        raise
+        order_data.user_id = user_id
+        result = await order_service.create_order(db, order_data, claim)
+        body = _created_order_response(result)
+        if claim:
+            await idempotency.complete(user_id, idempotency_key, status.HTTP_201_CREATED, body)
+        return body
     except Exception as e:
+        if claim:
+            await idempotency.release(claim)
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
 
-@router.get("/my-orders", response_model=UserOrderHistoryResponse)
+async def _order_summaries(db: AsyncSession, orders, refs) -> list:
+    """Số đầu sách, tổng số lượng và ảnh bìa đầu tiên của các đơn trong trang (2 truy vấn GROUP BY/IN)"""
+    order_ids = [order.order_id for order in orders]
+    stats = {}
+    covers = {}
+    if order_ids:
+        stats = {
+            order_id: (item_count, total_quantity, first_detail_id)
+            for order_id, item_count, total_quantity, first_detail_id in (await db.execute(
+                select(
+                    OrderDetail.order_id,
+                    func.count(),
+                    func.coalesce(func.sum(OrderDetail.quantity), 0),
+                    func.min(OrderDetail.detail_id)
+                )
+                .where(OrderDetail.order_id.in_(order_ids))
+                .group_by(OrderDetail.order_id)
+            )).all()
+        }
+        first_detail_ids = [first for _, _, first in stats.values()]
+        covers = dict((await db.execute(
+            select(OrderDetail.order_id, Book.cover_image_url)
+            .join(Book, Book.book_id == OrderDetail.book_id)
+            .where(OrderDetail.detail_id.in_(first_detail_ids))
+        )).all()) if first_detail_ids else {}
+    
+    summaries = []
+    for order in orders:
+        item_count, total_quantity, _ = stats.get(order.order_id, (0, 0, None))
+        summaries.append({
+            "order_id": order.order_id,
+            "total_amount": order.total_amount,
+            "status_id": order.status_id,
+            "order_status": refs.status_names.get(order.status_id, "unknown"),
+            "created_at": order.created_at,
+            "item_count": item_count,
+            "total_quantity": int(total_quantity),
+            "first_cover_image_url": covers.get(order.order_id),
+        })
+    return summaries
+
+
+@router.get("/my-orders", response_model=Union[UserOrderHistoryResponse, UserOrderSummaryResponse])
 async def get_my_orders(
-    skip: int = Query(0, ge=0),
+    skip: int = Query(0, ge=0, description="Tương thích client cũ; nên dùng cursor"),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Giá trị next_cursor của trang trước"),
     status_filter: Optional[str] = Query(None, description="Lọc theo trạng thái"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    view: str = Query("full", enum=["full", "compact"], description="compact: không kèm chi tiết đơn"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Lấy lịch sử đơn hàng của user hiện tại với phân trang"""
+    """
+    Lấy lịch sử đơn hàng của user hiện tại, mới nhất trước.
+    Phân trang keyset theo (created_at, order_id); total chỉ được đếm ở trang đầu.
+    skip (OFFSET) chỉ dùng khi không có cursor, giữ cho client cũ còn phân trang theo skip.
+    """
     try:
-        # Build query
-        stmt = select(Order).options(
-            joinedload(Order.status),
-            joinedload(Order.payment_method),
-            joinedload(Order.order_details).joinedload(OrderDetail.book)
-        ).where(Order.user_id == current_user.user_id)
+        refs = await reference_cache.get(db)
+        conditions = [Order.user_id == current_user.user_id]
         
-        # Filter by status if provided
+        # Filter by status if provided (lọc trực tiếp theo status_id, không cần join)
         if status_filter:
-            stmt = stmt.join(OrderStatus).where(OrderStatus.status_name == status_filter)
+            conditions.append(Order.status_id == refs.status_ids.get(status_filter))
         
-        # Count total
-        count_stmt = select(func.count()).select_from(Order).where(Order.user_id == current_user.user_id)
-        if status_filter:
-            count_stmt = count_stmt.join(OrderStatus).where(OrderStatus.status_name == status_filter)
+        # Count total (khi không có cursor, kể cả trang theo skip)
+        total = None
+        if not cursor:
+            total = (await db.execute(select(func.count()).select_from(Order).where(*conditions))).scalar()
         
-        total = db.execute(count_stmt).scalar()
+        stmt = select(Order).where(*conditions)
+        if cursor:
+            last_created_at, last_id = decode_cursor(cursor, datetime.fromisoformat, str)
+            stmt = stmt.where(or_(
+                Order.created_at < last_created_at,
+                and_(Order.created_at == last_created_at, Order.order_id < last_id)
+            ))
+        elif skip:
+            stmt = stmt.offset(skip)
+        if view == "full":
+            # Chi tiết nạp bằng một truy vấn IN riêng, không nhân dòng trang đơn hàng
+            stmt = stmt.options(selectinload(Order.order_details).joinedload(OrderDetail.book))
         
-        # Get paginated results
-        stmt = stmt.order_by(desc(Order.created_at)).offset(skip).limit(limit)
-        result = db.execute(stmt)
-        orders = result.scalars().unique().all()
+        # Lấy dư một dòng để biết còn trang sau hay không
+        stmt = stmt.order_by(desc(Order.created_at), desc(Order.order_id)).limit(limit + 1)
+        orders = list((await db.execute(stmt)).scalars().all())
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1].created_at, orders[-1].order_id)
+        
+        if view == "compact":
+            return {
+                "total": total,
+                "next_cursor": next_cursor,
+                "orders": await _order_summaries(db, orders, refs)
+            }
         
         # Format response
         orders_data = []
@@ -102,10 +204,10 @@ async def get_my_orders(
                 "user_id": order.user_id,
                 "total_amount": float(order.total_amount),
                 "status_id": order.status_id,
-                "order_status": order.status.status_name if order.status else "unknown",
+                "order_status": refs.status_names.get(order.status_id, "unknown"),
                 "shipping_address": order.shipping_address,
                 "payment_method_id": order.payment_method_id,
-                "payment_method_name": order.payment_method.method_name if order.payment_method else None,
+                "payment_method_name": refs.payment_method_names.get(order.payment_method_id),
                 "created_at": order.created_at.isoformat(),
                 "order_details": []
             }
@@ -131,8 +233,10 @@ async def get_my_orders(
             
             orders_data.append(order_dict)
         
-        return {"total": total, "orders": orders_data}
+        return {"total": total, "next_cursor": next_cursor, "orders": orders_data}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ ERROR in get_my_orders: {str(e)}")
         import traceback
@@ -146,8 +250,8 @@ async def get_my_orders(
 @router.get("/{order_id}")
 async def get_order_detail(
     order_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Lấy chi tiết đơn hàng"""
     try:
@@ -157,8 +261,8 @@ async def get_order_detail(
             joinedload(Order.order_details).joinedload(OrderDetail.book)
         ).where(Order.order_id == order_id)
         
-        result = db.execute(stmt)
-        order = result.scalar_one_or_none()
+        result = await db.execute(stmt)
+        order = result.unique().scalar_one_or_none()
         
         if not order:
             raise HTTPException(
@@ -210,11 +314,11 @@ async def get_order_detail(
 @router.put("/{order_id}/cancel")
 async def cancel_order(
     order_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Hủy đơn hàng"""
-    order = order_service.cancel_order(db, order_id, current_user.user_id)
+    order = await order_service.cancel_order(db, order_id, current_user.user_id)
     
     return {
         "message": "Hủy đơn hàng thành công",
@@ -229,8 +333,8 @@ async def get_all_orders_admin(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     status_filter: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_read_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Lấy tất cả đơn hàng (Admin)"""
     try:
@@ -240,17 +344,20 @@ async def get_all_orders_admin(
             joinedload(Order.payment_method)
         )
         
+        status_id = None
         if status_filter:
-            stmt = stmt.join(OrderStatus).where(OrderStatus.status_name == status_filter)
+            refs = await reference_cache.get(db)
+            status_id = refs.status_ids.get(status_filter)
+            stmt = stmt.where(Order.status_id == status_id)
         
         count_stmt = select(func.count()).select_from(Order)
         if status_filter:
-            count_stmt = count_stmt.join(OrderStatus).where(OrderStatus.status_name == status_filter)
+            count_stmt = count_stmt.where(Order.status_id == status_id)
         
-        total = db.execute(count_stmt).scalar()
+        total = (await db.execute(count_stmt)).scalar()
         
         stmt = stmt.order_by(desc(Order.created_at)).offset(skip).limit(limit)
-        result = db.execute(stmt)
+        result = await db.execute(stmt)
         orders = result.scalars().unique().all()
         
         return {
@@ -278,11 +385,11 @@ async def get_all_orders_admin(
 async def update_order_status_admin(
     order_id: str,
     new_status: str,
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_db),
+    current_admin: Principal = Depends(require_admin)
 ):
     """Cập nhật trạng thái đơn hàng (Admin only)"""
-    order = order_service.update_order_status(db, order_id, new_status)
+    order = await order_service.update_order_status(db, order_id, new_status)
     
     return {
         "message": "Cập nhật trạng thái thành công",
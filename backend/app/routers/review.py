@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, status, Query
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List
 
 from app.core.database import get_db
+from app.core.replica import get_read_db
 from app.core.dependencies import get_current_user, require_admin
-from app.models.user import User
+from app.core.principal_cache import Principal
 from app.schemas.review import (
     ReviewCreate, 
     ReviewUpdate,
@@ -12,68 +13,84 @@ from app.schemas.review import (
     BookRatingSummary
 )
 from app.services import review as review_service
+from app.services import rating_stats
 
 router = APIRouter(prefix="/reviews", tags=["Reviews"])
 
 
 @router.get("/book/{book_id}", response_model=List[ReviewResponse])
-def get_book_reviews(
+async def get_book_reviews(
     book_id: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Lấy danh sách đánh giá của sách (Public)"""
-    return review_service.get_book_reviews(db, book_id, skip, limit)
+    return await review_service.get_book_reviews(db, book_id, skip, limit)
 
 
 @router.get("/book/{book_id}/summary", response_model=BookRatingSummary)
-def get_rating_summary(
+async def get_rating_summary(
     book_id: str, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Lấy thống kê đánh giá của sách (Public)"""
-    return review_service.get_rating_summary(db, book_id)
+    return await review_service.get_rating_summary(db, book_id)
+
+
+@router.get("/summary", response_model=Dict[str, BookRatingSummary])
+async def get_rating_summaries(
+    book_ids: str = Query(..., description="Danh sách book_id, phân cách bằng dấu phẩy"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Lấy thống kê đánh giá của nhiều sách trong một lần gọi (Public)"""
+    ids = [book_id.strip() for book_id in book_ids.split(",") if book_id.strip()]
+    if len(ids) > 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tối đa 100 sách mỗi lần"
+        )
+    return await rating_stats.get_summaries(db, ids)
 
 
 @router.post("/", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
-def create_review(
+async def create_review(
     data: ReviewCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Tạo đánh giá mới (Authenticated)"""
-    return review_service.create_review(db, current_user.user_id, data)
+    return await review_service.create_review(db, current_user.user_id, data)
 
 
 @router.put("/{review_id}", response_model=ReviewResponse)
-def update_review(
+async def update_review(
     review_id: int,
     data: ReviewUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Cập nhật đánh giá của mình (Authenticated)"""
-    return review_service.update_review(db, review_id, current_user.user_id, data)
+    return await review_service.update_review(db, review_id, current_user.user_id, data)
 
 
 @router.delete("/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_review(
+async def delete_review(
     review_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Xóa đánh giá của mình (Authenticated)"""
-    review_service.delete_review(db, review_id, current_user.user_id, is_admin=False)
+    await review_service.delete_review(db, review_id, current_user.user_id, is_admin=False)
     return None
 
 
 @router.delete("/admin/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_review_admin(
+async def delete_review_admin(
     review_id: int,
-    current_admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_admin: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """Admin xóa đánh giá bất kỳ"""
-    review_service.delete_review(db, review_id, current_admin.user_id, is_admin=True)
+    await review_service.delete_review(db, review_id, current_admin.user_id, is_admin=True)
     return None
\ No newline at end of file
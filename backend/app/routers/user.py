@@ -1,11 +1,15 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime
-from app.core.security import get_password_hash, verify_password, create_access_token
+from app.core.security import password_hasher, password_needs_rehash, create_access_token
 from app.core.database import get_db
-from app.core.dependencies import get_current_user, require_admin
+from app.core.dependencies import get_current_user_record, require_admin
+from app.core.principal_cache import principal_cache
 from app.models.user import User
+from app.services.id_allocator import next_user_id
 from app.schemas.user import (
     RegisterUserSchema, 
     RegisterResponseSchema,
@@ -14,6 +18,8 @@ from app.schemas.user import (
 )
 from app.schemas.user_profile import UserProfileUpdate, UserProfileResponse
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/users", tags=["Users"])
 
 
@@ -23,12 +29,12 @@ router = APIRouter(prefix="/users", tags=["Users"])
 )
 async def register_user(
     user_data: RegisterUserSchema,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Đăng ký tài khoản mới"""
     # Kiểm tra email tồn tại
     stmt = select(User).where(User.email == user_data.email)
-    exist_user = db.execute(stmt).scalar_one_or_none()
+    exist_user = (await db.execute(stmt)).scalar_one_or_none()
     if exist_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,7 +44,7 @@ async def register_user(
     # Kiểm tra số điện thoại
     if user_data.phone:
         stmt = select(User).where(User.phone == user_data.phone)
-        exist_phone = db.execute(stmt).scalar_one_or_none()
+        exist_phone = (await db.execute(stmt)).scalar_one_or_none()
         if exist_phone:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -46,9 +52,8 @@ async def register_user(
             )
 
     # Tạo user mới
-    import uuid
-    new_user_id = str(uuid.uuid4())[:10]
-    hashed_pwd = get_password_hash(user_data.password)
+    new_user_id = await next_user_id()
+    hashed_pwd = await password_hasher.hash(user_data.password)
 
     new_user = User(
         user_id=new_user_id,
@@ -62,8 +67,8 @@ async def register_user(
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return {
         "id": new_user.user_id,
@@ -78,21 +83,31 @@ async def register_user(
 @router.post("/login", response_model=TokenSchema)
 async def login(
     login_data: LoginSchema,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Đăng nhập"""
     # Tìm user theo phone hoặc email
     stmt = select(User).where(
         (User.phone == login_data.phone) | (User.email == login_data.phone)
     )
-    user = db.execute(stmt).scalar_one_or_none()
+    user = (await db.execute(stmt)).scalar_one_or_none()
 
-    if not user or not verify_password(login_data.password, user.password):
+    if not user or not await password_hasher.verify(login_data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Thông tin đăng nhập không đúng"
         )
 
+    # Băm lại mật khẩu nếu cost đã lưu khác cấu hình hiện tại (đang có mật khẩu gốc)
+    if password_needs_rehash(user.password):
+        try:
+            user.password = await password_hasher.hash(login_data.password)
+            await db.commit()
+        except Exception as e:
+            # Không chặn đăng nhập nếu băm lại thất bại, lần sau sẽ thử lại
+            await db.rollback()
+            logger.warning(f"Băm lại mật khẩu thất bại cho {user.user_id}: {e}")
+
     # Tạo token
     access_token = create_access_token(
         data={
@@ -121,8 +136,8 @@ async def login(
 
 @router.get("/me", response_model=UserProfileResponse)
 async def get_current_user_profile(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_record),
+    db: AsyncSession = Depends(get_db)
 ):
     """Lấy thông tin profile của user hiện tại"""
     return {
@@ -138,8 +153,8 @@ async def get_current_user_profile(
 @router.put("/me", response_model=UserProfileResponse)
 async def update_user_profile(
     profile_data: UserProfileUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_record),
+    db: AsyncSession = Depends(get_db)
 ):
     """Cập nhật thông tin cá nhân (user tự cập nhật)"""
     try:
@@ -159,12 +174,12 @@ async def update_user_profile(
             if new_phone != current_user.phone:
                 # Kiểm tra phone trùng (nếu không phải None hoặc empty)
                 if new_phone:
-                    existing = db.execute(
+                    existing = (await db.execute(
                         select(User).where(
                             User.phone == new_phone,
                             User.user_id != current_user.user_id
                         )
-                    ).scalar_one_or_none()
+                    )).scalar_one_or_none()
                     
                     if existing:
                         raise HTTPException(
@@ -191,8 +206,9 @@ async def update_user_profile(
                 detail="Không có thay đổi nào để cập nhật"
             )
         
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        principal_cache.invalidate(current_user.user_id)
+        await db.refresh(current_user)
         
         return {
             "user_id": current_user.user_id,
@@ -206,7 +222,7 @@ async def update_user_profile(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cập nhật thông tin: {str(e)}"
@@ -215,15 +231,15 @@ async def update_user_profile(
 
 @router.get("/admin/users", dependencies=[Depends(require_admin)])
 async def get_all_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     skip: int = 0,
     limit: int = 100
 ):
     """Admin xem danh sách users"""
     from sqlalchemy import func
     
-    total = db.execute(select(func.count()).select_from(User)).scalar()
-    users = db.execute(select(User).offset(skip).limit(limit)).scalars().all()
+    total = (await db.execute(select(func.count()).select_from(User))).scalar()
+    users = (await db.execute(select(User).offset(skip).limit(limit))).scalars().all()
     
     return {
         "total": total,
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Dict, List
 from decimal import Decimal
 
 
@@ -27,4 +28,22 @@ class BookDetail(BaseModel):
     category_name: str | None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class BookSuggestion(BaseModel):
+    type: str  # "title" hoặc "author"
+    text: str
+    book_id: str | None
+
+
+class FacetValue(BaseModel):
+    value: str
+    label: str
+    count: int
+
+
+class BookBrowseResponse(BaseModel):
+    total: int
+    books: List[BookList]
+    facets: Dict[str, List[FacetValue]]  # category, price_band, year, author
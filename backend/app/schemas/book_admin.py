@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import List, Optional
 from decimal import Decimal
 from datetime import datetime
 
@@ -59,4 +59,61 @@ class BookListResponseAdmin(BaseModel):
     total: int
     books: list[BookResponseAdmin]
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BookImportRow(BookCreateAdmin):
+    """Một dòng khi nhập hàng loạt: có book_id thì ghi đè toàn bộ thông tin sách đó (hoặc tạo với mã này), không có thì tạo mới"""
+    book_id: Optional[str] = Field(None, min_length=1, max_length=10)
+
+
+class BookImportError(BaseModel):
+    row: int
+    error: str
+
+
+class BookImportReport(BaseModel):
+    dry_run: bool
+    total_rows: int
+    imported: int  # dry_run: số dòng hợp lệ
+    failed: int
+    errors: List[BookImportError]  # chỉ giữ tối đa MAX_REPORTED_ERRORS lỗi đầu tiên
+
+
+
+class StockAdjustment(BaseModel):
+    """Một dòng đồng bộ kho: đặt tồn kho tuyệt đối (stock_quantity) hoặc cộng/trừ (delta)"""
+    book_id: str = Field(..., min_length=1, max_length=10)
+    stock_quantity: Optional[int] = Field(None, ge=0)
+    delta: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_one_value(self):
+        if (self.stock_quantity is None) == (self.delta is None):
+            raise ValueError("Cần đúng một trong hai trường stock_quantity hoặc delta")
+        return self
+
+
+class BulkStockRequest(BaseModel):
+    items: List[StockAdjustment] = Field(..., min_length=1, max_length=50000)
+
+
+class StockChange(BaseModel):
+    book_id: str
+    old: int
+    new: int
+
+
+class StockRejected(BaseModel):
+    book_id: str
+    stock_quantity: int  # tồn kho hiện tại
+    delta: int
+
+
+class BulkStockResponse(BaseModel):
+    """Chỉ liệt kê sách thực sự thay đổi"""
+    updated: int
+    unchanged: int
+    changes: List[StockChange]
+    not_found: List[str]
+    rejected: List[StockRejected]  # delta làm tồn kho âm, bị bỏ qua
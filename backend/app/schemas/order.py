@@ -60,14 +60,34 @@ class OrderResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class OrderSummary(BaseModel):
+    """Một dòng trong danh sách đơn dạng gọn (không kèm chi tiết)"""
+    order_id: str
+    total_amount: Decimal
+    status_id: str
+    order_status: str
+    created_at: datetime
+    item_count: int
+    total_quantity: int
+    first_cover_image_url: Optional[str] = None
+
+
 class UserOrderHistoryResponse(BaseModel):
     """Schema cho lịch sử đơn hàng của user"""
-    total: int
+    total: Optional[int] = None  # chỉ tính ở trang đầu (không có cursor)
+    next_cursor: Optional[str] = None
     orders: List[OrderResponse]
     
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserOrderSummaryResponse(BaseModel):
+    """Lịch sử đơn hàng dạng gọn (view=compact)"""
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
+    orders: List[OrderSummary]
+
+
 class OrderStatusUpdate(BaseModel):
     """Schema để cập nhật trạng thái đơn hàng"""
     new_status: str = Field(..., description="Trạng thái mới: confirmed, shipping, completed, cancelled")
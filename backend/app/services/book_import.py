@@ -0,0 +1,218 @@
+import codecs
+import csv
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.file_formats import check_format
+from app.core.upsert import upsert_rows
+from app.models.book import Book
+from app.schemas.book_admin import BookImportRow
+from app.services.id_allocator import next_book_ids, advance_book_ids_past
+from app.services.reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+# Báo cáo chỉ giữ chừng này lỗi để file hỏng hoàn toàn không làm phình bộ nhớ
+MAX_REPORTED_ERRORS = 1000
+
+# Cột được ghi đè khi book_id đã tồn tại (giữ nguyên sold_quantity và created_at)
+UPDATE_COLUMNS = (
+    "title", "author", "publisher", "publication_year", "category_id", "price",
+    "stock_quantity", "description", "cover_image_url", "updated_at",
+)
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Tách luồng bytes thành từng dòng (giữ ký tự xuống dòng), không đọc cả file vào bộ nhớ"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def _iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    header = None
+    record = ""
+    row_number = 0
+    async for line in _iter_lines(chunks):
+        record += line
+        # Số dấu " lẻ nghĩa là đang ở giữa một ô có xuống dòng -> chờ dòng tiếp theo
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, None, f"Số cột không khớp tiêu đề ({len(values)}/{len(header)})"
+        else:
+            yield row_number, dict(zip(header, values)), None
+    if record.strip():
+        yield row_number + 1, None, "Ô có dấu ngoặc kép chưa được đóng"
+
+
+async def _iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    row_number = 0
+    async for line in _iter_lines(chunks):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"JSON không hợp lệ: {e}"
+            continue
+        if isinstance(data, dict):
+            yield row_number, data, None
+        else:
+            yield row_number, None, "Mỗi dòng phải là một object JSON"
+
+
+def iter_records(chunks: AsyncIterator[bytes], file_format: str):
+    """Trả về (số thứ tự dòng dữ liệu, dict hoặc None, lỗi hoặc None) theo từng dòng"""
+    check_format(file_format)
+    if file_format == "ndjson":
+        return _iter_ndjson(chunks)
+    return _iter_csv(chunks)
+
+
+def _validate(data: dict) -> Tuple[Optional[BookImportRow], Optional[str]]:
+    # Ô trống trong CSV nghĩa là không có giá trị
+    cleaned = {
+        key: (value.strip() or None) if isinstance(value, str) else value
+        for key, value in data.items() if key
+    }
+    try:
+        return BookImportRow.model_validate(cleaned), None
+    except ValidationError as e:
+        return None, "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+            for error in e.errors()
+        )
+
+
+class _Report:
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.total_rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def fail(self, row: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+    def to_dict(self) -> dict:
+        return {
+            "dry_run": self.dry_run,
+            "total_rows": self.total_rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+async def _write_batch(db: AsyncSession, batch: List[Tuple[int, BookImportRow]], report: _Report):
+    """Ghi một lô bằng một executemany và một commit; lỗi thì cả lô bị đánh dấu thất bại"""
+    now = datetime.utcnow()
+    try:
+        # book_id ghi tường minh: đẩy bộ cấp phát qua trước, để ID cấp mới (kể cả trong lô này)
+        # và create_book_admin về sau không trùng
+        await advance_book_ids_past(book.book_id for _, book in batch if book.book_id)
+        new_ids = iter(await next_book_ids(sum(1 for _, book in batch if not book.book_id)))
+        rows = [
+            {
+                "book_id": book.book_id or next(new_ids),
+                "title": book.title,
+                "author": book.author,
+                "publisher": book.publisher,
+                "publication_year": book.publication_year,
+                "category_id": book.category_id,
+                "price": book.price,
+                "stock_quantity": book.stock_quantity,
+                "sold_quantity": 0,
+                "description": book.description,
+                "cover_image_url": book.cover_image_url,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for _, book in batch
+        ]
+        await upsert_rows(db, Book, rows, keys=["book_id"], update_columns=UPDATE_COLUMNS)
+        await db.commit()
+        report.imported += len(batch)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Lỗi ghi lô sách nhập: {e}")
+        for row_number, _ in batch:
+            report.fail(row_number, f"Lỗi ghi dữ liệu: {str(e)}")
+
+
+async def import_books(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    file_format: str = "csv",
+    dry_run: bool = False,
+    batch_size: int = None
+) -> dict:
+    """
+    Nhập sách từ luồng CSV (có dòng tiêu đề) hoặc NDJSON:
+    - Kiểm tra từng dòng theo BookImportRow, thể loại lấy từ reference_cache
+    - Ghi theo lô BOOK_IMPORT_BATCH_SIZE dòng (upsert theo book_id), lô lỗi không ảnh hưởng lô khác
+    - dry_run chỉ kiểm tra, không ghi
+    """
+    batch_size = batch_size or settings.BOOK_IMPORT_BATCH_SIZE
+    report = _Report(dry_run)
+    refs = await reference_cache.get(db)
+    known_categories = set(refs.category_names)
+    missing_categories = set()
+    batch: List[Tuple[int, BookImportRow]] = []
+
+    async for row_number, data, error in iter_records(chunks, file_format):
+        report.total_rows += 1
+        book = None
+        if error is None:
+            book, error = _validate(data)
+        if error is None and book.category_id not in known_categories:
+            # Thể loại vừa tạo có thể chưa có trong cache: hỏi lại một lần cho mỗi mã
+            if book.category_id not in missing_categories:
+                if await reference_cache.category_name(db, book.category_id) is not None:
+                    known_categories.add(book.category_id)
+                else:
+                    missing_categories.add(book.category_id)
+            if book.category_id in missing_categories:
+                error = f"Thể loại không tồn tại: {book.category_id}"
+        if error is not None:
+            report.fail(row_number, error)
+            continue
+
+        if dry_run:
+            report.imported += 1
+            continue
+        batch.append((row_number, book))
+        if len(batch) >= batch_size:
+            await _write_batch(db, batch, report)
+            batch = []
+
+    if batch:
+        await _write_batch(db, batch, report)
+    return report.to_dict()
@@ -0,0 +1,617 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.book import Book
+
+logger = logging.getLogger(__name__)
+
+# Trọng số của từng trường khi tính tần suất từ (title quan trọng nhất)
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "author": 2.0,
+    "publisher": 1.0,
+    "description": 1.0,
+}
+
+# Tham số BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def fold_text(text: str) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt: 'Đắc Nhân Tâm' -> 'dac nhan tam'"""
+    text = text.lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+@lru_cache(maxsize=200_000)
+def _fold_token(token: str) -> str:
+    return fold_text(token)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    # Tách từ trên chuỗi gốc (dạng NFC) rồi bỏ dấu từng từ, có cache vì từ vựng lặp lại nhiều
+    return [_fold_token(token) for token in _TOKEN_RE.findall(unicodedata.normalize("NFC", text).lower())]
+
+
+class _Index:
+    """Chỉ mục đảo: term -> {book_id: tần suất có trọng số}"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_terms: Dict[str, Dict[str, float]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.total_length = 0.0
+
+    def add(self, book_id: str, fields: Dict[str, Optional[str]]):
+        self.remove(book_id)
+        terms: Dict[str, float] = {}
+        for name, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(name)):
+                terms[token] = terms.get(token, 0.0) + weight
+        if not terms:
+            return
+
+        length = sum(terms.values())
+        self.doc_terms[book_id] = terms
+        self.doc_lengths[book_id] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[book_id] = tf
+
+    def remove(self, book_id: str):
+        terms = self.doc_terms.pop(book_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(book_id)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(book_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        n_docs = len(self.doc_lengths)
+        if not terms or not n_docs:
+            return []
+
+        avg_length = self.total_length / n_docs
+        scores: Dict[str, float] = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for book_id, tf in posting.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[book_id] / avg_length)
+                scores[book_id] = scores.get(book_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+class _Suggester:
+    """
+    Gợi ý theo tiền tố cho tên sách và tác giả, ưu tiên sold_quantity cao.
+    - keys: mảng khóa đã bỏ dấu được sắp xếp, tìm đoạn khớp tiền tố bằng bisect
+    - popular: các khóa theo sold_quantity giảm dần; khi tiền tố khớp quá nhiều mục
+      (vd: 1 ký tự) thì duyệt danh sách này thay vì sắp xếp cả đoạn
+    - Mỗi tác giả chỉ có một mục, trọng số là sách bán chạy nhất của tác giả đó
+    """
+
+    # Ký tự lớn hơn mọi ký tự trong khóa, dùng làm cận trên của đoạn tiền tố
+    _MAX_CHAR = "\U0010ffff"
+    # Đoạn khớp lớn hơn ngưỡng này thì duyệt theo popular
+    _DENSE_RANGE = 2000
+
+    def __init__(self):
+        # Khóa: "<tên sách bỏ dấu>\x00title\x00<book_id>" hoặc "<tác giả bỏ dấu>\x00author"
+        self.keys: List[str] = []
+        self.popular: List[Tuple[int, str]] = []  # (-sold_quantity, khóa)
+        self.entries: Dict[str, Tuple[int, str, str, Optional[str]]] = {}  # khóa -> (sold, loại, text, book_id)
+        self.doc_keys: Dict[str, Tuple[Optional[str], Optional[str]]] = {}  # book_id -> (khóa title, khóa author)
+        self.author_books: Dict[str, Dict[str, int]] = {}  # khóa author -> {book_id: sold}
+        # Kết quả theo (tiền tố, limit), xóa toàn bộ khi có thay đổi
+        self._cache: Dict[Tuple[str, int], List[dict]] = {}
+        self._bulk = False
+
+    def _put(self, key: str, entry: Tuple[int, str, str, Optional[str]]):
+        if key in self.entries:
+            self._drop(key)
+        self.entries[key] = entry
+        if self._bulk:
+            self.keys.append(key)
+            self.popular.append((-entry[0], key))
+        else:
+            bisect.insort(self.keys, key)
+            bisect.insort(self.popular, (-entry[0], key))
+
+    def _drop(self, key: str):
+        sold = self.entries.pop(key)[0]
+        for array, value in ((self.keys, key), (self.popular, (-sold, key))):
+            position = bisect.bisect_left(array, value)
+            if position < len(array) and array[position] == value:
+                del array[position]
+
+    def _refresh_author(self, author_key: str, text: Optional[str] = None):
+        books = self.author_books.get(author_key)
+        if not books:
+            self.author_books.pop(author_key, None)
+            if author_key in self.entries:
+                self._drop(author_key)
+            return
+        best = max(books.values())
+        current = self.entries.get(author_key)
+        if current is None or current[0] != best:
+            self._put(author_key, (best, "author", text or current[2], None))
+
+    def add(self, book_id: str, fields: Dict[str, Optional[str]], keep_sorted: bool = True):
+        """Thêm/cập nhật một sách. keep_sorted=False khi nạp hàng loạt, gọi finish() ở cuối"""
+        self.remove(book_id)
+        self._cache.clear()
+        self._bulk = not keep_sorted
+        sold = fields.get("sold_quantity") or 0
+
+        title_key = None
+        folded_title = " ".join(tokenize(fields.get("title")))
+        if folded_title:
+            title_key = f"{folded_title}\x00title\x00{book_id}"
+            self._put(title_key, (sold, "title", fields["title"], book_id))
+
+        author_key = None
+        folded_author = " ".join(tokenize(fields.get("author")))
+        if folded_author:
+            author_key = f"{folded_author}\x00author"
+            self.author_books.setdefault(author_key, {})[book_id] = sold
+            # Khi nạp hàng loạt, mục tác giả được tạo một lần trong finish()
+            if keep_sorted:
+                self._refresh_author(author_key, fields["author"])
+            elif author_key not in self.entries:
+                self.entries[author_key] = (0, "author", fields["author"], None)
+
+        if title_key or author_key:
+            self.doc_keys[book_id] = (title_key, author_key)
+
+    def finish(self):
+        """Tạo mục tác giả và sắp xếp một lần sau khi nạp hàng loạt"""
+        for author_key, books in self.author_books.items():
+            _, kind, text, _ = self.entries[author_key]
+            best = max(books.values())
+            self.entries[author_key] = (best, kind, text, None)
+            self.keys.append(author_key)
+            self.popular.append((-best, author_key))
+        self.keys.sort()
+        self.popular.sort()
+        self._bulk = False
+        self._cache.clear()
+
+    def remove(self, book_id: str):
+        keys = self.doc_keys.pop(book_id, None)
+        if not keys:
+            return
+        self._cache.clear()
+        title_key, author_key = keys
+        if title_key:
+            self._drop(title_key)
+        if author_key:
+            self.author_books.get(author_key, {}).pop(book_id, None)
+            self._refresh_author(author_key)
+
+    def _candidates(self, folded: str, count: int) -> List[str]:
+        start = bisect.bisect_left(self.keys, folded)
+        end = bisect.bisect_left(self.keys, folded + self._MAX_CHAR, lo=start)
+        if end - start <= self._DENSE_RANGE:
+            return heapq.nlargest(count, self.keys[start:end], key=lambda key: self.entries[key][0])
+
+        # Tiền tố phổ biến: duyệt theo độ bán chạy, dừng khi đủ
+        found = []
+        for _, key in self.popular:
+            if key.startswith(folded):
+                found.append(key)
+                if len(found) >= count:
+                    break
+        return found
+
+    def suggest(self, prefix: str, limit: int) -> List[dict]:
+        folded = " ".join(tokenize(prefix))
+        if not folded:
+            return []
+        # Giữ khoảng trắng cuối khi người dùng đã gõ xong một từ
+        if prefix[-1:].isspace():
+            folded += " "
+
+        cached = self._cache.get((folded, limit))
+        if cached is not None:
+            return cached
+
+        results = []
+        for key in self._candidates(folded, limit):
+            _, kind, text, book_id = self.entries[key]
+            results.append({"type": kind, "text": text, "book_id": book_id})
+
+        if len(self._cache) >= 10000:
+            self._cache.clear()
+        self._cache[(folded, limit)] = results
+        return results
+
+
+# Khoảng giá cho facet price_band: (mã, giá từ, giá đến (không gồm), nhãn)
+PRICE_BANDS = [
+    ("0-50000", 0, 50000, "Dưới 50.000đ"),
+    ("50000-100000", 50000, 100000, "50.000đ - 100.000đ"),
+    ("100000-200000", 100000, 200000, "100.000đ - 200.000đ"),
+    ("200000-500000", 200000, 500000, "200.000đ - 500.000đ"),
+    ("500000-", 500000, None, "Trên 500.000đ"),
+]
+
+
+def price_band(price) -> Optional[str]:
+    if price is None:
+        return None
+    for code, low, high, _ in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return code
+    return None
+
+
+def _iter_bits(bits: int):
+    """Duyệt vị trí các bit 1 theo thứ tự tăng dần (qua bytes, nhanh hơn tách từng bit)"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield byte_index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+def _to_bits(slots, size: int) -> int:
+    """Dựng bitmap từ danh sách vị trí (một lần, thay vì OR lần lượt vào số nguyên lớn)"""
+    buffer = bytearray((size + 7) // 8)
+    for slot in slots:
+        buffer[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class _Facets:
+    """
+    Bitmap (số nguyên Python) cho từng giá trị facet: bit thứ i ứng với sách ở vị trí i.
+    Lọc = AND giữa các facet (OR trong cùng facet), đếm = popcount.
+    Tác giả có quá nhiều giá trị để giữ mỗi giá trị một bitmap dày, nên lưu tập vị trí.
+    """
+
+    FACETS = ("category", "price_band", "year", "author")
+    BITMAP_FACETS = ("category", "price_band", "year")
+    # Tập kết quả lớn hơn mốc này thì chỉ đếm trên các tác giả nhiều sách nhất
+    _AUTHOR_SCAN_LIMIT = 20000
+    _AUTHOR_TOP = 200
+
+    def __init__(self):
+        self.book_ids: List[Optional[str]] = []
+        self.slots: Dict[str, int] = {}
+        # Vị trí của sách đã xóa, dùng lại cho sách thêm mới (nhỏ nhất trước)
+        self.free_slots: List[int] = []
+        self.doc_values: Dict[str, Dict[str, str]] = {}
+        self.bitmaps: Dict[str, Dict[str, int]] = {facet: {} for facet in self.BITMAP_FACETS}
+        self.author_slots: Dict[str, set] = {}
+        self.all_bits = 0
+        # Khi nạp hàng loạt: gom vị trí theo giá trị, finish() mới dựng bitmap
+        self._bulk: Optional[Dict[str, Dict[str, List[int]]]] = None
+
+    @staticmethod
+    def _values(fields: dict) -> Dict[str, str]:
+        year = fields.get("publication_year")
+        values = {
+            "category": fields.get("category_id"),
+            "price_band": price_band(fields.get("price")),
+            "year": str(year) if year is not None else None,
+            "author": fields.get("author"),
+        }
+        return {facet: value for facet, value in values.items() if value}
+
+    def add(self, book_id: str, fields: dict, bulk: bool = False):
+        # Sửa sách thì giữ nguyên vị trí để thứ tự kết quả không đổi
+        slot = self.slots.get(book_id)
+        if slot is None:
+            if self.free_slots:
+                slot = heapq.heappop(self.free_slots)
+                self.book_ids[slot] = book_id
+            else:
+                slot = len(self.book_ids)
+                self.book_ids.append(book_id)
+            self.slots[book_id] = slot
+        else:
+            self._clear(book_id, slot)
+
+        values = self._values(fields)
+        self.doc_values[book_id] = values
+        author = values.get("author")
+        if author:
+            self.author_slots.setdefault(author, set()).add(slot)
+
+        if bulk:
+            if self._bulk is None:
+                self._bulk = {facet: {} for facet in self.BITMAP_FACETS}
+            for facet in self.BITMAP_FACETS:
+                if facet in values:
+                    self._bulk[facet].setdefault(values[facet], []).append(slot)
+            return
+
+        bit = 1 << slot
+        for facet in self.BITMAP_FACETS:
+            if facet in values:
+                bitmaps = self.bitmaps[facet]
+                bitmaps[values[facet]] = bitmaps.get(values[facet], 0) | bit
+        self.all_bits |= bit
+
+    def finish(self):
+        """Dựng bitmap sau khi nạp hàng loạt bằng add(..., bulk=True)"""
+        if self._bulk is None:
+            return
+        size = len(self.book_ids)
+        for facet, groups in self._bulk.items():
+            for value, slots in groups.items():
+                self.bitmaps[facet][value] = self.bitmaps[facet].get(value, 0) | _to_bits(slots, size)
+        self.all_bits |= _to_bits((self.slots[book_id] for book_id in self.doc_values), size)
+        self._bulk = None
+
+    def _clear(self, book_id: str, slot: int):
+        mask = ~(1 << slot)
+        for facet, value in self.doc_values.pop(book_id, {}).items():
+            if facet == "author":
+                slots = self.author_slots[value]
+                slots.discard(slot)
+                if not slots:
+                    del self.author_slots[value]
+                continue
+            remaining = self.bitmaps[facet][value] & mask
+            if remaining:
+                self.bitmaps[facet][value] = remaining
+            else:
+                del self.bitmaps[facet][value]
+        self.all_bits &= mask
+
+    def remove(self, book_id: str):
+        slot = self.slots.pop(book_id, None)
+        if slot is None:
+            return
+        self._clear(book_id, slot)
+        self.book_ids[slot] = None
+        heapq.heappush(self.free_slots, slot)
+
+    def _facet_bits(self, facet: str, values: List[str]) -> int:
+        if facet == "author":
+            slots = [slot for value in values for slot in self.author_slots.get(value, ())]
+            return _to_bits(slots, len(self.book_ids))
+        union = 0
+        for value in values:
+            union |= self.bitmaps[facet].get(value, 0)
+        return union
+
+    def _match(self, filter_bits: Dict[str, int], exclude: str = None) -> int:
+        bits = self.all_bits
+        for facet, union in filter_bits.items():
+            if facet != exclude:
+                bits &= union
+        return bits
+
+    def _count_authors(self, base: int) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        if base.bit_count() <= self._AUTHOR_SCAN_LIMIT:
+            for slot in _iter_bits(base):
+                author = self.doc_values[self.book_ids[slot]].get("author")
+                if author:
+                    counts[author] = counts.get(author, 0) + 1
+            return counts
+
+        # Tập lớn: kiểm tra bit trong bytes cho các tác giả nhiều sách nhất (xấp xỉ top)
+        data = base.to_bytes((base.bit_length() + 7) // 8, "little")
+        largest = heapq.nlargest(self._AUTHOR_TOP, self.author_slots.items(), key=lambda item: len(item[1]))
+        for author, slots in largest:
+            count = sum(
+                1 for slot in slots
+                if (slot >> 3) < len(data) and data[slot >> 3] >> (slot & 7) & 1
+            )
+            if count:
+                counts[author] = count
+        return counts
+
+    def browse(self, filters: Dict[str, List[str]], skip: int, limit: int):
+        """Trả về (tổng số, book_ids của trang, {facet: {giá trị: số sách}})"""
+        filter_bits = {
+            facet: self._facet_bits(facet, values)
+            for facet, values in filters.items() if values
+        }
+        matched = self._match(filter_bits)
+        total = matched.bit_count()
+
+        book_ids = []
+        for position, slot in enumerate(_iter_bits(matched)):
+            if position < skip:
+                continue
+            if len(book_ids) >= limit:
+                break
+            book_ids.append(self.book_ids[slot])
+
+        counts = {}
+        for facet in self.FACETS:
+            # Facet đang lọc: đếm theo các bộ lọc còn lại để vẫn thấy các lựa chọn khác
+            base = self._match(filter_bits, exclude=facet) if facet in filter_bits else matched
+            if facet == "author":
+                counts[facet] = self._count_authors(base)
+                continue
+            counts[facet] = {}
+            for value, bitmap in self.bitmaps[facet].items():
+                count = (bitmap & base).bit_count()
+                if count:
+                    counts[facet][value] = count
+        return total, book_ids, counts
+
+
+class BookSearchIndex:
+    """
+    Tìm kiếm toàn văn trong bộ nhớ cho sách (title, author, publisher, description).
+    - Không phân biệt dấu tiếng Việt, xếp hạng BM25
+    - Gợi ý theo tiền tố cho tên sách/tác giả, ưu tiên sách bán chạy
+    - Lọc theo facet (thể loại, khoảng giá, năm xuất bản, tác giả) kèm số lượng
+    - Nạp nền khi khởi động (start), cập nhật từng sách khi admin thêm/sửa/xóa
+    - Tự nạp lại nền sau SEARCH_INDEX_REFRESH_SECONDS để đồng bộ thay đổi từ worker khác
+    """
+
+    def __init__(self, session_factory=SessionLocal, refresh_seconds: int = None):
+        self._session_factory = session_factory
+        self._refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None else settings.SEARCH_INDEX_REFRESH_SECONDS
+        )
+        self._index = _Index()
+        self._suggester = _Suggester()
+        self._facets = _Facets()
+        self._built_at: Optional[float] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+        # Thay đổi xảy ra trong lúc đang nạp lại, áp dụng lại sau khi đổi chỉ mục
+        self._pending: Optional[List[Tuple[str, Optional[dict]]]] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._index.doc_lengths)
+
+    def start(self):
+        """Nạp chỉ mục ở nền để không làm chậm khởi động (catalogue lớn mất vài giây)"""
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self._refresh())
+
+    async def stop(self):
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            self._rebuild_task.cancel()
+            try:
+                await self._rebuild_task
+            except asyncio.CancelledError:
+                pass
+        self._rebuild_task = None
+
+    @staticmethod
+    def _add_rows(index: _Index, suggester: _Suggester, facets: _Facets, rows):
+        """Thêm một lô sách vào chỉ mục mới (chạy trong thread, chỉ mục chưa được dùng để tìm kiếm)"""
+        for row in rows:
+            fields = row._asdict()
+            index.add(row.book_id, fields)
+            suggester.add(row.book_id, fields, keep_sorted=False)
+            facets.add(row.book_id, fields, bulk=True)
+
+    @staticmethod
+    def _finish(suggester: _Suggester, facets: _Facets):
+        suggester.finish()
+        facets.finish()
+
+    async def rebuild(self):
+        """
+        Nạp lại toàn bộ chỉ mục từ bảng books (đọc theo luồng, không giữ hết trong bộ nhớ).
+        Phần tách từ / sắp xếp / dựng bitmap chạy trong thread để không chặn event loop;
+        chỉ mục cũ vẫn phục vụ tìm kiếm cho tới khi chỉ mục mới được đổi vào.
+        """
+        self._pending = []
+        try:
+            index = _Index()
+            suggester = _Suggester()
+            facets = _Facets()
+            stmt = (
+                select(
+                    Book.book_id, Book.title, Book.author, Book.publisher, Book.description,
+                    Book.sold_quantity, Book.category_id, Book.price, Book.publication_year
+                )
+                .order_by(Book.book_id)
+                .execution_options(yield_per=2000)
+            )
+            async with self._session_factory() as db:
+                result = await db.stream(stmt)
+                async for partition in result.partitions():
+                    await asyncio.to_thread(self._add_rows, index, suggester, facets, partition)
+            await asyncio.to_thread(self._finish, suggester, facets)
+
+            # Thay đổi trong lúc nạp (ít) được áp dụng trên event loop, ngay trước khi đổi chỉ mục
+            for book_id, fields in self._pending:
+                if fields is None:
+                    index.remove(book_id)
+                    suggester.remove(book_id)
+                    facets.remove(book_id)
+                else:
+                    index.add(book_id, fields)
+                    suggester.add(book_id, fields)
+                    facets.add(book_id, fields)
+            # Không có await giữa các phép gán: request nào cũng thấy trọn bộ cũ hoặc trọn bộ mới
+            self._index, self._suggester, self._facets = index, suggester, facets
+            self._built_at = time.monotonic()
+        finally:
+            self._pending = None
+
+    def _maybe_refresh(self):
+        if self._built_at is None or self._refresh_seconds <= 0:
+            return
+        if time.monotonic() - self._built_at < self._refresh_seconds:
+            return
+        self.start()
+
+    async def _refresh(self):
+        try:
+            await self.rebuild()
+            logger.info(f"Đã nạp chỉ mục tìm kiếm: {self.size} sách")
+        except Exception as e:
+            logger.error(f"Lỗi nạp lại chỉ mục tìm kiếm: {e}")
+            # Thử lại ở chu kỳ sau
+            self._built_at = time.monotonic()
+
+    def upsert(self, book: Book):
+        """Cập nhật một sách vào chỉ mục (gọi sau khi commit)"""
+        fields = {name: getattr(book, name) for name in FIELD_WEIGHTS}
+        for name in ("sold_quantity", "category_id", "price", "publication_year"):
+            fields[name] = getattr(book, name)
+        self._index.add(book.book_id, fields)
+        self._suggester.add(book.book_id, fields)
+        self._facets.add(book.book_id, fields)
+        if self._pending is not None:
+            self._pending.append((book.book_id, fields))
+
+    def remove(self, book_id: str):
+        """Xóa một sách khỏi chỉ mục (gọi sau khi commit)"""
+        self._index.remove(book_id)
+        self._suggester.remove(book_id)
+        self._facets.remove(book_id)
+        if self._pending is not None:
+            self._pending.append((book_id, None))
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Trả về [(book_id, điểm)] theo thứ tự liên quan giảm dần"""
+        self._maybe_refresh()
+        return self._index.search(query, limit)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Gợi ý tên sách/tác giả bắt đầu bằng prefix (không phân biệt dấu)"""
+        self._maybe_refresh()
+        return self._suggester.suggest(prefix, limit)
+
+    def browse(self, filters: Dict[str, List[str]], skip: int = 0, limit: int = 20):
+        """Lọc theo facet: (tổng số, book_ids của trang, số sách theo từng giá trị facet)"""
+        self._maybe_refresh()
+        return self._facets.browse(filters, skip, limit)
+
+
+# Chỉ mục dùng chung cho toàn ứng dụng
+book_search_index = BookSearchIndex()
@@ -1,29 +1,74 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 from fastapi import HTTPException
 from app.models.category import Category  #
+from app.models.book import Book
 from app.schemas.category import CategoryCreate, CategoryUpdate
+from app.services.reference_cache import reference_cache
 
 
 
-def get_all(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Category).offset(skip).limit(limit).all()
+async def get_all(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(select(Category).offset(skip).limit(limit))
+    return result.scalars().all()
 
 
-def get_by_id(db: Session, category_id: str):
-    return db.query(Category).filter(Category.category_id == category_id).first()
+async def get_by_id(db: AsyncSession, category_id: str):
+    result = await db.execute(select(Category).where(Category.category_id == category_id))
+    return result.scalars().first()
 
 
+def _with_book_stats():
+    """Thể loại kèm số sách và tổng tồn kho, tính bằng một GROUP BY trên books"""
+    return (
+        select(
+            Category.category_id,
+            Category.category_name,
+            func.count(Book.book_id).label("book_count"),
+            func.coalesce(func.sum(Book.stock_quantity), 0).label("total_stock"),
+        )
+        .outerjoin(Book, Book.category_id == Category.category_id)
+        .group_by(Category.category_id, Category.category_name)
+    )
+
+
+async def get_all_with_book_stats(db: AsyncSession, skip: int = 0, limit: int = 100):
+    """Một trang thể loại kèm thống kê sách (1 truy vấn cho cả trang)"""
+    # Phân trang trên bảng categories trước rồi mới join books
+    page = (
+        select(Category.category_id)
+        .order_by(Category.category_id)
+        .offset(skip)
+        .limit(limit)
+        .subquery()
+    )
+    stmt = (
+        _with_book_stats()
+        .join(page, page.c.category_id == Category.category_id)
+        .order_by(Category.category_id)
+    )
+    rows = (await db.execute(stmt)).mappings().all()
+    return [dict(row) for row in rows]
+
 
+async def get_with_book_stats(db: AsyncSession, category_id: str):
+    """Một thể loại kèm thống kê sách, None nếu không tồn tại"""
+    stmt = _with_book_stats().where(Category.category_id == category_id)
+    row = (await db.execute(stmt)).mappings().first()
+    return dict(row) if row else None
 
-def create(db: Session, category: CategoryCreate):
-    if get_by_id(db, category.category_id):
+
+
+
+async def create(db: AsyncSession, category: CategoryCreate):
+    if await get_by_id(db, category.category_id):
         raise HTTPException(status_code=400, detail="Category ID already exists")
 
     existing_name = (
-        db.query(Category)
-        .filter(Category.category_name == category.category_name)
-        .first()
-    )
+        await db.execute(
+            select(Category).where(Category.category_name == category.category_name)
+        )
+    ).scalars().first()
     if existing_name:
         raise HTTPException(status_code=400, detail="Category name already exists")
 
@@ -31,34 +76,41 @@ def create(db: Session, category: CategoryCreate):
         category_id=category.category_id, category_name=category.category_name
     )
     db.add(new_category)
-    db.commit()
-    db.refresh(new_category)
+    await db.commit()
+    reference_cache.invalidate()
+    await db.refresh(new_category)
     return new_category
 
 
-def update(db: Session, category_id: str, category_update: CategoryUpdate):
+async def update(db: AsyncSession, category_id: str, category_update: CategoryUpdate):
 
-    category = get_by_id(db, category_id)
+    category = await get_by_id(db, category_id)
     if not category:
         return None
 
     if category_update.category_name:
         existing = (
-            db.query(Category)
-            .filter(Category.category_name == category_update.category_name)
-            .first()
-        )
+            await db.execute(
+                select(Category).where(Category.category_name == category_update.category_name)
+            )
+        ).scalars().first()
         if existing and existing.category_id != category_id:
             raise HTTPException(status_code=400, detail="Category name already exists")
         category.category_name = category_update.category_name
 
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    reference_cache.invalidate()
+    await db.refresh(category)
     return category
 
 
-def delete(db: Session, category_id: str):
+async def delete(db: AsyncSession, category_id: str):
 
-    category = get_by_id(db, category_id)
+    category = await get_by_id(db, category_id)
     if not category:
-        return False
\ No newline at end of file
+        return False
+
+    await db.delete(category)
+    await db.commit()
+    reference_cache.invalidate()
+    return True
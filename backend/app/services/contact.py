@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from datetime import datetime
 from fastapi import HTTPException
@@ -9,8 +9,8 @@ from app.models.user import User
 from app.schemas.contact import ContactCreate, ContactReply
 
 
-def get_all(
-    db: Session, 
+async def get_all(
+    db: AsyncSession, 
     skip: int = 0, 
     limit: int = 100, 
     status_filter: Optional[str] = None
@@ -22,35 +22,35 @@ def get_all(
         stmt = stmt.where(Contact.status == status_filter)
     
     stmt = stmt.order_by(Contact.sent_at.desc()).offset(skip).limit(limit)
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
-def count_contacts(db: Session, status_filter: Optional[str] = None) -> int:
+async def count_contacts(db: AsyncSession, status_filter: Optional[str] = None) -> int:
     """Đếm tổng số liên hệ"""
     stmt = select(func.count()).select_from(Contact)
     
     if status_filter:
         stmt = stmt.where(Contact.status == status_filter)
     
-    return db.execute(stmt).scalar()
+    return (await db.execute(stmt)).scalar()
 
 
-def get_by_id(db: Session, contact_id: int):
+async def get_by_id(db: AsyncSession, contact_id: int):
     """Lấy chi tiết liên hệ theo ID"""
     stmt = select(Contact).where(Contact.contact_id == contact_id)
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalar_one_or_none()
 
 
-def get_by_user_id(db: Session, user_id: str):
+async def get_by_user_id(db: AsyncSession, user_id: str):
     """Lấy danh sách liên hệ của một user"""
     stmt = select(Contact).where(Contact.user_id == user_id).order_by(Contact.sent_at.desc())
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
-def create(db: Session, contact_data: ContactCreate):
+async def create(db: AsyncSession, contact_data: ContactCreate):
     """Gửi liên hệ mới"""
     # Khởi tạo biến
     final_full_name = contact_data.full_name
@@ -59,7 +59,7 @@ def create(db: Session, contact_data: ContactCreate):
     # TH1: Có User ID -> Tự động lấy thông tin từ bảng Users
     if contact_data.user_id:
         stmt = select(User).where(User.user_id == contact_data.user_id)
-        user = db.execute(stmt).scalar_one_or_none()
+        user = (await db.execute(stmt)).scalar_one_or_none()
         
         if not user:
             raise HTTPException(status_code=404, detail="User ID not found")
@@ -87,14 +87,14 @@ def create(db: Session, contact_data: ContactCreate):
     )
     
     db.add(new_contact)
-    db.commit()
-    db.refresh(new_contact)
+    await db.commit()
+    await db.refresh(new_contact)
     return new_contact
 
 
-def respond(db: Session, contact_id: int, reply_data: ContactReply):
+async def respond(db: AsyncSession, contact_id: int, reply_data: ContactReply):
     """Admin phản hồi liên hệ"""
-    contact = get_by_id(db, contact_id)
+    contact = await get_by_id(db, contact_id)
     if not contact:
         return None
 
@@ -102,24 +102,24 @@ def respond(db: Session, contact_id: int, reply_data: ContactReply):
     contact.status = "resolved"
     contact.responded_at = datetime.utcnow()
 
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
     return contact
 
 
-def delete(db: Session, contact_id: int):
+async def delete(db: AsyncSession, contact_id: int):
     """Xóa liên hệ"""
-    contact = get_by_id(db, contact_id)
+    contact = await get_by_id(db, contact_id)
     if not contact:
         return False
 
-    db.delete(contact)
-    db.commit()
+    await db.delete(contact)
+    await db.commit()
     return True
 
-def get_all_admin(db: Session, skip: int = 0, limit: int = 100):
-    return (
-        db.query(Contact)
+async def get_all_admin(db: AsyncSession, skip: int = 0, limit: int = 100):
+    stmt = (
+        select(Contact)
         .order_by(
             Contact.status.asc(),  # 'pending' hiện lên trước 'resolved'
             Contact.user_id.asc(),  # Nhóm tin nhắn của cùng 1 user
@@ -127,18 +127,20 @@ def get_all_admin(db: Session, skip: int = 0, limit: int = 100):
         )
         .offset(skip)
         .limit(limit)
-        .all()
     )
+    result = await db.execute(stmt)
+    return result.scalars().all()
 
 
 # 7. Thêm hàm lấy thông báo cho KHÁCH HÀNG
-def get_user_notifications(db: Session, user_id: str):
-    return (
-        db.query(Contact)
-        .filter(
+async def get_user_notifications(db: AsyncSession, user_id: str):
+    stmt = (
+        select(Contact)
+        .where(
             Contact.user_id == user_id,
             Contact.status == "resolved",  # Chỉ lấy những tin đã được phản hồi
         )
         .order_by(Contact.responded_at.desc())
-        .all()
-    )
\ No newline at end of file
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
\ No newline at end of file
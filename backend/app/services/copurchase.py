@@ -0,0 +1,134 @@
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import select, delete, insert, func, and_, distinct
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.upsert import upsert_increment_rows
+from app.models.book_copurchase import BookCopurchase
+from app.models.order import Order
+from app.models.order_detail import OrderDetail
+from app.services.reference_cache import reference_cache
+
+# Đơn có quá nhiều đầu sách (mua sỉ) sinh O(k²) cặp mà ít giá trị gợi ý, nên bỏ qua
+MAX_ORDER_BOOKS = 50
+
+
+def _order_book_ids(order: Order) -> List[str]:
+    book_ids = list(dict.fromkeys(detail.book_id for detail in order.order_details if detail.book_id))
+    if len(book_ids) < 2 or len(book_ids) > MAX_ORDER_BOOKS:
+        return []
+    return book_ids
+
+
+async def record_order_completed(db: AsyncSession, order: Order):
+    """
+    Cộng các cặp sách của một đơn vừa hoàn thành vào book_copurchase.
+    Gọi trong transaction đổi trạng thái, order phải được nạp kèm order_details.
+    Mọi cặp được ghi bằng một câu executemany, theo thứ tự khóa cố định (tránh deadlock
+    giữa các đơn hoàn thành cùng lúc có chung sách).
+    Không xóa cache ở đây: caller gọi invalidate_order sau khi commit.
+    """
+    book_ids = sorted(_order_book_ids(order))
+    rows = [
+        dict(book_id=book_id, related_book_id=related_book_id, order_count=1)
+        for book_id in book_ids
+        for related_book_id in book_ids
+        if related_book_id != book_id
+    ]
+    await upsert_increment_rows(
+        db, BookCopurchase, rows,
+        keys=("book_id", "related_book_id"), delta_columns=("order_count",)
+    )
+
+
+def invalidate_order(order: Order):
+    """
+    Xóa cache sách mua cùng của các sách trong đơn vừa hoàn thành.
+    Gọi sau commit: xóa trước commit thì request khác có thể nạp lại số liệu cũ vào cache
+    (hoặc giữ số liệu của transaction đã rollback) cho tới khi hết TTL.
+    """
+    related_books_cache.invalidate(_order_book_ids(order))
+
+
+async def rebuild_copurchase(db: AsyncSession) -> int:
+    """Tính lại toàn bộ book_copurchase từ các đơn đã hoàn thành (một INSERT ... SELECT)"""
+    refs = await reference_cache.get(db)
+    eligible_orders = (
+        select(OrderDetail.order_id)
+        .join(Order, Order.order_id == OrderDetail.order_id)
+        .where(Order.status_id == refs.status_ids.get('completed'))
+        .group_by(OrderDetail.order_id)
+        .having(func.count(distinct(OrderDetail.book_id)).between(2, MAX_ORDER_BOOKS))
+    )
+    left = aliased(OrderDetail)
+    right = aliased(OrderDetail)
+    source = (
+        select(left.book_id, right.book_id, func.count(distinct(left.order_id)))
+        .join(right, and_(right.order_id == left.order_id, right.book_id != left.book_id))
+        .where(left.order_id.in_(eligible_orders))
+        .group_by(left.book_id, right.book_id)
+    )
+
+    await db.execute(delete(BookCopurchase))
+    await db.execute(
+        insert(BookCopurchase).from_select(["book_id", "related_book_id", "order_count"], source)
+    )
+    await db.commit()
+    related_books_cache.invalidate()
+
+    return (await db.execute(select(func.count()).select_from(BookCopurchase))).scalar()
+
+
+class RelatedBooksCache:
+    """
+    Cache LRU có TTL cho top-N sách mua cùng của từng sách.
+    Miss thì đọc COPURCHASE_TOP_N dòng đầu theo ix_book_copurchase_rank;
+    đơn hoàn thành xóa cache của các sách trong đơn, TTL giới hạn độ trễ giữa các worker.
+    """
+
+    def __init__(self, ttl_seconds: int = None, max_size: int = None, top_n: int = None):
+        self._ttl = ttl_seconds if ttl_seconds is not None else settings.COPURCHASE_CACHE_TTL_SECONDS
+        self._max_size = max_size or settings.COPURCHASE_CACHE_MAX_SIZE
+        self.top_n = top_n or settings.COPURCHASE_TOP_N
+        self._entries: "OrderedDict[str, Tuple[List[str], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, db: AsyncSession, book_id: str) -> List[str]:
+        entry = self._entries.get(book_id)
+        if entry is not None:
+            related, expires_at = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(book_id)
+                self.hits += 1
+                return related
+            del self._entries[book_id]
+
+        self.misses += 1
+
+        related = list((await db.execute(
+            select(BookCopurchase.related_book_id)
+            .where(BookCopurchase.book_id == book_id, BookCopurchase.order_count > 0)
+            .order_by(BookCopurchase.order_count.desc(), BookCopurchase.related_book_id)
+            .limit(self.top_n)
+        )).scalars().all())
+
+        self._entries[book_id] = (related, time.monotonic() + self._ttl)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+        return related
+
+    def invalidate(self, book_ids: Iterable[str] = None):
+        if book_ids is None:
+            self._entries.clear()
+            return
+        for book_id in book_ids:
+            self._entries.pop(book_id, None)
+
+
+# Cache dùng chung cho toàn ứng dụng
+related_books_cache = RelatedBooksCache()
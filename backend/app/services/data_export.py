@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select
+
+from app.core.database import SessionLocal
+from app.core.file_formats import check_format
+from app.models.book import Book
+from app.models.category import Category
+from app.models.order import Order
+from app.models.order_status import OrderStatus
+from app.models.payment_method import PaymentMethod
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Số dòng mỗi lần lấy từ server-side cursor (cũng là kích thước mỗi chunk gửi đi)
+EXPORT_BATCH_SIZE = 1000
+
+
+# Tên bảng xuất -> (khóa sắp xếp/tiếp tục, các cột). Không bao giờ xuất mật khẩu
+EXPORTS = {
+    "books": (
+        Book.book_id,
+        [
+            Book.book_id, Book.title, Book.author, Book.publisher, Book.publication_year,
+            Book.category_id, Category.category_name, Book.price, Book.stock_quantity,
+            Book.sold_quantity, Book.description, Book.cover_image_url,
+            Book.created_at, Book.updated_at,
+        ],
+    ),
+    "orders": (
+        Order.order_id,
+        [
+            Order.order_id, Order.user_id, Order.total_amount, Order.status_id,
+            OrderStatus.status_name, Order.payment_method_id, PaymentMethod.method_name,
+            Order.shipping_address, Order.created_at,
+        ],
+    ),
+    "users": (
+        User.user_id,
+        [User.user_id, User.full_name, User.email, User.phone, User.address, User.role, User.created_at],
+    ),
+}
+
+
+def _build_query(name: str, after: Optional[str]):
+    key, columns = EXPORTS[name]
+    stmt = select(*columns)
+    if name == "books":
+        stmt = stmt.outerjoin(Category, Category.category_id == Book.category_id)
+    elif name == "orders":
+        stmt = (
+            stmt.outerjoin(OrderStatus, OrderStatus.status_id == Order.status_id)
+            .outerjoin(PaymentMethod, PaymentMethod.payment_method_id == Order.payment_method_id)
+        )
+    if after:
+        stmt = stmt.where(key > after)
+    return stmt.order_by(key).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def _to_text(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _encode_csv(rows, header: Optional[list]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    for row in rows:
+        writer.writerow(["" if value is None else _to_text(value) for value in row])
+    return buffer.getvalue()
+
+
+def _encode_ndjson(rows, fields: list) -> str:
+    return "".join(
+        json.dumps({field: _to_text(value) for field, value in zip(fields, row)}, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+async def stream_export(
+    name: str,
+    file_format: str = "csv",
+    after: Optional[str] = None,
+    gzip: bool = False,
+    session_factory=SessionLocal
+) -> AsyncIterator[bytes]:
+    """
+    Xuất toàn bộ bảng theo thứ tự khóa chính qua server-side cursor (yield_per),
+    mỗi lô EXPORT_BATCH_SIZE dòng thành một chunk nên bộ nhớ không tăng theo kích thước bảng.
+    after: khóa cuối cùng đã nhận để tải tiếp; gzip: nén từng chunk khi gửi.
+    Dùng session riêng vì response được stream sau khi dependency get_db đã đóng.
+    """
+    check_format(file_format)
+    _, columns = EXPORTS[name]
+    fields = [column.key for column in columns]
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    # Tải tiếp (after) thì không lặp lại dòng tiêu đề CSV
+    header = fields if file_format == "csv" and not after else None
+
+    async with session_factory() as db:
+        try:
+            result = await db.stream(_build_query(name, after))
+            async for partition in result.partitions():
+                if file_format == "ndjson":
+                    text = _encode_ndjson(partition, fields)
+                else:
+                    text = _encode_csv(partition, header)
+                    header = None
+                data = text.encode("utf-8")
+                yield compressor.compress(data) if compressor else data
+        except Exception as e:
+            # Đã gửi status 200: ngắt kết nối giữa chừng để client biết file chưa đủ và tải tiếp bằng after
+            logger.error(f"Lỗi xuất dữ liệu {name}: {e}")
+            raise
+
+    if header:
+        # Bảng rỗng vẫn trả về dòng tiêu đề
+        data = _encode_csv([], header).encode("utf-8")
+        yield compressor.compress(data) if compressor else data
+    if compressor:
+        yield compressor.flush()
@@ -2,117 +2,195 @@ import smtplib
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
+from app.models.email_outbox import EmailOutbox
 
 logger = logging.getLogger(__name__)
 
-def send_order_confirmation_email(
-    user_email: str, 
+def build_order_confirmation_email(
     user_name: str,
     order_id: str,
     order_data: Dict
-) -> bool:
+) -> Tuple[str, str]:
     """
-    Gửi email xác nhận đơn hàng sử dụng cấu hình từ settings
+    Tạo (subject, html) cho email xác nhận đơn hàng
     """
-    smtp_server = settings.MAIL_SERVER
-    smtp_port = settings.MAIL_PORT
-    sender_email = settings.MAIL_USERNAME
-    password = settings.MAIL_PASSWORD 
+    # Chuẩn bị dữ liệu hiển thị
+    items_html = ""
+    for item in order_data.get("items", []):
+        items_html += f"""
+        <tr>
+            <td style="padding: 12px; border: 1px solid #e0e0e0; text-align: left;">{item.get('title', 'N/A')}</td>
+            <td style="padding: 12px; border: 1px solid #e0e0e0; text-align: center;">{item.get('quantity', 0)}</td>
+            <td style="padding: 12px; border: 1px solid #e0e0e0; text-align: right;">{item.get('price', 0):,} đ</td>
+            <td style="padding: 12px; border: 1px solid #e0e0e0; text-align: right; font-weight: bold;">
+                {(item.get('quantity', 0) * item.get('price', 0)):,} đ
+            </td>
+        </tr>
+        """
+    
+    payment_methods = {'PM001': '💵 Tiền mặt (COD)', 'PM002': '💳 Chuyển khoản ngân hàng'}
+    payment_text = payment_methods.get(order_data.get('payment_method_id'), 'Không xác định')
     
-    try:
-        # Chuẩn bị dữ liệu hiển thị
-        items_html = ""
-        for item in order_data.get("items", []):
-            items_html += f"""
-            <tr>
-                <td style="padding: 12px; border: 1px solid #e0e0e0; text-align: left;">{item.get('title', 'N/A')}</td>
-                <td style="padding: 12px; border: 1px solid #e0e0e0; text-align: center;">{item.get('quantity', 0)}</td>
-                <td style="padding: 12px; border: 1px solid #e0e0e0; text-align: right;">{item.get('price', 0):,} đ</td>
-                <td style="padding: 12px; border: 1px solid #e0e0e0; text-align: right; font-weight: bold;">
-                    {(item.get('quantity', 0) * item.get('price', 0)):,} đ
-                </td>
-            </tr>
-            """
-        
-        payment_methods = {'PM001': '💵 Tiền mặt (COD)', 'PM002': '💳 Chuyển khoản ngân hàng'}
-        payment_text = payment_methods.get(order_data.get('payment_method_id'), 'Không xác định')
-        
-        # Lấy các giá trị tiền tệ đã tính toán từ service
-        shipping_fee = 30000
-        total_amount = order_data.get('total_amount', 0)
-        subtotal = order_data.get('subtotal', total_amount - shipping_fee)
-
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <body style="font-family: sans-serif; color: #333;">
-            <div style="background: #0F9D58; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0;">
-                <h1>🎉 Đặt Hàng Thành Công!</h1>
+    # Lấy các giá trị tiền tệ đã tính toán từ service
+    shipping_fee = 30000
+    total_amount = order_data.get('total_amount', 0)
+    subtotal = order_data.get('subtotal', total_amount - shipping_fee)
+
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <body style="font-family: sans-serif; color: #333;">
+        <div style="background: #0F9D58; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0;">
+            <h1>🎉 Đặt Hàng Thành Công!</h1>
+        </div>
+        <div style="padding: 20px; border: 1px solid #e0e0e0;">
+            <p>Xin chào <strong>{user_name}</strong>,</p>
+            <p>Cảm ơn bạn đã đặt hàng tại <strong>Nhà Sách UTE</strong>.</p>
+            <div style="background: #f0fdf4; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                <p><strong>Mã đơn hàng:</strong> {order_id}</p>
+                <p><strong>Địa chỉ:</strong> {order_data.get('shipping_address')}</p>
+                <p><strong>Thanh toán:</strong> {payment_text}</p>
             </div>
-            <div style="padding: 20px; border: 1px solid #e0e0e0;">
-                <p>Xin chào <strong>{user_name}</strong>,</p>
-                <p>Cảm ơn bạn đã đặt hàng tại <strong>Nhà Sách UTE</strong>.</p>
-                <div style="background: #f0fdf4; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                    <p><strong>Mã đơn hàng:</strong> {order_id}</p>
-                    <p><strong>Địa chỉ:</strong> {order_data.get('shipping_address')}</p>
-                    <p><strong>Thanh toán:</strong> {payment_text}</p>
-                </div>
-                <table style="width: 100%; border-collapse: collapse;">
-                    <thead>
-                        <tr style="background: #f2fbf7;">
-                            <th style="padding: 10px; border: 1px solid #ddd;">Sản phẩm</th>
-                            <th style="padding: 10px; border: 1px solid #ddd;">SL</th>
-                            <th style="padding: 10px; border: 1px solid #ddd;">Đơn giá</th>
-                            <th style="padding: 10px; border: 1px solid #ddd;">Tổng</th>
-                        </tr>
-                    </thead>
-                    <tbody>{items_html}</tbody>
-                </table>
-                <div style="margin-top: 20px; text-align: right; background: #f9fafb; padding: 15px;">
-                    <p>Tạm tính: <strong>{int(subtotal):,} đ</strong></p>
-                    <p>Phí vận chuyển: <strong>{shipping_fee:,} đ</strong></p>
-                    <p style="font-size: 1.2em; color: #0F9D58;">Tổng cộng: <strong>{int(total_amount):,} đ</strong></p>
-                </div>
+            <table style="width: 100%; border-collapse: collapse;">
+                <thead>
+                    <tr style="background: #f2fbf7;">
+                        <th style="padding: 10px; border: 1px solid #ddd;">Sản phẩm</th>
+                        <th style="padding: 10px; border: 1px solid #ddd;">SL</th>
+                        <th style="padding: 10px; border: 1px solid #ddd;">Đơn giá</th>
+                        <th style="padding: 10px; border: 1px solid #ddd;">Tổng</th>
+                    </tr>
+                </thead>
+                <tbody>{items_html}</tbody>
+            </table>
+            <div style="margin-top: 20px; text-align: right; background: #f9fafb; padding: 15px;">
+                <p>Tạm tính: <strong>{int(subtotal):,} đ</strong></p>
+                <p>Phí vận chuyển: <strong>{shipping_fee:,} đ</strong></p>
+                <p style="font-size: 1.2em; color: #0F9D58;">Tổng cộng: <strong>{int(total_amount):,} đ</strong></p>
             </div>
-        </body>
-        </html>
-        """
+        </div>
+    </body>
+    </html>
+    """
+
+    return f"✅ Xác nhận đơn hàng #{order_id}", html_content
+
+def build_order_status_update_email(user_name: str, order_id: str, old_status: str, new_status: str) -> Tuple[str, str]:
+    """Tạo (subject, html) cho email thông báo trạng thái đơn hàng thay đổi"""
+    status_map = {
+        'processing': '⏳ Đang xử lý', 'confirmed': '✅ Đã xác nhận',
+        'shipping': '🚚 Đang giao hàng', 'completed': '🎉 Hoàn thành', 'cancelled': '❌ Đã hủy'
+    }
+    
+    html = f"<h2>Cập nhật đơn hàng #{order_id}</h2><p>Chào {user_name}, trạng thái mới: <b>{status_map.get(new_status, new_status)}</b></p>"
+    return f"Cập nhật trạng thái đơn hàng #{order_id}", html
+
+def queue_email(db: AsyncSession, recipient: str, subject: str, html_body: str) -> EmailOutbox:
+    """
+    Ghi email vào bảng outbox trong cùng transaction với nghiệp vụ.
+    Email chỉ được gửi (bởi worker nền) khi transaction commit thành công.
+    """
+    email = EmailOutbox(recipient=recipient, subject=subject, html_body=html_body, status='pending', attempts=0)
+    db.add(email)
+    return email
+
+def queue_order_confirmation_email(
+    db: AsyncSession,
+    user_email: str, 
+    user_name: str,
+    order_id: str,
+    order_data: Dict
+) -> EmailOutbox:
+    """Đưa email xác nhận đơn hàng vào outbox"""
+    subject, html = build_order_confirmation_email(user_name, order_id, order_data)
+    return queue_email(db, user_email, subject, html)
 
+def queue_order_status_update_email(
+    db: AsyncSession,
+    user_email: str,
+    user_name: str,
+    order_id: str,
+    old_status: str,
+    new_status: str
+) -> EmailOutbox:
+    """Đưa email thông báo trạng thái đơn hàng vào outbox"""
+    subject, html = build_order_status_update_email(user_name, order_id, old_status, new_status)
+    return queue_email(db, user_email, subject, html)
+
+
+class SMTPSender:
+    """
+    Giữ một kết nối SMTP đã STARTTLS + login để gửi nhiều email liên tiếp,
+    thay vì bắt tay lại cho từng email. Dùng trong thread (smtplib là blocking).
+    """
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT, timeout=settings.MAIL_TIMEOUT)
+        if settings.MAIL_STARTTLS:
+            server.starttls()
+        if settings.MAIL_USERNAME:
+            server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+        return server
+
+    def _ensure_connection(self) -> smtplib.SMTP:
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
+        self._server = self._connect()
+        return self._server
+
+    def _send_one(self, recipient: str, subject: str, html_body: str):
         message = MIMEMultipart("alternative")
         message["From"] = f"Nhà Sách UTE <{settings.MAIL_FROM}>"
-        message["To"] = user_email
-        message["Subject"] = f"✅ Xác nhận đơn hàng #{order_id}"
-        message.attach(MIMEText(html_content, "html", "utf-8"))
-
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, password)
-        server.sendmail(sender_email, user_email, message.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        logger.error(f"Lỗi gửi mail: {str(e)}")
-        return False
-
-def send_order_status_update_email(user_email: str, user_name: str, order_id: str, old_status: str, new_status: str) -> bool:
-    """Gửi email thông báo trạng thái đơn hàng thay đổi"""
-    try:
-        status_map = {
-            'processing': '⏳ Đang xử lý', 'confirmed': '✅ Đã xác nhận',
-            'shipping': '🚚 Đang giao hàng', 'completed': '🎉 Hoàn thành', 'cancelled': '❌ Đã hủy'
-        }
-        
-        html = f"<h2>Cập nhật đơn hàng #{order_id}</h2><p>Chào {user_name}, trạng thái mới: <b>{status_map.get(new_status, new_status)}</b></p>"
-        
-        msg = MIMEMultipart(); msg["From"] = settings.MAIL_FROM; msg["To"] = user_email
-        msg["Subject"] = f"Cập nhật trạng thái đơn hàng #{order_id}"
-        msg.attach(MIMEText(html, "html"))
-        
-        server = smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT)
-        server.starttls(); server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
-        server.sendmail(settings.MAIL_FROM, user_email, msg.as_string()); server.quit()
-        return True
-    except Exception as e:
-        logger.error(f"Lỗi gửi mail trạng thái: {e}"); return False
\ No newline at end of file
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.attach(MIMEText(html_body, "html", "utf-8"))
+
+        sender = settings.MAIL_FROM or settings.MAIL_USERNAME
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.sendmail(sender, [recipient], message.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # Kết nối bị server đóng giữa chừng -> mở lại một lần rồi gửi lại
+            self._server = None
+            self._server = self._connect()
+            self._server.sendmail(sender, [recipient], message.as_string())
+
+    def send_batch(self, messages: List[Tuple[str, str, str]]) -> List[Optional[str]]:
+        """
+        Gửi một lô (recipient, subject, html) trên cùng một kết nối.
+        Trả về danh sách lỗi tương ứng (None nếu gửi thành công).
+        """
+        try:
+            self._ensure_connection()
+        except Exception as e:
+            self.close()
+            return [str(e)] * len(messages)
+
+        errors: List[Optional[str]] = []
+        for recipient, subject, html_body in messages:
+            try:
+                self._send_one(recipient, subject, html_body)
+                errors.append(None)
+            except Exception as e:
+                logger.error(f"Lỗi gửi mail tới {recipient}: {e}")
+                errors.append(str(e))
+        return errors
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.metrics import emails_sent_total, emails_failed_total
+from app.models.email_outbox import EmailOutbox
+from app.services.email import SMTPSender
+
+logger = logging.getLogger(__name__)
+
+
+class EmailOutboxWorker:
+    """
+    Worker nền đọc bảng email_outbox theo lô và gửi qua một kết nối SMTP dùng lại.
+    - Email lỗi được thử lại với backoff lũy thừa (RETRY_SECONDS * 2^attempts)
+    - Quá MAX_ATTEMPTS lần thì đánh dấu 'failed'
+    - Nhận lô bằng FOR UPDATE SKIP LOCKED rồi commit ngay (đẩy next_attempt_at thành hạn giữ,
+      tăng attempts), gửi SMTP ngoài transaction, sau đó ghi kết quả trong một transaction ngắn.
+      Nhiều worker uvicorn không gửi trùng và không giữ khóa dòng trong lúc chờ SMTP.
+    """
+
+    def __init__(self, session_factory=SessionLocal, sender: Optional[SMTPSender] = None):
+        self._session_factory = session_factory
+        self._sender = sender or SMTPSender()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self):
+        """Báo cho worker có email mới, không cần chờ hết chu kỳ poll"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self._sender.close)
+
+    async def _run(self):
+        while not self._stopping:
+            processed = 0
+            try:
+                processed = await self.drain_once()
+            except Exception as e:
+                logger.error(f"Lỗi xử lý email outbox: {e}")
+
+            # Lô đầy -> còn email đang chờ, xử lý tiếp ngay
+            if processed >= settings.MAIL_OUTBOX_BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.MAIL_OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        """Gửi một lô email đến hạn, trả về số email đã xử lý"""
+        claimed = await self._claim()
+        if not claimed:
+            return 0
+
+        errors = await asyncio.to_thread(
+            self._sender.send_batch,
+            [(recipient, subject, html_body) for _, _, recipient, subject, html_body in claimed]
+        )
+
+        await self._record(claimed, errors)
+        return len(claimed)
+
+    async def _claim(self) -> List[Tuple[int, int, str, str, str]]:
+        """
+        Nhận một lô email đến hạn: tăng attempts và dời next_attempt_at tới hết hạn giữ
+        (MAIL_OUTBOX_LEASE_SECONDS) rồi commit, khóa dòng chỉ giữ trong transaction ngắn này.
+        Trả về (email_id, attempts, recipient, subject, html_body).
+        """
+        async with self._session_factory() as db:
+            now = datetime.utcnow()
+            stmt = (
+                select(EmailOutbox)
+                .where(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.email_id)
+                .limit(settings.MAIL_OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            emails = (await db.execute(stmt)).scalars().all()
+            if not emails:
+                await db.rollback()
+                return []
+
+            lease_until = now + timedelta(seconds=settings.MAIL_OUTBOX_LEASE_SECONDS)
+            claimed = []
+            for email in emails:
+                email.attempts = (email.attempts or 0) + 1
+                email.next_attempt_at = lease_until
+                claimed.append((email.email_id, email.attempts, email.recipient, email.subject, email.html_body))
+            await db.commit()
+            return claimed
+
+    async def _record(self, claimed: List[Tuple[int, int, str, str, str]], errors: List[Optional[str]]):
+        """Ghi kết quả gửi; chỉ cập nhật email còn thuộc lần nhận này (attempts chưa đổi)"""
+        now = datetime.utcnow()
+        sent_ids = []
+        final_failures = retries = 0
+        async with self._session_factory() as db:
+            for (email_id, attempts, *_), error in zip(claimed, errors):
+                if error is None:
+                    sent_ids.append(email_id)
+                    continue
+                if attempts >= settings.MAIL_OUTBOX_MAX_ATTEMPTS:
+                    values = dict(status='failed', last_error=error)
+                    final_failures += 1
+                else:
+                    delay = settings.MAIL_OUTBOX_RETRY_SECONDS * (2 ** (attempts - 1))
+                    values = dict(next_attempt_at=now + timedelta(seconds=delay), last_error=error)
+                    retries += 1
+                await db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.email_id == email_id, EmailOutbox.attempts == attempts)
+                    .values(**values)
+                )
+            if sent_ids:
+                await db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.email_id.in_(sent_ids))
+                    .values(status='sent', sent_at=now, last_error=None)
+                )
+            await db.commit()
+
+        emails_sent_total.inc(amount=len(sent_ids))
+        emails_failed_total.inc("true", amount=final_failures)
+        emails_failed_total.inc("false", amount=retries)
+
+
+# Worker dùng chung cho toàn ứng dụng (khởi động trong app.main)
+outbox_worker = EmailOutboxWorker()
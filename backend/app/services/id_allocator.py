@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, func, cast, Integer
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.id_sequence import IdSequence
+from app.models.order import Order
+from app.models.book import Book
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Tên chuỗi -> (tiền tố, số chữ số tối thiểu, cột khóa chính)
+SEQUENCES = {
+    "order": ("ORD", 5, Order.order_id),
+    "book": ("B", 8, Book.book_id),
+    "user": ("U", 8, User.user_id),
+}
+
+# Độ dài tối đa của các khóa String(10)
+MAX_ID_LENGTH = 10
+
+
+class IdAllocator:
+    """
+    Cấp phát ID theo khối (hi/lo):
+    - Mỗi worker giữ trước BLOCK_SIZE số từ bảng id_sequences bằng một UPDATE nguyên tử
+    - Các ID trong khối được cấp từ bộ nhớ, không cần truy vấn
+    - Khối được giữ bằng session riêng nên không bị rollback theo request
+    """
+
+    def __init__(self, session_factory=SessionLocal, block_size: int = None):
+        self._session_factory = session_factory
+        self._block_size = block_size or settings.ID_BLOCK_SIZE
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def next_value(self, name: str) -> int:
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            current, end = self._blocks.get(name, (0, 0))
+            if current >= end:
+                current, end = await self._reserve_block(name)
+            self._blocks[name] = (current + 1, end)
+            return current
+
+    async def next_id(self, name: str) -> str:
+        return self._format(name, await self.next_value(name))
+
+    async def next_ids(self, name: str, count: int) -> List[str]:
+        """Cấp count ID liên tiếp bằng một lần giữ khối riêng (dùng cho nhập hàng loạt)"""
+        if count <= 0:
+            return []
+        start, end = await self._reserve_block(name, count)
+        return [self._format(name, value) for value in range(start, end)]
+
+    async def advance_past(self, name: str, ids: Iterable[str]):
+        """
+        Đẩy chuỗi qua số lớn nhất trong các ID được ghi tường minh (vd nhập sách kèm book_id)
+        để không cấp lại các số đó. Khối đang giữ trong bộ nhớ của worker này được cắt theo;
+        worker khác còn giữ khối cũ vẫn có thể cấp trùng cho tới khi dùng hết khối.
+        """
+        values = [value for value in (self._parse(name, new_id) for new_id in ids) if value is not None]
+        if not values:
+            return
+        value = max(values)
+
+        async with self._session_factory() as db:
+            for _ in range(2):
+                result = await db.execute(
+                    update(IdSequence)
+                    .where(IdSequence.name == name, IdSequence.next_value <= value)
+                    .values(next_value=value + 1)
+                )
+                # Không đổi dòng nào: chuỗi đã qua value, hoặc chưa được khởi tạo
+                if result.rowcount or (await db.execute(
+                    select(IdSequence.name).where(IdSequence.name == name)
+                )).first() is not None:
+                    await db.commit()
+                    break
+
+                start = max(await self._seed_value(db, name), value + 1)
+                db.add(IdSequence(name=name, next_value=start))
+                try:
+                    await db.commit()
+                    break
+                except IntegrityError:
+                    # Worker khác vừa khởi tạo cùng lúc -> quay lại nhánh UPDATE
+                    await db.rollback()
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            current, end = self._blocks.get(name, (0, 0))
+            if current <= value:
+                # value + 1 >= end nghĩa là khối đã hết, lần cấp sau giữ khối mới
+                self._blocks[name] = (value + 1, end)
+
+    def _parse(self, name: str, new_id: Optional[str]) -> Optional[int]:
+        """Phần số của ID đúng định dạng của chuỗi (vd 'B00000012' -> 12), None nếu không phải"""
+        prefix = SEQUENCES[name][0]
+        if not new_id or not new_id.startswith(prefix) or not new_id[len(prefix):].isdigit():
+            return None
+        return int(new_id[len(prefix):])
+
+    def _format(self, name: str, value: int) -> str:
+        prefix, width, _ = SEQUENCES[name]
+        new_id = f"{prefix}{value:0{width}d}"
+        if len(new_id) > MAX_ID_LENGTH:
+            raise RuntimeError(f"Chuỗi ID '{name}' đã vượt quá {MAX_ID_LENGTH} ký tự")
+        return new_id
+
+    async def _reserve_block(self, name: str, size: int = None) -> Tuple[int, int]:
+        size = size or self._block_size
+        async with self._session_factory() as db:
+            for _ in range(2):
+                result = await db.execute(
+                    update(IdSequence)
+                    .where(IdSequence.name == name)
+                    .values(next_value=IdSequence.next_value + size)
+                )
+                if result.rowcount:
+                    # Dòng đang bị khóa bởi UPDATE ở trên nên giá trị đọc được là của mình
+                    end = (await db.execute(
+                        select(IdSequence.next_value).where(IdSequence.name == name)
+                    )).scalar_one()
+                    await db.commit()
+                    return end - size, end
+
+                # Lần đầu: khởi tạo chuỗi từ ID lớn nhất đang có trong bảng
+                start = await self._seed_value(db, name)
+                db.add(IdSequence(name=name, next_value=start + size))
+                try:
+                    await db.commit()
+                    return start, start + size
+                except IntegrityError:
+                    # Worker khác vừa khởi tạo cùng lúc -> quay lại nhánh UPDATE
+                    await db.rollback()
+
+        raise RuntimeError(f"Không thể cấp phát khối ID cho '{name}'")
+
+    async def _seed_value(self, db, name: str) -> int:
+        prefix, _, column = SEQUENCES[name]
+        suffix = func.substr(column, len(prefix) + 1)
+        max_value = (await db.execute(
+            select(func.max(cast(suffix, Integer))).where(column.like(f"{prefix}%"))
+        )).scalar()
+        return (max_value or 0) + 1
+
+
+# Bộ cấp phát dùng chung cho toàn ứng dụng
+id_allocator = IdAllocator()
+
+
+async def next_order_id() -> str:
+    return await id_allocator.next_id("order")
+
+
+async def next_book_id() -> str:
+    return await id_allocator.next_id("book")
+
+
+async def next_book_ids(count: int) -> List[str]:
+    return await id_allocator.next_ids("book", count)
+
+
+async def advance_book_ids_past(book_ids: Iterable[str]):
+    await id_allocator.advance_past("book", book_ids)
+
+
+async def next_user_id() -> str:
+    return await id_allocator.next_id("user")
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Optional, Union
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.idempotency_key import IdempotencyKey
+
+
+@dataclass(frozen=True)
+class StoredResult:
+    """Kết quả đã lưu của lần gọi đầu; body là None nếu chỉ còn resource_id (worker chết trước khi lưu)"""
+    status_code: int
+    body: Optional[Any]
+    resource_id: Optional[str]
+
+
+@dataclass(frozen=True)
+class Claim:
+    """
+    Khóa đang được request này giữ. locked_at là giá trị request này đã ghi,
+    dùng để nhận ra request khác đã chiếm lại khóa (khóa quá IDEMPOTENCY_LOCK_SECONDS).
+    """
+    user_id: str
+    key: str
+    locked_at: datetime
+
+
+def request_hash(payload: Any) -> str:
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _key_filter(user_id: str, key: str):
+    return (IdempotencyKey.user_id == user_id, IdempotencyKey.idempotency_key == key)
+
+
+async def begin(
+    user_id: str,
+    key: str,
+    payload_hash: str,
+    session_factory=SessionLocal
+) -> Union[StoredResult, Claim]:
+    """
+    Giữ Idempotency-Key trước khi xử lý yêu cầu (session riêng, commit ngay):
+    - Chưa có: tạo dòng 'pending' và trả về Claim -> xử lý bình thường, truyền Claim cho mark_resource
+    - Đã hoàn thành: trả về kết quả đã lưu
+    - Đang xử lý ở request khác: chờ tới IDEMPOTENCY_WAIT_SECONDS rồi báo 409
+    - Cùng khóa nhưng body khác: 422
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        async with session_factory() as db:
+            # DATETIME của MySQL bỏ phần micro giây: giữ giá trị đúng như được lưu để so sánh lại
+            now = datetime.utcnow().replace(microsecond=0)
+            db.add(IdempotencyKey(
+                user_id=user_id, idempotency_key=key, request_hash=payload_hash, status='pending',
+                locked_at=now, created_at=now,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+            ))
+            try:
+                await db.commit()
+                return Claim(user_id, key, now)
+            except IntegrityError:
+                await db.rollback()
+
+            record = (await db.execute(
+                select(IdempotencyKey).where(*_key_filter(user_id, key))
+            )).scalar_one_or_none()
+            if record is None:
+                # Vừa bị xóa (hết hạn hoặc lần đầu thất bại) -> thử giữ lại
+                continue
+            if record.expires_at <= now:
+                await db.execute(delete(IdempotencyKey).where(
+                    *_key_filter(user_id, key), IdempotencyKey.expires_at <= now
+                ))
+                await db.commit()
+                continue
+            if record.request_hash != payload_hash:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key đã được dùng cho một yêu cầu khác"
+                )
+            if record.status == 'completed':
+                return StoredResult(
+                    record.response_status,
+                    json.loads(record.response_body) if record.response_body else None,
+                    record.resource_id
+                )
+
+            stale = record.locked_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+            if stale and record.resource_id:
+                # Đơn đã commit nhưng request đầu chết trước khi lưu response
+                return StoredResult(201, None, record.resource_id)
+            if stale:
+                # Request đầu chết (hoặc quá chậm) trước khi tạo đơn -> chiếm lại khóa (chỉ một request thắng).
+                # Request đầu nếu vẫn chạy sẽ bị mark_resource chặn vì locked_at đã đổi
+                locked_at = max(now, record.locked_at + timedelta(seconds=1))
+                result = await db.execute(
+                    update(IdempotencyKey)
+                    .where(
+                        *_key_filter(user_id, key),
+                        IdempotencyKey.status == 'pending',
+                        IdempotencyKey.resource_id.is_(None),
+                        IdempotencyKey.locked_at == record.locked_at
+                    )
+                    .values(locked_at=locked_at)
+                )
+                await db.commit()
+                if result.rowcount:
+                    return Claim(user_id, key, locked_at)
+                continue
+
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="Yêu cầu với Idempotency-Key này đang được xử lý, vui lòng thử lại sau",
+                headers={"Retry-After": "1"}
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+async def mark_resource(db: AsyncSession, claim: Claim, resource_id: str):
+    """
+    Ghi mã tài nguyên vừa tạo vào khóa, trong cùng transaction với tài nguyên.
+    Khóa đã bị request khác chiếm lại (request này quá chậm) thì báo 409 để transaction rollback,
+    không tạo tài nguyên trùng.
+    """
+    result = await db.execute(
+        update(IdempotencyKey)
+        .where(
+            *_key_filter(claim.user_id, claim.key),
+            IdempotencyKey.resource_id.is_(None),
+            IdempotencyKey.locked_at == claim.locked_at
+        )
+        .values(resource_id=resource_id)
+    )
+    if result.rowcount != 1:
+        raise HTTPException(
+            status_code=409,
+            detail="Yêu cầu với Idempotency-Key này đã được một request khác xử lý",
+            headers={"Retry-After": "1"}
+        )
+
+
+async def complete(user_id: str, key: str, status_code: int, body: Any, session_factory=SessionLocal):
+    """Lưu response để các lần gửi lại được trả lời ngay"""
+    async with session_factory() as db:
+        await db.execute(
+            update(IdempotencyKey)
+            .where(*_key_filter(user_id, key))
+            .values(
+                status='completed',
+                response_status=status_code,
+                response_body=json.dumps(body, ensure_ascii=False, default=str)
+            )
+        )
+        await db.commit()
+
+
+async def release(claim: Claim, session_factory=SessionLocal):
+    """Yêu cầu thất bại (không tạo gì) -> bỏ khóa để client có thể thử lại với cùng Idempotency-Key"""
+    async with session_factory() as db:
+        # Chỉ xóa khóa của chính request này (không xóa khóa request khác đã chiếm lại)
+        await db.execute(
+            delete(IdempotencyKey).where(
+                *_key_filter(claim.user_id, claim.key),
+                IdempotencyKey.status == 'pending',
+                IdempotencyKey.resource_id.is_(None),
+                IdempotencyKey.locked_at == claim.locked_at
+            )
+        )
+        await db.commit()
+
+
+async def purge_expired(db: AsyncSession) -> int:
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,75 @@
+from typing import Dict, List
+
+from sqlalchemy import select, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.book import Book
+from app.schemas.book_admin import StockAdjustment
+
+# Số sách mỗi câu SELECT ... IN / UPDATE ... CASE (giới hạn độ dài câu lệnh)
+STOCK_CHUNK_SIZE = 1000
+
+
+def _chunks(items: List[str], size: int = STOCK_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def apply_stock_adjustments(db: AsyncSession, items: List[StockAdjustment]) -> dict:
+    """
+    Áp dụng nhiều điều chỉnh tồn kho trong một transaction:
+    - Khóa các dòng sách liên quan (FOR UPDATE) theo lô, theo thứ tự book_id tăng dần
+      (cùng thứ tự với đặt hàng / hủy đơn, tránh deadlock), đọc tồn kho hiện tại
+    - Tính tồn kho mới theo thứ tự các dòng (cùng sách có thể xuất hiện nhiều lần)
+    - Ghi bằng UPDATE ... CASE theo lô, chỉ cho sách thực sự thay đổi
+    Sách không tồn tại hoặc delta làm tồn kho âm được bỏ qua và trả về trong kết quả.
+    Không commit, router commit sau khi gọi.
+    """
+    book_ids = sorted(set(item.book_id for item in items))
+
+    current: Dict[str, int] = {}
+    for chunk in _chunks(book_ids):
+        rows = (await db.execute(
+            select(Book.book_id, Book.stock_quantity)
+            .where(Book.book_id.in_(chunk))
+            .order_by(Book.book_id)
+            .with_for_update()
+        )).all()
+        current.update({book_id: stock or 0 for book_id, stock in rows})
+
+    new_stock = dict(current)
+    rejected = []
+    for item in items:
+        if item.book_id not in current:
+            continue
+        if item.stock_quantity is not None:
+            new_stock[item.book_id] = item.stock_quantity
+        elif new_stock[item.book_id] + item.delta < 0:
+            rejected.append({
+                "book_id": item.book_id,
+                "stock_quantity": new_stock[item.book_id],
+                "delta": item.delta,
+            })
+        else:
+            new_stock[item.book_id] += item.delta
+
+    changed = {book_id: stock for book_id, stock in new_stock.items() if stock != current[book_id]}
+    changed_ids = sorted(changed)
+    for chunk in _chunks(changed_ids):
+        await db.execute(
+            update(Book)
+            .where(Book.book_id.in_(chunk))
+            .values(stock_quantity=case({book_id: changed[book_id] for book_id in chunk}, value=Book.book_id))
+            .execution_options(synchronize_session=False)
+        )
+
+    return {
+        "updated": len(changed),
+        "unchanged": len(current) - len(changed),
+        "changes": [
+            {"book_id": book_id, "old": current[book_id], "new": stock}
+            for book_id, stock in changed.items()
+        ],
+        "not_found": [book_id for book_id in book_ids if book_id not in current],
+        "rejected": rejected,
+    }
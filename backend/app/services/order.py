@@ -1,48 +1,121 @@
 # backend/app/services/order.py
 from decimal import Decimal
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, case
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from fastapi import HTTPException
 from datetime import datetime
-import uuid
+from typing import Dict, Optional
 import logging
 
+from app.core.metrics import orders_created_total
 from app.models.order import Order
 from app.models.order_detail import OrderDetail
 from app.models.book import Book
 from app.models.discount import Discount
 from app.models.discount_application import DiscountApplication
 from app.models.payment_method import PaymentMethod
-from app.models.order_status import OrderStatus
 from app.models.user import User
 from app.schemas.order import OrderCreate
-from app.services.email import send_order_confirmation_email, send_order_status_update_email
+from app.services.email import queue_order_confirmation_email, queue_order_status_update_email
+from app.services.email_outbox import outbox_worker
+from app.services.id_allocator import next_order_id
+from app.services.reference_cache import reference_cache
+from app.services import sales_rollup
+from app.services import trending
+from app.services import copurchase
+from app.services import idempotency
 
 logger = logging.getLogger(__name__)
 
-def generate_order_id(db: Session) -> str:
-    stmt = select(Order).order_by(Order.created_at.desc())
-    last_order = db.execute(stmt).scalars().first()
-    if not last_order: return "ORD00001"
-    try:
-        new_num = int(last_order.order_id[3:]) + 1
-        return f"ORD{new_num:05d}"
-    except: return f"ORD{str(uuid.uuid4().int)[:8]}"
+async def reserve_stock(db: AsyncSession, quantities: Dict[str, int]) -> Dict[str, Book]:
+    """
+    Giữ hàng cho cả giỏ trong một lượt:
+    - 1 SELECT ... IN ... FOR UPDATE, khóa dòng theo thứ tự book_id cố định (tránh deadlock)
+    - 1 UPDATE có điều kiện stock_quantity >= :q (không bao giờ bán âm kho)
+    """
+    book_ids = sorted(quantities)
+    stmt = (
+        select(Book)
+        .where(Book.book_id.in_(book_ids))
+        .order_by(Book.book_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    books = {book.book_id: book for book in (await db.execute(stmt)).scalars().all()}
+
+    for book_id in book_ids:
+        book = books.get(book_id)
+        if not book or book.stock_quantity < quantities[book_id]:
+            raise HTTPException(status_code=400, detail=f"Sách {book_id} không đủ hàng")
+
+    qty = case(quantities, value=Book.book_id)
+    result = await db.execute(
+        update(Book)
+        .where(Book.book_id.in_(book_ids), Book.stock_quantity >= qty)
+        .values(
+            stock_quantity=Book.stock_quantity - qty,
+            sold_quantity=Book.sold_quantity + qty
+        )
+        .execution_options(synchronize_session=False)
+    )
+    # Có dòng không thỏa điều kiện -> đơn khác vừa mua hết, hủy toàn bộ giao dịch
+    if result.rowcount != len(book_ids):
+        raise HTTPException(status_code=400, detail="Sách trong giỏ không đủ hàng")
+
+    return books
+
+
+async def lock_books(db: AsyncSession, book_ids):
+    """Khóa các dòng sách (FOR UPDATE) theo thứ tự book_id cố định, như reserve_stock"""
+    await db.execute(
+        select(Book.book_id)
+        .where(Book.book_id.in_(sorted(book_ids)))
+        .order_by(Book.book_id)
+        .with_for_update()
+    )
+
 
-def create_order(db: Session, order_data: OrderCreate):
+async def restore_stock(db: AsyncSession, quantities: Dict[str, int]):
+    """
+    Trả hàng của đơn bị hủy về kho bằng 1 UPDATE stock_quantity = stock_quantity + CASE ...
+    (không đọc-sửa-ghi qua ORM). Các dòng sách phải được khóa trước bằng lock_books.
+    """
+    if not quantities:
+        return
+    qty = case(quantities, value=Book.book_id)
+    await db.execute(
+        update(Book)
+        .where(Book.book_id.in_(sorted(quantities)))
+        .values(
+            stock_quantity=Book.stock_quantity + qty,
+            sold_quantity=Book.sold_quantity - qty
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def create_order(db: AsyncSession, order_data: OrderCreate, idempotency_claim: Optional[idempotency.Claim] = None):
     try:
-        user = db.execute(select(User).where(User.user_id == order_data.user_id)).scalar_one_or_none()
+        user = (await db.execute(select(User).where(User.user_id == order_data.user_id))).scalar_one_or_none()
         if not user: raise HTTPException(status_code=404, detail="User không tồn tại")
 
         subtotal = Decimal(0)
         email_items = []
         order_items = []
+
+        # Cấp mã đơn trước khi khóa dòng sách (thường lấy từ bộ nhớ, không truy vấn)
+        new_id = await next_order_id()
+
+        # Gộp số lượng theo book_id rồi giữ hàng cho cả giỏ bằng truy vấn tập hợp
+        quantities: Dict[str, int] = {}
+        for item in order_data.items:
+            quantities[item.book_id] = quantities.get(item.book_id, 0) + item.quantity
+        books = await reserve_stock(db, quantities)
         
         for item in order_data.items:
-            book = db.execute(select(Book).where(Book.book_id == item.book_id)).scalar_one_or_none()
-            if not book or book.stock_quantity < item.quantity:
-                raise HTTPException(status_code=400, detail=f"Sách {item.book_id} không đủ hàng")
-            
+            book = books[item.book_id]
             line_total = Decimal(str(book.price)) * item.quantity
             subtotal += line_total
             order_items.append({'book': book, 'quantity': item.quantity, 'price': book.price})
@@ -53,56 +126,109 @@ def create_order(db: Session, order_data: OrderCreate):
         discount_id = None
         
         if order_data.voucher_code:
-            discount = db.execute(select(Discount).where(Discount.voucher_code == order_data.voucher_code)).scalar_one_or_none()
+            discount = (await db.execute(select(Discount).where(Discount.voucher_code == order_data.voucher_code))).scalar_one_or_none()
             if discount and discount.expiry_date >= datetime.utcnow():
                 final_total -= subtotal * (Decimal(str(discount.discount_percentage)) / 100)
                 discount_id = discount.discount_id
 
         # CHANGED: Trạng thái mặc định là 'processing' (Chờ xử lý)
-        status_rec = db.execute(select(OrderStatus).where(OrderStatus.status_name == 'processing')).scalar_one()
-        new_id = generate_order_id(db)
+        refs = await reference_cache.get(db)
         
         new_order = Order(
             order_id=new_id, user_id=order_data.user_id, total_amount=final_total,
             shipping_address=order_data.shipping_address, payment_method_id=order_data.payment_method_id,
-            status_id=status_rec.status_id, created_at=datetime.utcnow()
+            status_id=refs.status_ids['processing'], created_at=datetime.utcnow()
         )
-        db.add(new_order); db.flush()
+        db.add(new_order); await db.flush()
 
-        for it in order_items:
-            db.add(OrderDetail(order_id=new_id, book_id=it['book'].book_id, quantity=it['quantity'], unit_price=it['price']))
-            it['book'].stock_quantity -= it['quantity']
-            it['book'].sold_quantity += it['quantity']
+        db.add_all([
+            OrderDetail(order_id=new_id, book_id=it['book'].book_id, quantity=it['quantity'], unit_price=it['price'])
+            for it in order_items
+        ])
 
         if discount_id:
             db.add(DiscountApplication(order_id=new_id, discount_id=discount_id))
 
-        db.commit(); db.refresh(new_order)
+        # Cập nhật bảng tổng hợp doanh số theo ngày (cùng transaction)
+        await sales_rollup.record_order_created(
+            db, new_order.created_at, new_order.status_id, final_total, sum(quantities.values())
+        )
 
-        try:
-            email_payload = {
-                'items': email_items, 'subtotal': float(subtotal), 'total_amount': float(final_total),
-                'shipping_address': order_data.shipping_address, 'payment_method_id': order_data.payment_method_id
-            }
-            send_order_confirmation_email(user.email, user.full_name, new_id, email_payload)
-        except Exception as e: logger.error(f"Lỗi gửi mail: {e}")
+        # Email xác nhận ghi vào outbox trong cùng transaction, worker nền sẽ gửi
+        email_payload = {
+            'items': email_items, 'subtotal': float(subtotal), 'total_amount': float(final_total),
+            'shipping_address': order_data.shipping_address, 'payment_method_id': order_data.payment_method_id
+        }
+        queue_order_confirmation_email(db, user.email, user.full_name, new_id, email_payload)
 
-        return new_order
+        # Gắn mã đơn vào Idempotency-Key cùng transaction: đơn đã commit thì retry không tạo lại
+        if idempotency_claim:
+            await idempotency.mark_resource(db, idempotency_claim, new_id)
+
+        await db.commit()
+        orders_created_total.inc()
+        outbox_worker.wake()
+
+        # Nạp lại đơn kèm quan hệ (AsyncSession không hỗ trợ lazy load)
+        return await get_order_by_id(db, new_id)
     except Exception as e:
-        db.rollback(); raise e
+        await db.rollback(); raise e
+
 
+async def _set_order_status(
+    db: AsyncSession, order: Order, new_status_id: str, restock: Optional[Dict[str, int]] = None
+):
+    """
+    Đổi trạng thái đơn, chuyển đơn sang dòng trạng thái mới trong sales_daily
+    và trừ khỏi xếp hạng xu hướng nếu đơn bị hủy, cộng vào ma trận đồng mua nếu đơn hoàn thành.
+    Thứ tự khóa cố định cho mọi luồng: books (nếu có, theo book_id) -> orders -> các bảng tổng hợp.
+    restock: số lượng trả về kho khi hủy đơn (dòng sách phải được khóa trước bằng lock_books).
+    """
+    # Đổi trạng thái có điều kiện: request khác vừa đổi trước thì dừng (không trả kho hai lần)
+    result = await db.execute(
+        update(Order)
+        .where(Order.order_id == order.order_id, Order.status_id == order.status_id)
+        .values(status_id=new_status_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise HTTPException(status_code=409, detail="Trạng thái đơn hàng vừa được thay đổi, vui lòng tải lại")
+    if restock:
+        await restore_stock(db, restock)
 
-def get_user_orders(db: Session, user_id: str):
+    await sales_rollup.record_status_change(
+        db, order.created_at, order.status_id, new_status_id,
+        order.total_amount, sum(detail.quantity for detail in order.order_details)
+    )
+    refs = await reference_cache.get(db)
+    if new_status_id == refs.status_ids.get('cancelled') and order.status_id != new_status_id:
+        await trending.record_order_cancelled(db, order)
+    if new_status_id == refs.status_ids.get('completed') and order.status_id != new_status_id:
+        await copurchase.record_order_completed(db, order)
+    set_committed_value(order, "status_id", new_status_id)
+
+
+async def get_user_orders(db: AsyncSession, user_id: str):
     """Lấy danh sách đơn hàng của user"""
     stmt = select(Order).where(Order.user_id == user_id).order_by(Order.created_at.desc())
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
-def get_order_by_id(db: Session, order_id: str):
+async def get_order_by_id(db: AsyncSession, order_id: str):
     """Lấy đơn hàng theo ID"""
-    stmt = select(Order).where(Order.order_id == order_id)
-    result = db.execute(stmt)
+    stmt = (
+        select(Order)
+        .options(
+            joinedload(Order.status),
+            joinedload(Order.user),
+            joinedload(Order.payment_method),
+            selectinload(Order.order_details).joinedload(OrderDetail.book)
+        )
+        .where(Order.order_id == order_id)
+        .execution_options(populate_existing=True)
+    )
+    result = await db.execute(stmt)
     order = result.scalar_one_or_none()
     
     if not order:
@@ -111,64 +237,65 @@ def get_order_by_id(db: Session, order_id: str):
     return order
 
 
-def cancel_order(db: Session, order_id: str, user_id: str):
+async def cancel_order(db: AsyncSession, order_id: str, user_id: str):
     """
     Hủy đơn hàng - CHỈ cho phép khi đơn đang ở trạng thái 'processing' (Chờ xử lý)
     """
-    order = get_order_by_id(db, order_id)
+    order = await get_order_by_id(db, order_id)
     
     # Check permission
     if order.user_id != user_id:
         raise HTTPException(status_code=403, detail="Bạn không có quyền hủy đơn hàng này")
     
+    refs = await reference_cache.get(db)
+    
     # CHANGED: Chỉ cho phép hủy khi đang "Chờ xử lý"
-    if order.status.status_name != 'processing':
+    if order.status_id != refs.status_ids.get('processing'):
         raise HTTPException(
             status_code=400, 
             detail="Chỉ có thể hủy đơn hàng đang chờ xử lý"
         )
     
-    # Update status to cancelled
-    cancelled_status = db.execute(
-        select(OrderStatus).where(OrderStatus.status_name == 'cancelled')
-    ).scalar_one()
-    
-    order.status_id = cancelled_status.status_id
-    
-    # Restore stock
+    quantities: Dict[str, int] = {}
     for detail in order.order_details:
-        detail.book.stock_quantity += detail.quantity
-        detail.book.sold_quantity -= detail.quantity
+        if detail.book_id:
+            quantities[detail.book_id] = quantities.get(detail.book_id, 0) + detail.quantity
     
-    db.commit()
-    db.refresh(order)
+    # Khóa books trước (theo book_id), rồi đổi trạng thái có điều kiện (hủy trùng -> 409),
+    # trả hàng về kho, sau cùng mới cập nhật các bảng tổng hợp
+    await lock_books(db, quantities)
+    await _set_order_status(db, order, refs.status_ids['cancelled'], restock=quantities)
     
-    # Send notification email
+    # Queue notification email (cùng transaction)
     user = order.user
     if user:
-        try:
-            send_order_status_update_email(
-                user.email, 
-                user.full_name, 
-                order_id, 
-                'processing', 
-                'cancelled'
-            )
-        except Exception as e:
-            logger.error(f"Lỗi gửi mail hủy đơn: {e}")
+        queue_order_status_update_email(
+            db,
+            user.email, 
+            user.full_name, 
+            order_id, 
+            'processing', 
+            'cancelled'
+        )
+    
+    await db.commit()
+    outbox_worker.wake()
+    order = await get_order_by_id(db, order_id)
     
     return order
 
 
-def update_order_status(db: Session, order_id: str, new_status: str):
+async def update_order_status(db: AsyncSession, order_id: str, new_status: str):
     """
     Cập nhật trạng thái đơn hàng (Admin)
     Flow: processing -> confirmed -> shipping -> completed
     """
-    order = get_order_by_id(db, order_id)
+    order = await get_order_by_id(db, order_id)
+    
+    refs = await reference_cache.get(db)
     
     # Validate status transitions
-    current_status = order.status.status_name if order.status else None
+    current_status = refs.status_names.get(order.status_id)
     
     # CHANGED: Logic chuyển trạng thái mới
     valid_transitions = {
@@ -188,55 +315,52 @@ def update_order_status(db: Session, order_id: str, new_status: str):
             detail=f"Không thể chuyển từ '{current_status}' sang '{new_status}'"
         )
     
-    status_obj = db.execute(
-        select(OrderStatus).where(OrderStatus.status_name == new_status)
-    ).scalar_one_or_none()
+    new_status_id = refs.status_ids.get(new_status)
     
-    if not status_obj:
+    if not new_status_id:
         raise HTTPException(status_code=404, detail="Không tìm thấy trạng thái")
     
     old_status = current_status
-    order.status_id = status_obj.status_id
+    await _set_order_status(db, order, new_status_id)
     
-    db.commit()
-    db.refresh(order)
-    
-    # Send email notification
+    # Queue email notification (cùng transaction)
     user = order.user
     if user:
-        try:
-            send_order_status_update_email(user.email, user.full_name, order_id, old_status, new_status)
-        except Exception as e:
-            logger.error(f"Lỗi gửi mail: {e}")
+        queue_order_status_update_email(db, user.email, user.full_name, order_id, old_status, new_status)
+    
+    await db.commit()
+    if new_status == 'completed':
+        copurchase.invalidate_order(order)
+    outbox_worker.wake()
+    order = await get_order_by_id(db, order_id)
     
     return order
 
 
-def confirm_delivery(db: Session, order_id: str, user_id: str):
+async def confirm_delivery(db: AsyncSession, order_id: str, user_id: str):
     """
     User xác nhận đã nhận hàng - Chuyển từ 'shipping' -> 'completed'
     """
-    order = get_order_by_id(db, order_id)
+    order = await get_order_by_id(db, order_id)
     
     # Check permission
     if order.user_id != user_id:
         raise HTTPException(status_code=403, detail="Bạn không có quyền xác nhận đơn hàng này")
     
+    refs = await reference_cache.get(db)
+    
     # CHANGED: Chỉ cho phép xác nhận khi đang "Đang giao"
-    if order.status.status_name != 'shipping':
+    if order.status_id != refs.status_ids.get('shipping'):
         raise HTTPException(
             status_code=400, 
             detail="Chỉ có thể xác nhận đơn hàng đang giao"
         )
     
     # Update to completed
-    completed_status = db.execute(
-        select(OrderStatus).where(OrderStatus.status_name == 'completed')
-    ).scalar_one()
-    
-    order.status_id = completed_status.status_id
+    await _set_order_status(db, order, refs.status_ids['completed'])
     
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    copurchase.invalidate_order(order)
+    order = await get_order_by_id(db, order_id)
     
     return order
\ No newline at end of file
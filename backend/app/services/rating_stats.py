@@ -0,0 +1,117 @@
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select, delete, func, insert, case, literal
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.upsert import upsert_increment
+from app.models.review import Review
+from app.models.book_rating_stats import BookRatingStats
+
+STARS = range(1, 6)
+STATS_COLUMNS = ["book_id", "review_count", "rating_sum", *[f"star_{star}" for star in STARS]]
+
+
+def _aggregates():
+    """review_count, rating_sum, star_1..star_5 tính từ bảng reviews"""
+    return [
+        func.count(Review.review_id),
+        func.coalesce(func.sum(Review.rating), 0),
+        *[func.coalesce(func.sum(case((Review.rating == star, 1), else_=0)), 0) for star in STARS]
+    ]
+
+
+async def _lock_or_seed(db: AsyncSession, book_id: str):
+    """
+    Khóa dòng thống kê của sách; chưa có dòng (sách có review từ trước khi có bảng tổng hợp,
+    hoặc chưa chạy rebuild) thì tạo từ bảng reviews để các delta sau không làm số đếm âm.
+    Trùng khóa với transaction khác vừa tạo thì bỏ qua (INSERT IGNORE / ON CONFLICT DO NOTHING).
+    """
+    exists = (await db.execute(
+        select(BookRatingStats.book_id).where(BookRatingStats.book_id == book_id).with_for_update()
+    )).first()
+    if exists:
+        return
+
+    # Gộp không GROUP BY: luôn trả về một dòng, kể cả khi sách chưa có review
+    source = select(literal(book_id), *_aggregates()).where(
+        Review.book_id == book_id, Review.rating.is_not(None)
+    )
+    if db.get_bind().dialect.name == "mysql":
+        stmt = mysql_insert(BookRatingStats).from_select(STATS_COLUMNS, source).prefix_with("IGNORE")
+    else:
+        stmt = sqlite_insert(BookRatingStats).from_select(STATS_COLUMNS, source).on_conflict_do_nothing()
+    await db.execute(stmt)
+
+
+async def record_rating_change(
+    db: AsyncSession,
+    book_id: str,
+    old_rating: Optional[int],
+    new_rating: Optional[int]
+):
+    """
+    Cập nhật book_rating_stats khi một review được tạo (old=None),
+    sửa điểm (old, new) hoặc xóa (new=None).
+    Gọi trước khi ghi thay đổi của review vào session (dòng thống kê thiếu được tạo từ bảng reviews
+    ở trạng thái trước thay đổi) và trong cùng transaction với review.
+    """
+    if old_rating == new_rating:
+        return
+
+    await _lock_or_seed(db, book_id)
+
+    deltas = {"review_count": 0, "rating_sum": 0}
+    if old_rating is not None:
+        deltas["review_count"] -= 1
+        deltas["rating_sum"] -= old_rating
+        deltas[f"star_{old_rating}"] = -1
+    if new_rating is not None:
+        deltas["review_count"] += 1
+        deltas["rating_sum"] += new_rating
+        deltas[f"star_{new_rating}"] = deltas.get(f"star_{new_rating}", 0) + 1
+
+    await upsert_increment(db, BookRatingStats, keys=dict(book_id=book_id), deltas=deltas)
+
+
+def _to_summary(stats: Optional[BookRatingStats]) -> dict:
+    count = stats.review_count if stats else 0
+    return {
+        "average_rating": round(stats.rating_sum / count, 1) if count else 0.0,
+        "total_reviews": count,
+        "rating_distribution": {
+            f"{star}_star": getattr(stats, f"star_{star}") if stats else 0 for star in STARS
+        }
+    }
+
+
+async def get_summaries(db: AsyncSession, book_ids: Iterable[str]) -> Dict[str, dict]:
+    """Thống kê đánh giá của nhiều sách bằng một truy vấn theo khóa chính"""
+    book_ids = list(dict.fromkeys(book_ids))
+    if not book_ids:
+        return {}
+
+    rows = (await db.execute(
+        select(BookRatingStats).where(BookRatingStats.book_id.in_(book_ids))
+    )).scalars().all()
+    stats_by_book = {stats.book_id: stats for stats in rows}
+
+    return {book_id: _to_summary(stats_by_book.get(book_id)) for book_id in book_ids}
+
+
+async def rebuild_book_rating_stats(db: AsyncSession) -> int:
+    """Tính lại toàn bộ book_rating_stats từ bảng reviews (backfill hoặc sửa lệch)"""
+    source = (
+        select(Review.book_id, *_aggregates())
+        .where(Review.book_id.is_not(None), Review.rating.is_not(None))
+        .group_by(Review.book_id)
+    )
+
+    await db.execute(delete(BookRatingStats))
+    await db.execute(
+        insert(BookRatingStats).from_select(STATS_COLUMNS, source)
+    )
+    await db.commit()
+
+    return (await db.execute(select(func.count()).select_from(BookRatingStats))).scalar()
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.order_status import OrderStatus
+from app.models.payment_method import PaymentMethod
+from app.models.category import Category
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    """Ảnh chụp (bất biến) các bảng tham chiếu nhỏ"""
+    status_ids: Dict[str, str] = field(default_factory=dict)            # status_name -> status_id
+    status_names: Dict[str, str] = field(default_factory=dict)          # status_id -> status_name
+    payment_method_ids: Dict[str, str] = field(default_factory=dict)    # method_name -> payment_method_id
+    payment_method_names: Dict[str, str] = field(default_factory=dict)  # payment_method_id -> method_name
+    category_ids: Dict[str, str] = field(default_factory=dict)          # category_name -> category_id
+    category_names: Dict[str, str] = field(default_factory=dict)        # category_id -> category_name
+    loaded_at: float = 0.0
+
+
+class ReferenceCache:
+    """
+    Cache trong tiến trình cho OrderStatus, PaymentMethod, Category.
+    - Nạp sẵn khi khởi động (warm)
+    - Bị xóa khi admin ghi vào thể loại (invalidate), nạp lại ở lần đọc kế tiếp
+    - TTL giới hạn độ trễ giữa các worker uvicorn khác nhau
+    """
+
+    def __init__(self, ttl_seconds: int = None):
+        self._ttl = ttl_seconds if ttl_seconds is not None else settings.REFERENCE_CACHE_TTL_SECONDS
+        self._data: Optional[ReferenceData] = None
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _is_fresh(self, data: Optional[ReferenceData]) -> bool:
+        return data is not None and (time.monotonic() - data.loaded_at) < self._ttl
+
+    async def get(self, db: AsyncSession) -> ReferenceData:
+        data = self._data
+        if self._is_fresh(data):
+            self.hits += 1
+            return data
+        async with self._lock:
+            if not self._is_fresh(self._data):
+                self.misses += 1
+                self._data = await self._load(db)
+            else:
+                self.hits += 1
+            return self._data
+
+    async def category_name(self, db: AsyncSession, category_id: str) -> Optional[str]:
+        """
+        Tên thể loại theo ID. Nếu không thấy thì nạp lại một lần
+        (thể loại có thể vừa được tạo ở worker khác).
+        """
+        refs = await self.get(db)
+        if category_id in refs.category_names:
+            return refs.category_names[category_id]
+        self.invalidate()
+        refs = await self.get(db)
+        return refs.category_names.get(category_id)
+
+    async def warm(self, session_factory=SessionLocal) -> ReferenceData:
+        async with session_factory() as db:
+            self._data = await self._load(db)
+            return self._data
+
+    def invalidate(self):
+        self._data = None
+
+    async def _load(self, db: AsyncSession) -> ReferenceData:
+        statuses = (await db.execute(select(OrderStatus.status_id, OrderStatus.status_name))).all()
+        methods = (await db.execute(
+            select(PaymentMethod.payment_method_id, PaymentMethod.method_name)
+        )).all()
+        categories = (await db.execute(select(Category.category_id, Category.category_name))).all()
+
+        return ReferenceData(
+            status_ids={name: sid for sid, name in statuses},
+            status_names={sid: name for sid, name in statuses},
+            payment_method_ids={name: pid for pid, name in methods},
+            payment_method_names={pid: name for pid, name in methods},
+            category_ids={name: cid for cid, name in categories},
+            category_names={cid: name for cid, name in categories},
+            loaded_at=time.monotonic(),
+        )
+
+
+# Cache dùng chung cho toàn ứng dụng
+reference_cache = ReferenceCache()
@@ -1,5 +1,5 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from fastapi import HTTPException, status
 from datetime import datetime
 
@@ -9,28 +9,28 @@ from app.models.order import Order
 from app.models.order_detail import OrderDetail
 from app.models.book import Book
 from app.schemas.review import ReviewCreate, ReviewUpdate
+from app.services.reference_cache import reference_cache
+from app.services import rating_stats
 
 
-def check_user_purchased_book(db: Session, user_id: str, book_id: str) -> bool:
+async def check_user_purchased_book(db: AsyncSession, user_id: str, book_id: str) -> bool:
     """Kiểm tra user đã mua sách chưa"""
+    refs = await reference_cache.get(db)
     stmt = (
-        select(Order)
+        select(Order.order_id)
         .join(OrderDetail, Order.order_id == OrderDetail.order_id)
-        .join(Book, OrderDetail.book_id == Book.book_id)
         .where(
             Order.user_id == user_id,
-            Book.book_id == book_id,
-            Order.status_id.in_(
-                select(func.distinct(func.substring(Order.status_id, 1, 10)))
-                .where(Order.status_id != 'ST005')  # Không tính đơn đã hủy
-            )
+            OrderDetail.book_id == book_id,
+            Order.status_id != refs.status_ids.get('cancelled')  # Không tính đơn đã hủy
         )
+        .limit(1)
     )
-    result = db.execute(stmt).first()
+    result = (await db.execute(stmt)).first()
     return result is not None
 
 
-def get_book_reviews(db: Session, book_id: str, skip: int = 0, limit: int = 50):
+async def get_book_reviews(db: AsyncSession, book_id: str, skip: int = 0, limit: int = 50):
     """Lấy danh sách đánh giá của một cuốn sách"""
     stmt = (
         select(Review, User.full_name)
@@ -41,7 +41,7 @@ def get_book_reviews(db: Session, book_id: str, skip: int = 0, limit: int = 50):
         .limit(limit)
     )
     
-    reviews = db.execute(stmt).all()
+    reviews = (await db.execute(stmt)).all()
     
     result = []
     for review, user_name in reviews:
@@ -59,36 +59,16 @@ def get_book_reviews(db: Session, book_id: str, skip: int = 0, limit: int = 50):
     return result
 
 
-def get_rating_summary(db: Session, book_id: str):
-    """Lấy thống kê đánh giá của sách"""
-    # Điểm trung bình và tổng số đánh giá
-    stats = db.execute(
-        select(
-            func.avg(Review.rating).label("avg"),
-            func.count(Review.review_id).label("count")
-        ).where(Review.book_id == book_id)
-    ).first()
-    
-    # Phân bố đánh giá theo sao (1-5 sao)
-    distribution = {}
-    for star in range(1, 6):
-        count = db.execute(
-            select(func.count(Review.review_id))
-            .where(Review.book_id == book_id, Review.rating == star)
-        ).scalar()
-        distribution[f"{star}_star"] = count
-    
-    return {
-        "average_rating": round(float(stats.avg or 0), 1),
-        "total_reviews": stats.count or 0,
-        "rating_distribution": distribution
-    }
+async def get_rating_summary(db: AsyncSession, book_id: str):
+    """Lấy thống kê đánh giá của sách (đọc từ bảng tổng hợp book_rating_stats)"""
+    summaries = await rating_stats.get_summaries(db, [book_id])
+    return summaries[book_id]
 
 
-def create_review(db: Session, user_id: str, data: ReviewCreate):
+async def create_review(db: AsyncSession, user_id: str, data: ReviewCreate):
     """Tạo đánh giá mới"""
     # 1. Kiểm tra sách có tồn tại không
-    book = db.execute(select(Book).where(Book.book_id == data.book_id)).scalar_one_or_none()
+    book = (await db.execute(select(Book).where(Book.book_id == data.book_id))).scalar_one_or_none()
     if not book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -96,19 +76,19 @@ def create_review(db: Session, user_id: str, data: ReviewCreate):
         )
     
     # 2. Kiểm tra đã mua sách chưa
-    if not check_user_purchased_book(db, user_id, data.book_id):
+    if not await check_user_purchased_book(db, user_id, data.book_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Bạn cần mua sách này trước khi đánh giá"
         )
     
     # 3. Kiểm tra đã đánh giá chưa
-    existing = db.execute(
+    existing = (await db.execute(
         select(Review).where(
             Review.book_id == data.book_id,
             Review.user_id == user_id
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     
     if existing:
         raise HTTPException(
@@ -125,12 +105,14 @@ def create_review(db: Session, user_id: str, data: ReviewCreate):
         created_at=datetime.utcnow()
     )
     
+    # Ghi thống kê trước khi thêm review vào session (autoflush sẽ tính review mới vào dòng seed)
+    await rating_stats.record_rating_change(db, data.book_id, None, data.rating)
     db.add(new_review)
-    db.commit()
-    db.refresh(new_review)
+    await db.commit()
+    await db.refresh(new_review)
     
     # 5. Lấy tên user để trả về
-    user = db.execute(select(User).where(User.user_id == user_id)).scalar_one()
+    user = (await db.execute(select(User).where(User.user_id == user_id))).scalar_one()
     
     return {
         "review_id": new_review.review_id,
@@ -143,11 +125,12 @@ def create_review(db: Session, user_id: str, data: ReviewCreate):
     }
 
 
-def update_review(db: Session, review_id: int, user_id: str, data: ReviewUpdate):
+async def update_review(db: AsyncSession, review_id: int, user_id: str, data: ReviewUpdate):
     """Cập nhật đánh giá (chỉ user tạo mới được sửa)"""
-    review = db.execute(
-        select(Review).where(Review.review_id == review_id)
-    ).scalar_one_or_none()
+    # Khóa review: hai request sửa cùng lúc không cùng trừ một điểm cũ khỏi thống kê
+    review = (await db.execute(
+        select(Review).where(Review.review_id == review_id).with_for_update()
+    )).scalar_one_or_none()
     
     if not review:
         raise HTTPException(
@@ -163,15 +146,16 @@ def update_review(db: Session, review_id: int, user_id: str, data: ReviewUpdate)
     
     # Update fields
     if data.rating is not None:
+        await rating_stats.record_rating_change(db, review.book_id, review.rating, data.rating)
         review.rating = data.rating
     if data.comment is not None:
         review.comment = data.comment
     
-    db.commit()
-    db.refresh(review)
+    await db.commit()
+    await db.refresh(review)
     
     # Get user name
-    user = db.execute(select(User).where(User.user_id == user_id)).scalar_one()
+    user = (await db.execute(select(User).where(User.user_id == user_id))).scalar_one()
     
     return {
         "review_id": review.review_id,
@@ -184,11 +168,11 @@ def update_review(db: Session, review_id: int, user_id: str, data: ReviewUpdate)
     }
 
 
-def delete_review(db: Session, review_id: int, user_id: str, is_admin: bool = False):
+async def delete_review(db: AsyncSession, review_id: int, user_id: str, is_admin: bool = False):
     """Xóa đánh giá (user hoặc admin)"""
-    review = db.execute(
-        select(Review).where(Review.review_id == review_id)
-    ).scalar_one_or_none()
+    review = (await db.execute(
+        select(Review).where(Review.review_id == review_id).with_for_update()
+    )).scalar_one_or_none()
     
     if not review:
         raise HTTPException(
@@ -203,6 +187,7 @@ def delete_review(db: Session, review_id: int, user_id: str, is_admin: bool = Fa
             detail="Bạn không có quyền xóa đánh giá này"
         )
     
-    db.delete(review)
-    db.commit()
+    await rating_stats.record_rating_change(db, review.book_id, review.rating, None)
+    await db.delete(review)
+    await db.commit()
     return True
\ No newline at end of file
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import select, delete, func, insert, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.upsert import upsert_increment
+from app.models.order import Order
+from app.models.order_detail import OrderDetail
+from app.models.sales_daily import SalesDaily
+from app.models.sales_daily_delta import SalesDailyDelta
+
+logger = logging.getLogger(__name__)
+
+
+def _add_delta(
+    db: AsyncSession,
+    sales_date: date,
+    status_id: str,
+    order_count: int,
+    revenue: Decimal,
+    units: int
+):
+    """Ghi một delta vào bảng chờ (chỉ INSERT dòng mới, không khóa dòng tổng hợp nào)"""
+    db.add(SalesDailyDelta(
+        sales_date=sales_date, status_id=status_id,
+        order_count=order_count, revenue=revenue, units=units
+    ))
+
+
+async def record_order_created(
+    db: AsyncSession,
+    created_at: datetime,
+    status_id: str,
+    total_amount: Decimal,
+    units: int
+):
+    """Ghi nhận đơn mới vào rollup (cùng transaction tạo đơn, được gộp vào sales_daily sau)"""
+    _add_delta(db, created_at.date(), status_id, 1, Decimal(total_amount), units)
+
+
+async def record_status_change(
+    db: AsyncSession,
+    created_at: datetime,
+    old_status_id: Optional[str],
+    new_status_id: str,
+    total_amount: Decimal,
+    units: int
+):
+    """Chuyển đơn từ trạng thái cũ sang mới trong rollup (hai delta, gộp vào sales_daily sau)"""
+    if old_status_id == new_status_id:
+        return
+    amount = Decimal(total_amount)
+    _add_delta(db, created_at.date(), new_status_id, 1, amount, units)
+    if old_status_id:
+        _add_delta(db, created_at.date(), old_status_id, -1, -amount, -units)
+
+
+def sales_source():
+    """
+    sales_daily cộng các delta chưa gộp (UNION ALL), cùng tên cột với SalesDaily.
+    Bảng delta chỉ giữ vài giây thay đổi nên dashboard vẫn đọc số liệu chính xác tức thời.
+    """
+    columns = ("sales_date", "status_id", "order_count", "revenue", "units")
+    return union_all(
+        select(*(getattr(SalesDaily, name) for name in columns)),
+        select(*(getattr(SalesDailyDelta, name) for name in columns)),
+    ).subquery("sales")
+
+
+async def fold_deltas(db: AsyncSession, batch_size: int = None) -> int:
+    """
+    Gộp một lô delta vào sales_daily rồi xóa chúng, trong một transaction.
+    SKIP LOCKED: nhiều worker có thể chạy cùng lúc mà không gộp trùng.
+    Dòng sales_daily được cập nhật theo thứ tự (ngày, trạng thái) cố định để tránh deadlock.
+    Trả về số delta đã gộp.
+    """
+    batch_size = batch_size or settings.SALES_ROLLUP_FOLD_BATCH_SIZE
+    rows = (await db.execute(
+        select(
+            SalesDailyDelta.delta_id, SalesDailyDelta.sales_date, SalesDailyDelta.status_id,
+            SalesDailyDelta.order_count, SalesDailyDelta.revenue, SalesDailyDelta.units
+        )
+        .order_by(SalesDailyDelta.delta_id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if not rows:
+        await db.rollback()
+        return 0
+
+    totals = defaultdict(lambda: [0, Decimal(0), 0])
+    for _, sales_date, status_id, order_count, revenue, units in rows:
+        total = totals[(sales_date, status_id)]
+        total[0] += order_count
+        total[1] += Decimal(revenue)
+        total[2] += units
+
+    for (sales_date, status_id), (order_count, revenue, units) in sorted(totals.items()):
+        await upsert_increment(
+            db, SalesDaily,
+            keys=dict(sales_date=sales_date, status_id=status_id),
+            deltas=dict(order_count=order_count, revenue=revenue, units=units)
+        )
+    await db.execute(
+        delete(SalesDailyDelta).where(SalesDailyDelta.delta_id.in_([row[0] for row in rows]))
+    )
+    await db.commit()
+    return len(rows)
+
+
+async def rebuild_sales_daily(db: AsyncSession) -> int:
+    """
+    Tính lại toàn bộ sales_daily từ orders/order_details (backfill hoặc sửa lệch).
+    Nên chạy lúc ít đơn: delta của đơn commit trong lúc tính lại có thể bị xóa hoặc cộng trùng.
+    """
+    units_per_order = (
+        select(OrderDetail.order_id, func.sum(OrderDetail.quantity).label("units"))
+        .group_by(OrderDetail.order_id)
+        .subquery()
+    )
+    sales_date = func.date(Order.created_at)
+    source = (
+        select(
+            sales_date,
+            Order.status_id,
+            func.count(Order.order_id),
+            func.coalesce(func.sum(Order.total_amount), 0),
+            func.coalesce(func.sum(units_per_order.c.units), 0),
+        )
+        .outerjoin(units_per_order, units_per_order.c.order_id == Order.order_id)
+        .where(Order.status_id.is_not(None), Order.created_at.is_not(None))
+        .group_by(sales_date, Order.status_id)
+    )
+
+    # Các delta đang chờ đã nằm trong số liệu tính lại từ orders
+    await db.execute(delete(SalesDailyDelta))
+    await db.execute(delete(SalesDaily))
+    await db.execute(
+        insert(SalesDaily).from_select(
+            ["sales_date", "status_id", "order_count", "revenue", "units"], source
+        )
+    )
+    await db.commit()
+
+    return (await db.execute(select(func.count()).select_from(SalesDaily))).scalar()
+
+
+class SalesRollupWorker:
+    """Gộp sales_daily_deltas vào sales_daily định kỳ (mỗi SALES_ROLLUP_FOLD_SECONDS)"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def fold_all(self) -> int:
+        """Gộp hết các delta đang chờ (từng lô)"""
+        folded = 0
+        while True:
+            async with self._session_factory() as db:
+                count = await fold_deltas(db)
+            folded += count
+            if count < settings.SALES_ROLLUP_FOLD_BATCH_SIZE:
+                return folded
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await self.fold_all()
+            except Exception as e:
+                logger.error(f"Lỗi gộp sales_daily_deltas: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.SALES_ROLLUP_FOLD_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Worker dùng chung cho toàn ứng dụng
+sales_rollup_worker = SalesRollupWorker()
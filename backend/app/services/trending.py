@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, delete, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.upsert import upsert_increment_rows
+from app.models.book_trending import BookTrending
+from app.models.trending_state import TrendingState
+from app.models.trending_cancellation import TrendingCancellation
+from app.models.order import Order
+from app.models.order_detail import OrderDetail
+from app.services.reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+# Khi epoch cũ hơn mốc này thì quy điểm về epoch mới để số mũ không tràn float
+REBASE_AFTER = timedelta(days=180)
+
+# Sau khi trừ đơn hủy, điểm nhỏ hơn mốc này là sai số làm tròn (cộng rồi trừ cùng một trọng số) -> đưa về 0
+SCORE_EPSILON = 1e-9
+
+
+def _rate(half_life_days: float) -> float:
+    """Hệ số suy giảm λ (trên giây) từ chu kỳ bán rã"""
+    return math.log(2) / (half_life_days * SECONDS_PER_DAY)
+
+
+def _weights(created_at: datetime, epoch: datetime) -> Tuple[float, float]:
+    """Trọng số (hot, trend) của một cuốn bán tại created_at, quy về epoch"""
+    elapsed = (created_at - epoch).total_seconds()
+    return (
+        math.exp(_rate(settings.TRENDING_HOT_HALF_LIFE_DAYS) * elapsed),
+        math.exp(_rate(settings.TRENDING_HALF_LIFE_DAYS) * elapsed),
+    )
+
+
+async def _lock_state(db: AsyncSession, create: bool = True) -> Optional[TrendingState]:
+    """Khóa dòng trạng thái (FOR UPDATE) để các job của nhiều worker không chạy chồng lên nhau"""
+    stmt = select(TrendingState).where(TrendingState.state_id == 1).with_for_update()
+    state = (await db.execute(stmt)).scalar_one_or_none()
+    if state is not None or not create:
+        return state
+
+    db.add(TrendingState(state_id=1, epoch=datetime.utcnow(), high_water_mark=None))
+    try:
+        await db.flush()
+    except IntegrityError:
+        # Worker khác vừa tạo cùng lúc
+        await db.rollback()
+    return (await db.execute(stmt)).scalar_one()
+
+
+async def _rebase(db: AsyncSession, state: TrendingState, new_epoch: datetime):
+    elapsed = (new_epoch - state.epoch).total_seconds()
+    await db.execute(
+        update(BookTrending).values(
+            hot_score=BookTrending.hot_score
+            * math.exp(-_rate(settings.TRENDING_HOT_HALF_LIFE_DAYS) * elapsed),
+            trend_score=BookTrending.trend_score
+            * math.exp(-_rate(settings.TRENDING_HALF_LIFE_DAYS) * elapsed),
+        )
+    )
+    state.epoch = new_epoch
+
+
+async def _clamp_scores(db: AsyncSession, book_ids: List[str]):
+    """Đưa điểm gần 0 (hoặc âm do sai số) về đúng 0 để sách bị hủy hết đơn không còn điểm rác"""
+    await db.execute(
+        update(BookTrending)
+        .where(BookTrending.book_id.in_(book_ids))
+        .values(
+            hot_score=case((BookTrending.hot_score < SCORE_EPSILON, 0.0), else_=BookTrending.hot_score),
+            trend_score=case((BookTrending.trend_score < SCORE_EPSILON, 0.0), else_=BookTrending.trend_score),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def refresh_trending(db: AsyncSession) -> int:
+    """
+    Cộng các dòng đơn hàng mới (sau high-water mark) vào book_trending
+    và trừ các đơn bị hủy đã ghi trong trending_cancellations.
+    - Lần nạp đầu (chưa có high-water mark): chỉ cộng đơn chưa hủy, bỏ các dòng hủy của đơn đó
+      (cùng snapshot nên dòng hủy nào thấy được thì trạng thái 'cancelled' cũng thấy được)
+    - Các lần sau: cộng mọi đơn trong khoảng, kể cả đã hủy; mỗi lần hủy được trừ đúng một lần
+      (trước hay sau khi cộng đều như nhau vì chỉ là cộng dồn)
+    Trả về số dòng order_details đã xử lý.
+    """
+    state = await _lock_state(db)
+    upper = datetime.utcnow() - timedelta(seconds=settings.TRENDING_LAG_SECONDS)
+    if state.high_water_mark is not None and state.high_water_mark >= upper:
+        await db.commit()
+        return 0
+
+    if upper - state.epoch > REBASE_AFTER:
+        await _rebase(db, state, upper)
+
+    initial = state.high_water_mark is None
+    stmt = (
+        select(OrderDetail.book_id, OrderDetail.quantity, Order.created_at)
+        .join(Order, Order.order_id == OrderDetail.order_id)
+        .where(Order.created_at <= upper)
+        .execution_options(yield_per=5000)
+    )
+    if initial:
+        refs = await reference_cache.get(db)
+        stmt = stmt.where(Order.status_id != refs.status_ids.get('cancelled'))
+    else:
+        stmt = stmt.where(Order.created_at > state.high_water_mark)
+
+    deltas: Dict[str, List[float]] = {}
+
+    def _add(book_id: str, quantity: int, created_at: datetime):
+        hot, trend = _weights(created_at, state.epoch)
+        scores = deltas.setdefault(book_id, [0.0, 0.0])
+        scores[0] += quantity * hot
+        scores[1] += quantity * trend
+
+    processed = 0
+    result = await db.stream(stmt)
+    async for book_id, quantity, created_at in result:
+        _add(book_id, quantity, created_at)
+        processed += 1
+
+    cancel_stmt = (
+        select(TrendingCancellation.cancel_id, OrderDetail.book_id, OrderDetail.quantity, Order.created_at)
+        .outerjoin(Order, Order.order_id == TrendingCancellation.order_id)
+        .outerjoin(OrderDetail, OrderDetail.order_id == Order.order_id)
+    )
+    cancel_ids = set()
+    cancelled_books = set()
+    for cancel_id, book_id, quantity, created_at in (await db.execute(cancel_stmt)).all():
+        if initial and created_at is not None and created_at > upper:
+            # Đơn chưa được lần nạp này cộng: giữ lại, trừ ở lần sau khi đơn đã được cộng
+            continue
+        cancel_ids.add(cancel_id)
+        if not initial and book_id is not None:
+            _add(book_id, -quantity, created_at)
+            cancelled_books.add(book_id)
+
+    await upsert_increment_rows(
+        db, BookTrending,
+        [
+            dict(book_id=book_id, hot_score=hot, trend_score=trend)
+            for book_id, (hot, trend) in sorted(deltas.items())
+        ],
+        keys=("book_id",), delta_columns=("hot_score", "trend_score")
+    )
+    if cancelled_books:
+        await _clamp_scores(db, sorted(cancelled_books))
+    if cancel_ids:
+        # Xóa theo id đã đọc (không theo điều kiện) để dòng hủy mới commit sau snapshot vẫn còn
+        await db.execute(delete(TrendingCancellation).where(TrendingCancellation.cancel_id.in_(cancel_ids)))
+
+    state.high_water_mark = upper
+    await db.commit()
+    return processed
+
+
+async def record_order_cancelled(db: AsyncSession, order: Order):
+    """
+    Ghi đơn bị hủy để job trừ khỏi book_trending ở lần chạy sau.
+    Gọi trong transaction hủy đơn; chỉ INSERT, không khóa trending_state hay book_trending.
+    """
+    db.add(TrendingCancellation(order_id=order.order_id))
+
+
+async def rebuild_trending(db: AsyncSession) -> int:
+    """Tính lại từ đầu (sau khi đổi chu kỳ bán rã hoặc để sửa lệch)"""
+    await db.execute(delete(BookTrending))
+    await db.execute(delete(TrendingState))
+    await db.commit()
+    return await refresh_trending(db)
+
+
+class TrendingWorker:
+    """Chạy refresh_trending định kỳ trong nền (mỗi TRENDING_REFRESH_SECONDS)"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                async with self._session_factory() as db:
+                    await refresh_trending(db)
+            except Exception as e:
+                logger.error(f"Lỗi cập nhật xếp hạng xu hướng: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.TRENDING_REFRESH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Worker dùng chung cho toàn ứng dụng
+trending_worker = TrendingWorker()
@@ -1,14 +1,17 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, or_
-import uuid
 
 from app.models.user import User
+from app.models.review import Review
 from app.schemas.user_admin import UserCreateAdmin, UserUpdateAdmin
-from app.core.security import get_password_hash
+from app.core.security import password_hasher
+from app.core.principal_cache import principal_cache
+from app.services.id_allocator import next_user_id
+from app.services import rating_stats
 
 
-def get_all_users(
-    db: Session,
+async def get_all_users(
+    db: AsyncSession,
     skip: int = 0,
     limit: int = 100,
     search: str = None,
@@ -33,11 +36,11 @@ def get_all_users(
         stmt = stmt.where(User.role == role_filter)
     
     stmt = stmt.offset(skip).limit(limit).order_by(User.created_at.desc())
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 
-def count_users(db: Session, search: str = None, role_filter: str = None) -> int:
+async def count_users(db: AsyncSession, search: str = None, role_filter: str = None) -> int:
     """Đếm tổng số users"""
     stmt = select(func.count()).select_from(User)
     
@@ -54,30 +57,30 @@ def count_users(db: Session, search: str = None, role_filter: str = None) -> int
     if role_filter:
         stmt = stmt.where(User.role == role_filter)
     
-    return db.execute(stmt).scalar()
+    return (await db.execute(stmt)).scalar()
 
 
-def get_user_by_id(db: Session, user_id: str):
+async def get_user_by_id(db: AsyncSession, user_id: str):
     """Lấy user theo ID"""
     stmt = select(User).where(User.user_id == user_id)
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalar_one_or_none()
 
 
-def get_user_by_email(db: Session, email: str):
+async def get_user_by_email(db: AsyncSession, email: str):
     """Lấy user theo email"""
     stmt = select(User).where(User.email == email)
-    result = db.execute(stmt)
+    result = await db.execute(stmt)
     return result.scalar_one_or_none()
 
 
-def create_user(db: Session, user_data: UserCreateAdmin):
+async def create_user(db: AsyncSession, user_data: UserCreateAdmin):
     """Tạo user mới (Admin)"""
     # Generate user ID
-    new_user_id = f"U{str(uuid.uuid4().int)[:8]}"
+    new_user_id = await next_user_id()
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     
     new_user = User(
         user_id=new_user_id,
@@ -90,14 +93,14 @@ def create_user(db: Session, user_data: UserCreateAdmin):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-def update_user(db: Session, user_id: str, user_data: UserUpdateAdmin):
+async def update_user(db: AsyncSession, user_id: str, user_data: UserUpdateAdmin):
     """Cập nhật thông tin user"""
-    user = get_user_by_id(db, user_id)
+    user = await get_user_by_id(db, user_id)
     if not user:
         return None
     
@@ -105,22 +108,31 @@ def update_user(db: Session, user_id: str, user_data: UserUpdateAdmin):
     
     # Hash password nếu có thay đổi
     if 'password' in update_data and update_data['password']:
-        update_data['password'] = get_password_hash(update_data['password'])
+        update_data['password'] = await password_hasher.hash(update_data['password'])
     
     for key, value in update_data.items():
         setattr(user, key, value)
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user_id)
+    await db.refresh(user)
     return user
 
 
-def delete_user(db: Session, user_id: str):
+async def delete_user(db: AsyncSession, user_id: str):
     """Xóa user"""
-    user = get_user_by_id(db, user_id)
+    user = await get_user_by_id(db, user_id)
     if not user:
         return False
     
-    db.delete(user)
-    db.commit()
+    # Reviews của user bị xóa theo cascade -> trừ khỏi thống kê đánh giá của sách
+    reviews = (await db.execute(
+        select(Review.book_id, Review.rating).where(Review.user_id == user_id)
+    )).all()
+    for book_id, rating in reviews:
+        await rating_stats.record_rating_change(db, book_id, rating, None)
+    
+    await db.delete(user)
+    await db.commit()
+    principal_cache.invalidate(user_id)
     return True
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Đo việc tính lại ma trận sách mua cùng (rebuild_copurchase) trên một bộ dữ liệu nhiều đơn hàng
+(mặc định 1 triệu, phần lớn đã hoàn thành, mỗi đơn 1-5 đầu sách), cùng với thời gian ghi
+tăng dần khi một đơn hoàn thành (record_order_completed) và p50/p99 của GET /api/books/{book_id}/related.
+
+Chạy trên DB SQLite tạm (mặc định) hoặc một DB thử nghiệm riêng (bảng sẽ bị xóa và tạo lại):
+    python benchmarks/bench_copurchase.py
+    python benchmarks/bench_copurchase.py --orders 100000 --books 2000
+    python benchmarks/bench_copurchase.py --database-url mysql+aiomysql://root@localhost/book_shop_bench
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import CUSTOMER_ID, SEED_BATCH, book_id, configure, latency_line, reset_schema, seed_books
+
+DAYS = 730
+COMPLETED_RATIO = 0.8
+
+
+async def _seed_orders(count: int, books: int):
+    """Đơn hàng 1-5 đầu sách khác nhau, phần lớn ở trạng thái hoàn thành, còn lại đang xử lý"""
+    from sqlalchemy import insert
+
+    from app.core.database import SessionLocal
+    from app.models import Order, OrderDetail
+
+    rng = random.Random(16)
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        for start in range(0, count, SEED_BATCH):
+            orders, details = [], []
+            for index in range(start, min(start + SEED_BATCH, count)):
+                order_id = f"O{index:09d}"
+                # Sách bán chạy xuất hiện nhiều hơn (phân bố lệch như dữ liệu thật)
+                line_books = {book_id(int(rng.paretovariate(1.2)) % books) for _ in range(rng.randint(1, 5))}
+                orders.append(dict(
+                    order_id=order_id, user_id=CUSTOMER_ID,
+                    status_id="ST004" if rng.random() < COMPLETED_RATIO else "ST001",
+                    total_amount=len(line_books) * 100000 + 30000,
+                    shipping_address="12345 bench street", payment_method_id="PM001",
+                    created_at=now - timedelta(seconds=rng.randrange(DAYS * 86400)),
+                ))
+                details += [
+                    dict(order_id=order_id, book_id=line_book_id, quantity=1, unit_price=100000)
+                    for line_book_id in line_books
+                ]
+            await db.execute(insert(Order), orders)
+            await db.execute(insert(OrderDetail), details)
+            await db.commit()
+            if (start // SEED_BATCH) % 20 == 19:
+                print(f"  seed {start + SEED_BATCH:,} đơn")
+
+
+async def _record_latencies(args, rng: random.Random):
+    """Ghi tăng dần các đơn 5 đầu sách (rollback để bảng giữ nguyên kết quả rebuild)"""
+    from app.core.database import SessionLocal
+    from app.models import Order, OrderDetail
+    from app.services.copurchase import record_order_completed
+
+    latencies = []
+    async with SessionLocal() as db:
+        for _ in range(args.records):
+            order = Order(order_details=[
+                OrderDetail(book_id=book_id(index)) for index in rng.sample(range(args.books), 5)
+            ])
+            started = time.perf_counter()
+            await record_order_completed(db, order)
+            latencies.append(time.perf_counter() - started)
+            await db.rollback()
+    return latencies
+
+
+async def _run(args):
+    import httpx
+
+    from app.core.database import SessionLocal, close_db
+    from app.main import app
+    from app.services.copurchase import rebuild_copurchase, related_books_cache
+
+    rng = random.Random(17)
+    try:
+        await reset_schema()
+        await seed_books(args.books)
+        started = time.perf_counter()
+        await _seed_orders(args.orders, args.books)
+        print(f"Seed {args.orders:,} đơn: {time.perf_counter() - started:.1f} s")
+
+        rebuilds = []
+        for _ in range(args.rebuilds):
+            started = time.perf_counter()
+            async with SessionLocal() as db:
+                rows = await rebuild_copurchase(db)
+            rebuilds.append(time.perf_counter() - started)
+        print(f"rebuild_copurchase: {min(rebuilds):.2f} s tốt nhất / {max(rebuilds):.2f} s chậm nhất "
+              f"({rows:,} dòng book_copurchase)")
+
+        endpoint_latencies = {"miss": [], "hit": []}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for _ in range(args.requests):
+                path = f"/api/books/{book_id(int(rng.paretovariate(1.2)) % args.books)}/related"
+                # Xóa cache để đo cả truy vấn theo ix_book_copurchase_rank
+                related_books_cache.invalidate()
+                for kind in ("miss", "hit"):
+                    started = time.perf_counter()
+                    response = await client.get(path)
+                    endpoint_latencies[kind].append(time.perf_counter() - started)
+                    response.raise_for_status()
+
+        record_latencies = await _record_latencies(args, rng)
+    finally:
+        # Đóng pool, nếu không các luồng kết nối aiosqlite giữ tiến trình lại
+        await close_db()
+
+    print("GET /api/books/{book_id}/related:")
+    for kind, samples in endpoint_latencies.items():
+        print("  " + latency_line(kind, samples))
+    print(latency_line("record_order_completed (5 sách)", record_latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tính lại ma trận sách mua cùng với nhiều đơn hàng")
+    parser.add_argument("--orders", type=int, default=1_000_000, help="Số đơn hàng seed")
+    parser.add_argument("--books", type=int, default=5000, help="Số đầu sách")
+    parser.add_argument("--rebuilds", type=int, default=3, help="Số lần chạy rebuild_copurchase")
+    parser.add_argument("--requests", type=int, default=500, help="Số lần gọi endpoint related")
+    parser.add_argument("--records", type=int, default=500, help="Số lần ghi tăng dần một đơn hoàn thành")
+    parser.add_argument("--database-url", help="DB thử nghiệm (async URL), mặc định SQLite tạm")
+    args = parser.parse_args()
+    print(f"DB: {configure(args.database_url)}")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
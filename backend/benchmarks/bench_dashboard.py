@@ -0,0 +1,143 @@
+"""
+Đo các endpoint dashboard đọc từ sales_daily trên một bộ dữ liệu nhiều đơn hàng (mặc định 1 triệu),
+so với quét thẳng bảng orders như trước khi có rollup, và thời gian backfill (rebuild_sales_daily).
+
+Chạy trên DB SQLite tạm (mặc định) hoặc một DB thử nghiệm riêng (bảng sẽ bị xóa và tạo lại):
+    python benchmarks/bench_dashboard.py
+    python benchmarks/bench_dashboard.py --orders 100000 --repeat 50
+    python benchmarks/bench_dashboard.py --database-url mysql+aiomysql://root@localhost/book_shop_bench
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import (
+    CUSTOMER_ID, SEED_BATCH, STATUSES, auth_headers, book_id, configure, latency_line, reset_schema, seed_books,
+)
+
+BOOKS = 1000
+DAYS = 730
+
+
+async def _seed_orders(count: int):
+    """Đơn hàng 1-3 dòng, rải đều trong DAYS ngày gần nhất với trạng thái ngẫu nhiên"""
+    from sqlalchemy import insert
+
+    from app.core.database import SessionLocal
+    from app.models import Order, OrderDetail
+
+    rng = random.Random(6)
+    now = datetime.utcnow()
+    status_ids = [f"ST00{index}" for index in range(1, len(STATUSES) + 1)]
+    async with SessionLocal() as db:
+        for start in range(0, count, SEED_BATCH):
+            orders, details = [], []
+            for index in range(start, min(start + SEED_BATCH, count)):
+                order_id = f"O{index:09d}"
+                lines = [(book_id(rng.randrange(BOOKS)), rng.randint(1, 3)) for _ in range(rng.randint(1, 3))]
+                orders.append(dict(
+                    order_id=order_id, user_id=CUSTOMER_ID, status_id=rng.choice(status_ids),
+                    total_amount=sum(quantity * 100000 for _, quantity in lines) + 30000,
+                    shipping_address="12345 bench street", payment_method_id="PM001",
+                    created_at=now - timedelta(seconds=rng.randrange(DAYS * 86400)),
+                ))
+                details += [
+                    dict(order_id=order_id, book_id=line_book_id, quantity=quantity, unit_price=100000)
+                    for line_book_id, quantity in lines
+                ]
+            await db.execute(insert(Order), orders)
+            await db.execute(insert(OrderDetail), details)
+            await db.commit()
+            if (start // SEED_BATCH) % 20 == 19:
+                print(f"  seed {start + SEED_BATCH:,} đơn")
+
+
+async def _scan_orders(months: int):
+    """Cách cũ: gom trực tiếp trên orders (theo trạng thái, theo tháng), trả về số giây"""
+    from sqlalchemy import func, select
+
+    from app.core.database import SessionLocal
+    from app.models import Order
+
+    since = datetime.utcnow() - timedelta(days=31 * months)
+    month = func.strftime("%Y-%m", Order.created_at)
+    started = time.perf_counter()
+    async with SessionLocal() as db:
+        if db.bind.dialect.name == "mysql":
+            month = func.date_format(Order.created_at, "%Y-%m")
+        await db.execute(
+            select(Order.status_id, func.count(), func.sum(Order.total_amount)).group_by(Order.status_id)
+        )
+        await db.execute(
+            select(month, Order.status_id, func.count(), func.sum(Order.total_amount))
+            .where(Order.created_at >= since)
+            .group_by(month, Order.status_id)
+        )
+    return time.perf_counter() - started
+
+
+async def _run(args):
+    import httpx
+
+    from app.core.database import SessionLocal, close_db
+    from app.main import app
+    from app.services.sales_rollup import rebuild_sales_daily
+
+    try:
+        await reset_schema()
+        await seed_books(BOOKS)
+        started = time.perf_counter()
+        await _seed_orders(args.orders)
+        print(f"Seed {args.orders:,} đơn: {time.perf_counter() - started:.1f} s")
+
+        started = time.perf_counter()
+        async with SessionLocal() as db:
+            rows = await rebuild_sales_daily(db)
+        print(f"rebuild_sales_daily: {time.perf_counter() - started:.2f} s ({rows:,} dòng sales_daily)")
+
+        headers = auth_headers()
+        endpoints = {
+            "stats": ("/api/dashboard/stats", {}),
+            "order-status": ("/api/dashboard/order-status", {}),
+            "trends": ("/api/dashboard/monthly-trends", {"months": args.months}),
+        }
+        latencies = {name: [] for name in endpoints}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name, (path, params) in endpoints.items():
+                # Lần đầu nạp cache bảng tham chiếu
+                (await client.get(path, params=params, headers=headers)).raise_for_status()
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = await client.get(path, params=params, headers=headers)
+                    latencies[name].append(time.perf_counter() - started)
+                    response.raise_for_status()
+
+        scans = [await _scan_orders(args.months) for _ in range(args.scan_repeat)]
+    finally:
+        # Đóng pool, nếu không các luồng kết nối aiosqlite giữ tiến trình lại
+        await close_db()
+
+    print("Endpoint đọc sales_daily:")
+    for name, samples in latencies.items():
+        print("  " + latency_line(name, samples))
+    print("Quét orders trực tiếp (2 GROUP BY, ít hơn số truy vấn của bản cũ):")
+    print("  " + latency_line("scan", scans))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard trên sales_daily với nhiều đơn hàng")
+    parser.add_argument("--orders", type=int, default=1_000_000, help="Số đơn hàng seed")
+    parser.add_argument("--months", type=int, default=12, help="Số tháng cho monthly-trends")
+    parser.add_argument("--repeat", type=int, default=100, help="Số lần gọi mỗi endpoint")
+    parser.add_argument("--scan-repeat", type=int, default=3, help="Số lần quét orders để so sánh")
+    parser.add_argument("--database-url", help="DB thử nghiệm (async URL), mặc định SQLite tạm")
+    args = parser.parse_args()
+    print(f"DB: {configure(args.database_url)}")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
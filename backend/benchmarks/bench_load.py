@@ -0,0 +1,121 @@
+"""
+Đo độ trễ p50/p95/p99 khi có nhiều client cùng duyệt danh mục và đặt hàng.
+
+Mỗi client chạy vòng lặp: phần lớn là đọc danh mục (danh sách, chi tiết sách), còn lại là đặt hàng.
+Trong tiến trình còn đo độ trễ của event loop: handler chặn event loop (truy vấn DB đồng bộ)
+làm độ trễ này và p99 của mọi request cùng tăng.
+
+Chạy trong tiến trình với SQLite tạm (mặc định) hoặc DB thử nghiệm riêng (bảng sẽ bị xóa và tạo lại):
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --clients 100 --seconds 30 --checkout-ratio 0.3
+    python benchmarks/bench_load.py --database-url mysql+aiomysql://root@localhost/book_shop_bench
+
+So sánh trước/sau: chạy uvicorn của từng phiên bản trên cùng DB thử nghiệm rồi truyền --base-url
+(script seed DB qua --database-url, cùng SECRET_KEY với server):
+    python benchmarks/bench_load.py --database-url mysql+aiomysql://... --base-url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+from common import (
+    CUSTOMER_ID, auth_headers, book_id, configure, latency_line, monitor_event_loop, percentile, reset_schema,
+    seed_books,
+)
+
+
+async def _client(client, args, deadline: float, headers: dict, latencies, errors, seed: int):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        if rng.random() < args.checkout_ratio:
+            kind = "checkout"
+            items = [
+                {"book_id": book_id(index), "quantity": 1}
+                for index in rng.sample(range(args.books), rng.randint(1, 3))
+            ]
+            request = client.post("/api/orders/", headers=headers, json={
+                "shipping_address": "12345 bench street", "payment_method_id": "PM001", "items": items,
+            })
+        elif rng.random() < 0.5:
+            kind = "list"
+            request = client.get("/api/books/", params={"limit": 20})
+        else:
+            kind = "detail"
+            request = client.get(f"/api/books/{book_id(rng.randrange(args.books))}")
+
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        latencies[kind].append(time.perf_counter() - started)
+        if not ok:
+            errors[kind] += 1
+
+
+async def _run(args):
+    import httpx
+
+    from app.core.database import close_db
+
+    try:
+        await reset_schema()
+        # Đủ tồn kho để đơn không bị từ chối trong suốt thời gian chạy
+        await seed_books(args.books, stock=1_000_000)
+        headers = auth_headers(CUSTOMER_ID, "customer")
+
+        if args.base_url:
+            transport, base_url = None, args.base_url
+        else:
+            from app.main import app
+            transport, base_url = httpx.ASGITransport(app=app), "http://bench"
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lags = []
+        stop = asyncio.Event()
+        limits = httpx.Limits(max_connections=args.clients)
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60, limits=limits) as client:
+            # Làm nóng cache (bảng tham chiếu, người dùng) trước khi đo
+            await client.get("/api/books/", params={"limit": 20})
+            monitor = asyncio.create_task(monitor_event_loop(stop, lags))
+            started = time.perf_counter()
+            deadline = started + args.seconds
+            await asyncio.gather(*(
+                _client(client, args, deadline, headers, latencies, errors, seed)
+                for seed in range(args.clients)
+            ))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await monitor
+    finally:
+        # Đóng pool, nếu không các luồng kết nối aiosqlite giữ tiến trình lại
+        await close_db()
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"{args.clients} client trong {elapsed:.1f} s: {total} request = {total / elapsed:,.0f} req/s")
+    for kind in ("list", "detail", "checkout"):
+        print(latency_line(kind, latencies[kind]) + f"  lỗi={errors[kind]}")
+    print(latency_line("tất cả", [value for samples in latencies.values() for value in samples]))
+    if not args.base_url:
+        print(f"Độ trễ event loop: p99={percentile(lags, 0.99) * 1000:.2f} ms, max={max(lags, default=0) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark p99 khi duyệt danh mục và đặt hàng đồng thời")
+    parser.add_argument("--clients", type=int, default=50, help="Số client chạy đồng thời")
+    parser.add_argument("--seconds", type=float, default=20, help="Thời gian đo")
+    parser.add_argument("--books", type=int, default=5000, help="Số sách seed")
+    parser.add_argument("--checkout-ratio", type=float, default=0.2, help="Tỉ lệ request đặt hàng")
+    parser.add_argument("--database-url", help="DB thử nghiệm (async URL), mặc định SQLite tạm")
+    parser.add_argument("--base-url", help="Gửi request tới server đang chạy thay vì app trong tiến trình")
+    args = parser.parse_args()
+    print(f"DB: {configure(args.database_url)}")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
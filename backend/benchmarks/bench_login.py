@@ -0,0 +1,125 @@
+"""
+Đo "bão đăng nhập": nhiều client cùng gọi POST /api/users/login trong khi các client khác duyệt danh mục.
+bcrypt chạy trong pool luồng riêng (PasswordHasher) nên request danh mục không phải chờ băm mật khẩu;
+vượt PASSWORD_HASH_MAX_PENDING thì đăng nhập bị từ chối ngay với 503 thay vì xếp hàng.
+
+Chạy trên DB SQLite tạm (mặc định) hoặc một DB thử nghiệm riêng (bảng sẽ bị xóa và tạo lại):
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --rounds 12 --login-clients 100 --workers 4 --max-pending 32
+    python benchmarks/bench_login.py --database-url mysql+aiomysql://root@localhost/book_shop_bench
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+from common import configure, latency_line, monitor_event_loop, percentile, reset_schema, seed_books
+
+PASSWORD = "bench-secret"
+
+
+async def _seed_users(count: int):
+    """Khách hàng dùng chung một hash (băm một lần với BCRYPT_ROUNDS hiện tại)"""
+    from sqlalchemy import insert
+
+    from app.core.database import SessionLocal
+    from app.core.security import get_password_hash
+    from app.models import User
+
+    hashed = get_password_hash(PASSWORD)
+    async with SessionLocal() as db:
+        await db.execute(insert(User), [
+            dict(user_id=f"L{index:08d}", full_name=f"Khách {index}", email=f"login{index}@x.com",
+                 phone=f"09{index:08d}", password=hashed, role="customer")
+            for index in range(count)
+        ])
+        await db.commit()
+
+
+async def _login_client(client, args, deadline, latencies, statuses, seed):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post("/api/users/login", json={
+            "phone": f"09{rng.randrange(args.users):08d}", "password": PASSWORD,
+        })
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - started)
+        elif response.status_code == 503:
+            # Client tôn trọng Retry-After (rút ngắn để tải vẫn dồn dập)
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)) / 10)
+
+
+async def _catalog_client(client, deadline, latencies):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get("/api/books/", params={"limit": 20})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def _run(args):
+    import httpx
+
+    from app.core.database import close_db
+    from app.core.security import password_hasher
+    from app.main import app
+
+    try:
+        await reset_schema()
+        await seed_books(1000)
+        await _seed_users(args.users)
+
+        login_latencies, catalog_latencies, lags = [], [], []
+        statuses = Counter()
+        stop = asyncio.Event()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await client.get("/api/books/", params={"limit": 20})
+            monitor = asyncio.create_task(monitor_event_loop(stop, lags))
+            started = time.perf_counter()
+            deadline = started + args.seconds
+            await asyncio.gather(
+                *(_login_client(client, args, deadline, login_latencies, statuses, seed)
+                  for seed in range(args.login_clients)),
+                *(_catalog_client(client, deadline, catalog_latencies) for _ in range(args.catalog_clients)),
+            )
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await monitor
+    finally:
+        password_hasher.shutdown()
+        # Đóng pool, nếu không các luồng kết nối aiosqlite giữ tiến trình lại
+        await close_db()
+
+    print(f"bcrypt cost {args.rounds}, {args.workers} luồng băm, tối đa {args.max_pending} yêu cầu chờ")
+    print(f"{args.login_clients} client đăng nhập + {args.catalog_clients} client danh mục trong {elapsed:.1f} s")
+    print(f"Đăng nhập thành công {statuses[200] / elapsed:,.1f}/s, mã trả về: {dict(sorted(statuses.items()))}")
+    print(latency_line("login", login_latencies))
+    print(latency_line("catalog", catalog_latencies))
+    print(f"Độ trễ event loop: p99={percentile(lags, 0.99) * 1000:.2f} ms, max={max(lags, default=0) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bão đăng nhập với pool băm mật khẩu")
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument("--workers", type=int, default=4, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--max-pending", type=int, default=32, help="PASSWORD_HASH_MAX_PENDING")
+    parser.add_argument("--users", type=int, default=1000, help="Số tài khoản seed")
+    parser.add_argument("--login-clients", type=int, default=100, help="Số client đăng nhập đồng thời")
+    parser.add_argument("--catalog-clients", type=int, default=10, help="Số client duyệt danh mục đồng thời")
+    parser.add_argument("--seconds", type=float, default=20, help="Thời gian đo")
+    parser.add_argument("--database-url", help="DB thử nghiệm (async URL), mặc định SQLite tạm")
+    args = parser.parse_args()
+    database_url = configure(
+        args.database_url, BCRYPT_ROUNDS=args.rounds, PASSWORD_HASH_WORKERS=args.workers,
+        PASSWORD_HASH_MAX_PENDING=args.max_pending,
+    )
+    print(f"DB: {database_url}")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Đo chi phí của MetricsMiddleware trên mỗi request: gọi trực tiếp một ứng dụng ASGI tối giản
+(trả về body nhỏ, không qua HTTP client) có và không có middleware, lấy hiệu số micro giây / request.
+Đo thêm thời gian render /metrics (registry.render) khi registry đã có nhiều route và mã trạng thái.
+Không cần DB.
+
+    python benchmarks/bench_metrics.py
+    python benchmarks/bench_metrics.py --requests 500000 --routes 200
+"""
+import argparse
+import asyncio
+import time
+
+from common import configure, latency_line
+
+
+class _Route:
+    def __init__(self, path: str):
+        self.path = path
+
+
+async def _endpoint(scope, receive, send):
+    """Như router của Starlette: ghi route khớp vào scope rồi trả response"""
+    scope["route"] = scope["_bench_route"]
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"ok":true}'})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def _per_request(app, scopes, count: int) -> float:
+    """Số micro giây trung bình mỗi request (tốt nhất trong 3 lần chạy)"""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for index in range(count):
+            await app(dict(scopes[index % len(scopes)]), _receive, _send)
+        best = min(best, (time.perf_counter() - started) / count)
+    return best * 1e6
+
+
+async def _run(args):
+    from app.core.metrics import MetricsMiddleware, registry
+
+    scopes = [
+        {"type": "http", "method": method, "path": f"/api/r{index}/1", "_bench_route": _Route(f"/api/r{index}/{{id}}")}
+        for index in range(args.routes)
+        for method in ("GET", "POST")
+    ]
+    bare = await _per_request(_endpoint, scopes, args.requests)
+    measured = await _per_request(MetricsMiddleware(_endpoint), scopes, args.requests)
+    print(f"{args.requests:,} request x 3 lần, {len(scopes)} chuỗi (method, route):")
+    print(f"  không middleware: {bare:.2f} µs/request")
+    print(f"  MetricsMiddleware: {measured:.2f} µs/request (chi phí thêm {measured - bare:.2f} µs)")
+
+    renders = []
+    for _ in range(args.renders):
+        started = time.perf_counter()
+        body = registry.render()
+        renders.append(time.perf_counter() - started)
+    print(f"/metrics: {len(body.splitlines()):,} dòng, {len(body) / 1024:.0f} KiB")
+    print(latency_line("render", renders))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chi phí MetricsMiddleware mỗi request")
+    parser.add_argument("--requests", type=int, default=200_000, help="Số request mỗi lần đo")
+    parser.add_argument("--routes", type=int, default=50, help="Số route template khác nhau")
+    parser.add_argument("--renders", type=int, default=200, help="Số lần render /metrics")
+    args = parser.parse_args()
+    # Chỉ cần cấu hình để import app, không dùng DB
+    configure()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
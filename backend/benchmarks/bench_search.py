@@ -0,0 +1,124 @@
+"""
+Đo độ trễ tìm kiếm sách trên một danh mục lớn (mặc định 200.000 đầu sách tiếng Việt có dấu):
+thời gian nạp chỉ mục BM25, p50/p99 của BookSearchIndex.search và của GET /api/books/search
+(tìm trong bộ nhớ + nạp thẻ sách từ DB), so với LIKE '%...%' trên bảng books.
+
+Chạy trên DB SQLite tạm (mặc định) hoặc một DB thử nghiệm riêng (bảng sẽ bị xóa và tạo lại):
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --books 50000 --queries 5000
+    python benchmarks/bench_search.py --database-url mysql+aiomysql://root@localhost/book_shop_bench
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from common import (
+    TITLE_WORDS, configure, latency_line, make_author, make_title, reset_schema, seed_books,
+)
+
+PUBLISHERS = ["NXB Trẻ", "NXB Kim Đồng", "NXB Văn học", "NXB Tổng hợp", "Nhã Nam", "Alpha Books"]
+
+
+async def _seed(count: int, rng: random.Random):
+    titles = [make_title(rng) for _ in range(count)]
+    authors = [make_author(rng) for _ in range(count)]
+    descriptions = [
+        " ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(10, 30))) for _ in range(count)
+    ]
+    await seed_books(
+        count, title=titles.__getitem__, author=authors.__getitem__, description=descriptions.__getitem__,
+        publisher=lambda index: PUBLISHERS[index % len(PUBLISHERS)],
+        sold_quantity=lambda index: (index * 7919) % 5000,
+    )
+
+
+def _queries(count: int, rng: random.Random):
+    """Truy vấn 1-3 từ, một nửa gõ không dấu"""
+    from app.services.book_search import fold_text
+
+    queries = []
+    for _ in range(count):
+        query = " ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(1, 3)))
+        queries.append(fold_text(query) if rng.random() < 0.5 else query)
+    return queries
+
+
+async def _like(query: str):
+    """Cách tìm không có chỉ mục: LIKE '%từ%' trên tên sách và tác giả"""
+    from sqlalchemy import and_, or_, select
+
+    from app.core.database import SessionLocal
+    from app.models import Book
+
+    conditions = [
+        or_(Book.title.like(f"%{word}%"), Book.author.like(f"%{word}%")) for word in query.split()
+    ]
+    async with SessionLocal() as db:
+        await db.execute(select(Book.book_id).where(and_(*conditions)).limit(20))
+
+
+async def _run(args):
+    import httpx
+
+    from app.core.database import close_db
+    from app.main import app
+    from app.services.book_search import book_search_index
+
+    rng = random.Random(12)
+    try:
+        await reset_schema()
+        started = time.perf_counter()
+        await _seed(args.books, rng)
+        print(f"Seed {args.books:,} sách: {time.perf_counter() - started:.1f} s")
+
+        started = time.perf_counter()
+        await book_search_index.rebuild()
+        print(f"Nạp chỉ mục: {time.perf_counter() - started:.2f} s ({book_search_index.size:,} sách)")
+
+        queries = _queries(args.queries, rng)
+        index_latencies, hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            hits += bool(book_search_index.search(query, 20))
+            index_latencies.append(time.perf_counter() - started)
+
+        endpoint_latencies = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for query in queries[:args.requests]:
+                started = time.perf_counter()
+                response = await client.get("/api/books/search", params={"q": query, "limit": 20})
+                endpoint_latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        like_latencies = []
+        for query in queries[:args.like_queries]:
+            started = time.perf_counter()
+            await _like(query)
+            like_latencies.append(time.perf_counter() - started)
+    finally:
+        # Đóng pool, nếu không các luồng kết nối aiosqlite giữ tiến trình lại
+        await close_db()
+
+    print(f"{len(queries)} truy vấn, {hits} truy vấn có kết quả")
+    print(latency_line("index", index_latencies))
+    print(latency_line("endpoint", endpoint_latencies))
+    # LIKE dừng ở 20 dòng khớp đầu tiên, không xếp hạng và không gấp dấu
+    print(latency_line("LIKE", like_latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark p99 tìm kiếm sách trên danh mục lớn")
+    parser.add_argument("--books", type=int, default=200_000, help="Số đầu sách seed")
+    parser.add_argument("--queries", type=int, default=2000, help="Số truy vấn gửi vào chỉ mục")
+    parser.add_argument("--requests", type=int, default=500, help="Số truy vấn gọi qua endpoint")
+    parser.add_argument("--like-queries", type=int, default=50, help="Số truy vấn LIKE để so sánh")
+    parser.add_argument("--database-url", help="DB thử nghiệm (async URL), mặc định SQLite tạm")
+    args = parser.parse_args()
+    print(f"DB: {configure(args.database_url)}")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
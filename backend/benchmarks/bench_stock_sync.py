@@ -0,0 +1,78 @@
+"""
+Đo thông lượng đồng bộ kho: PATCH /api/admin/books/stock (một request, nhiều dòng)
+so với PATCH /api/admin/books/{book_id}/stock (mỗi sách một request).
+
+Chạy trên DB SQLite tạm (mặc định) hoặc một DB thử nghiệm riêng (bảng sẽ bị xóa và tạo lại):
+    python benchmarks/bench_stock_sync.py
+    python benchmarks/bench_stock_sync.py --items 20000 --single 500
+    python benchmarks/bench_stock_sync.py --database-url mysql+aiomysql://root@localhost/book_shop_bench
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from common import auth_headers, configure, reset_schema, seed_books, book_id as make_book_id
+
+
+async def _run(args):
+    import httpx
+
+    from app.core.database import close_db
+    from app.main import app
+
+    try:
+        await reset_schema()
+        await seed_books(args.items)
+        headers = auth_headers()
+        rng = random.Random(42)
+        book_ids = [make_book_id(index) for index in range(args.items)]
+        rng.shuffle(book_ids)
+        items = [
+            {"book_id": book_id, "stock_quantity": rng.randint(0, 500)} if index % 2
+            else {"book_id": book_id, "delta": rng.randint(-50, 50)}
+            for index, book_id in enumerate(book_ids)
+        ]
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            started = time.perf_counter()
+            response = await client.patch("/api/admin/books/stock", json={"items": items}, headers=headers)
+            bulk_seconds = time.perf_counter() - started
+            response.raise_for_status()
+            result = response.json()
+
+            sample = book_ids[:args.single]
+            started = time.perf_counter()
+            for book_id in sample:
+                response = await client.patch(
+                    f"/api/admin/books/{book_id}/stock", params={"stock_quantity": 7}, headers=headers
+                )
+                response.raise_for_status()
+            single_seconds = time.perf_counter() - started
+    finally:
+        # Đóng pool, nếu không các luồng kết nối aiosqlite giữ tiến trình lại
+        await close_db()
+
+    bulk_rate = args.items / bulk_seconds
+    print(f"Bulk:   {args.items} dòng trong {bulk_seconds:.2f} s = {bulk_rate:,.0f} dòng/s "
+          f"(updated {result['updated']}, unchanged {result['unchanged']}, rejected {len(result['rejected'])})")
+    if sample:
+        single_rate = len(sample) / single_seconds
+        print(f"Single: {len(sample)} request trong {single_seconds:.2f} s = {single_rate:,.0f} dòng/s "
+              f"(ước tính {args.items} dòng: {args.items / single_rate:.1f} s)")
+        print(f"Bulk nhanh hơn {bulk_rate / single_rate:.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đồng bộ tồn kho hàng loạt")
+    parser.add_argument("--items", type=int, default=20000, help="Số dòng đồng bộ (tối đa 50000)")
+    parser.add_argument("--single", type=int, default=500, help="Số request một sách để so sánh")
+    parser.add_argument("--database-url", help="DB thử nghiệm (async URL), mặc định SQLite tạm")
+    args = parser.parse_args()
+    print(f"DB: {configure(args.database_url)}")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Đo bộ nhớ và độ trễ của bộ gợi ý theo tiền tố (_Suggester) theo số đầu sách:
+bộ nhớ Python cấp phát cho mỗi 100.000 tên sách (tracemalloc) và p50/p99 của suggest
+với tiền tố ngắn (1-2 ký tự, khớp rất nhiều mục) và tiền tố dài.
+Bộ nhớ đo được không gồm chuỗi tên sách/tác giả gốc (đã cấp phát trước khi nạp, được dùng chung).
+Không cần DB: sinh tên sách/tác giả tiếng Việt trong bộ nhớ.
+
+    python benchmarks/bench_suggest.py
+    python benchmarks/bench_suggest.py --titles 100000 200000 500000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from common import configure, latency_line, make_author, make_title
+
+
+def _books(count: int, rng: random.Random):
+    return [
+        (f"B{index:08d}", {"title": make_title(rng), "author": make_author(rng), "sold_quantity": rng.randrange(5000)})
+        for index in range(count)
+    ]
+
+
+def _measure(count: int, args):
+    from app.services.book_search import _Suggester, fold_text
+
+    rng = random.Random(13)
+    books = _books(count, rng)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    suggester = _Suggester()
+    for book_id, fields in books:
+        suggester.add(book_id, fields, keep_sorted=False)
+    suggester.finish()
+    build_seconds = time.perf_counter() - started
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # Tiền tố lấy từ tên sách thật để luôn có kết quả
+    titles = [fold_text(fields["title"]) for _, fields in rng.sample(books, args.queries)]
+    groups = {
+        "1-2 ký tự": [title[:rng.randint(1, 2)] for title in titles],
+        "một từ": [title.split()[0] for title in titles],
+        "nhiều từ": [" ".join(title.split()[:2]) + " " + title.split()[-1][:2] for title in titles],
+    }
+    latencies = {}
+    for name, prefixes in groups.items():
+        samples = []
+        for prefix in prefixes:
+            # Bỏ qua cache kết quả để đo đúng thời gian tìm
+            suggester._cache.clear()
+            started = time.perf_counter()
+            suggester.suggest(prefix, 10)
+            samples.append(time.perf_counter() - started)
+        latencies[name] = samples
+
+    print(f"{count:,} tên sách ({len(suggester.author_books):,} tác giả): nạp {build_seconds:.2f} s, "
+          f"bộ nhớ {used / 2**20:.1f} MiB = {used / count * 100_000 / 2**20:.1f} MiB / 100.000 tên sách "
+          f"({used / count:.0f} byte/sách)")
+    for name, samples in latencies.items():
+        print("  " + latency_line(name, samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bộ nhớ và độ trễ gợi ý theo tiền tố")
+    parser.add_argument("--titles", type=int, nargs="+", default=[100_000, 200_000], help="Số tên sách")
+    parser.add_argument("--queries", type=int, default=2000, help="Số tiền tố mỗi nhóm")
+    args = parser.parse_args()
+    # Chỉ cần cấu hình để import app, không dùng DB
+    configure()
+    for count in args.titles:
+        _measure(count, args)
+
+
+if __name__ == "__main__":
+    main()
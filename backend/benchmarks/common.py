@@ -0,0 +1,140 @@
+"""
+Phần dùng chung của các benchmark: cấu hình DB trước khi import app, tạo lại bảng,
+seed dữ liệu cơ bản và tính phân vị độ trễ.
+Các hàm import app bên trong thân hàm vì Settings đọc biến môi trường lúc import.
+"""
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import random
+from typing import Dict, List, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STATUSES = ["processing", "confirmed", "shipping", "completed", "cancelled"]
+CATEGORIES = 20
+ADMIN_ID = "BENCH"
+CUSTOMER_ID = "BENCHU"
+SEED_BATCH = 5000
+
+# Từ vựng để sinh tên sách/tác giả tiếng Việt có dấu (tìm kiếm và gợi ý gấp dấu khi so khớp)
+TITLE_WORDS = (
+    "người lịch sử việt nam thế giới cuộc sống tình yêu chiến tranh hòa bình kinh tế tâm lý học "
+    "nghệ thuật khoa học tuổi trẻ thành công bí mật hành trình câu chuyện mùa hè thu đông xuân "
+    "đất nước quê hương gia đình tri thức tư duy lãnh đạo khởi nghiệp văn hóa ẩm thực du lịch "
+    "biển núi rừng sông thành phố làng phố cổ ký ức giấc mơ ánh sáng bóng tối con đường "
+    "những ngày tháng năm trăm nghìn đêm trắng mắt biếc cô gái chàng trai đứa trẻ ông bà"
+).split()
+FAMILY_NAMES = "Nguyễn Trần Lê Phạm Hoàng Huỳnh Phan Vũ Võ Đặng Bùi Đỗ Hồ Ngô Dương Lý".split()
+GIVEN_NAMES = "An Bình Chi Dũng Giang Hà Hải Hằng Hiếu Hoa Khánh Lan Linh Minh Nam Ngọc Phương Quang Thảo Tú".split()
+
+
+def make_title(rng: random.Random) -> str:
+    return " ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(2, 6))).capitalize()
+
+
+def make_author(rng: random.Random) -> str:
+    return f"{rng.choice(FAMILY_NAMES)} {rng.choice(GIVEN_NAMES)} {rng.choice(GIVEN_NAMES)}"
+
+
+def configure(database_url: str = None, **env) -> str:
+    """Đặt biến môi trường cho app (mặc định SQLite tạm), trả về URL DB đang dùng"""
+    if not database_url:
+        path = os.path.join(tempfile.mkdtemp(prefix="bookshop-bench-"), "bench.db")
+        database_url = f"sqlite+aiosqlite:///{path}"
+    os.environ["ASYNC_DATABASE_URL"] = database_url
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.pop("DATABASE_REPLICA_URL", None)
+    os.environ["MAIL_OUTBOX_ENABLED"] = "false"
+    os.environ["QUERY_STATS_ENABLED"] = "false"
+    # Không ghi log truy vấn chậm trong lúc đo (SQLite nhiều luồng ghi thì câu nào cũng "chậm")
+    os.environ.setdefault("SLOW_QUERY_MS", "60000")
+    for name, value in env.items():
+        os.environ[name] = str(value)
+    return database_url
+
+
+async def reset_schema():
+    """Xóa và tạo lại toàn bộ bảng, seed bảng tham chiếu, một admin và một khách hàng"""
+    from app.core.database import engine, SessionLocal
+    from app.models import Category, OrderStatus, PaymentMethod, User
+    from app.models.base import Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        for index, name in enumerate(STATUSES, 1):
+            db.add(OrderStatus(status_id=f"ST00{index}", status_name=name))
+        db.add(PaymentMethod(payment_method_id="PM001", method_name="COD"))
+        for index in range(CATEGORIES):
+            db.add(Category(category_id=f"C{index:02d}", category_name=f"Thể loại {index}"))
+        db.add(User(user_id=ADMIN_ID, full_name="Bench", email="bench@x.com", password="-", role="admin"))
+        db.add(User(user_id=CUSTOMER_ID, full_name="Khách bench", email="bench-user@x.com",
+                    password="-", role="customer", address="HCM"))
+        await db.commit()
+
+
+def book_id(index: int) -> str:
+    return f"B{index:08d}"
+
+
+async def seed_books(count: int, stock: int = 100, title=None, **columns):
+    """
+    Thêm count cuốn sách theo lô (executemany). title(index) cho tên sách, mặc định "Book i";
+    columns ghi đè cột khác (giá trị cố định hoặc hàm theo index).
+    """
+    from sqlalchemy import insert
+
+    from app.core.database import SessionLocal
+    from app.models import Book
+
+    def row(index: int) -> dict:
+        values = dict(
+            book_id=book_id(index), title=title(index) if title else f"Book {index}", author="Bench",
+            price=100000 + index % 100 * 1000, category_id=f"C{index % CATEGORIES:02d}",
+            stock_quantity=stock, sold_quantity=0,
+        )
+        for name, value in columns.items():
+            values[name] = value(index) if callable(value) else value
+        return values
+
+    async with SessionLocal() as db:
+        for start in range(0, count, SEED_BATCH):
+            await db.execute(insert(Book), [row(index) for index in range(start, min(start + SEED_BATCH, count))])
+        await db.commit()
+
+
+def auth_headers(user_id: str = ADMIN_ID, role: str = "admin") -> Dict[str, str]:
+    from app.core.security import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token({'user_id': user_id, 'role': role})}"}
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Phân vị theo nearest-rank (samples không cần sắp xếp sẵn)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_line(name: str, seconds: List[float]) -> str:
+    """Một dòng báo cáo p50/p95/p99/max (ms)"""
+    ms = [value * 1000 for value in seconds]
+    return (
+        f"{name:<12} n={len(ms):>7}  p50={percentile(ms, 0.50):8.2f} ms  p95={percentile(ms, 0.95):8.2f} ms  "
+        f"p99={percentile(ms, 0.99):8.2f} ms  max={max(ms, default=0):8.2f} ms"
+    )
+
+
+async def monitor_event_loop(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    """Đo thời gian asyncio.sleep(interval) bị trễ cho tới khi stop: event loop bị chặn thì con số này tăng"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - started - interval)
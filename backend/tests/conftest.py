@@ -0,0 +1,104 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# Cấu hình phải có trước khi import app (Settings đọc biến môi trường lúc import)
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bookshop-test-"), "test.db")
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_DB_PATH}"
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_PATH}"
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ["MAIL_OUTBOX_ENABLED"] = "false"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import httpx
+import pytest
+
+from app.main import app
+from app.core.database import engine, SessionLocal
+from app.core.principal_cache import principal_cache
+from app.core.query_stats import count_queries
+from app.core.security import get_password_hash, create_access_token
+from app.models.base import Base
+from app.models import Book, Category, OrderStatus, PaymentMethod, User
+from app.services.copurchase import related_books_cache
+from app.services.id_allocator import id_allocator
+from app.services.reference_cache import reference_cache
+
+STATUSES = ["processing", "confirmed", "shipping", "completed", "cancelled"]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def _seed():
+    async with SessionLocal() as db:
+        for index, name in enumerate(STATUSES, 1):
+            db.add(OrderStatus(status_id=f"ST00{index}", status_name=name))
+        db.add(PaymentMethod(payment_method_id="PM001", method_name="COD"))
+        db.add(Category(category_id="C01", category_name="Văn học"))
+        db.add(Category(category_id="C02", category_name="Khoa học"))
+        for index in range(10):
+            db.add(Book(
+                book_id=f"B{index:03d}", title=f"Sách {index}", author="Tác giả", price=100000 + index * 1000,
+                category_id="C01" if index % 2 else "C02", stock_quantity=5, sold_quantity=0,
+                created_at=datetime.utcnow() - timedelta(days=index)
+            ))
+        db.add(User(user_id="ADMIN1", full_name="Admin", email="admin@x.com",
+                    password=get_password_hash("secret1"), role="admin"))
+        db.add(User(user_id="USER1", full_name="Khách", email="user@x.com", phone="0900000001",
+                    password=get_password_hash("secret1"), role="customer", address="HCM"))
+        await db.commit()
+
+
+@pytest.fixture
+async def database():
+    """DB SQLite sạch cho từng test, các cache trong tiến trình được xóa theo"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    reference_cache.invalidate()
+    principal_cache.invalidate()
+    related_books_cache.invalidate()
+    id_allocator._blocks.clear()
+    id_allocator._locks.clear()
+    await _seed()
+    yield
+    # Kết nối trong pool gắn với event loop của test này
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(database):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def user_headers():
+    return {"Authorization": f"Bearer {create_access_token({'user_id': 'USER1', 'role': 'customer'})}"}
+
+
+@pytest.fixture
+def admin_headers():
+    return {"Authorization": f"Bearer {create_access_token({'user_id': 'ADMIN1', 'role': 'admin'})}"}
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Giới hạn số truy vấn SQL của một đoạn test (bắt N+1 khi dữ liệu tăng):
+        with query_budget(3):
+            await client.get("/api/admin/categories/")
+    Vượt giới hạn thì test lỗi kèm các câu SQL lặp nhiều nhất.
+    """
+    @contextmanager
+    def budget(max_queries: int):
+        with count_queries() as stats:
+            yield stats
+        stats.assert_budget(max_queries)
+
+    return budget
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from app.services.book_import import iter_records
+
+pytestmark = pytest.mark.anyio
+
+
+def _book(**fields):
+    return {"title": "Nhập", "author": "Tác giả", "category_id": "C01", "price": "50000", **fields}
+
+
+async def _create(client, admin_headers):
+    response = await client.post("/api/admin/books/", json=_book(), headers=admin_headers)
+    assert response.status_code == 201
+    return response.json()["book_id"]
+
+
+async def test_import_with_explicit_ids_advances_the_allocator(client, admin_headers):
+    # Worker đang giữ khối ID trong bộ nhớ trước khi nhập
+    assert await _create(client, admin_headers) == "B00000010"
+
+    body = "\n".join(json.dumps(row) for row in (
+        _book(book_id="B00000012"),
+        _book(),
+        _book(book_id="B00000100"),
+        _book(book_id="SACH-01"),
+    ))
+    response = await client.post("/api/admin/books/import", params={"format": "ndjson"},
+                                 content=body.encode(), headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["imported"] == 4
+
+    created = {await _create(client, admin_headers) for _ in range(3)}
+    assert created == {"B00000102", "B00000103", "B00000104"}
+
+    response = await client.get("/api/books/")
+    book_ids = {book["book_id"] for book in response.json()}
+    assert {"B00000012", "B00000100", "B00000101", "SACH-01"} <= book_ids
+
+
+async def test_import_rejects_unknown_format(client, admin_headers):
+    response = await client.post("/api/admin/books/import", params={"format": "xml"},
+                                 content=b"<books/>", headers=admin_headers)
+    assert response.status_code == 422
+
+    # Gọi trực tiếp (CLI, job) cũng không lặng lẽ đọc như CSV
+    with pytest.raises(ValueError):
+        iter_records(_chunks(), "xml")
+
+
+async def _chunks():
+    yield b""
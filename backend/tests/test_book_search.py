@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from sqlalchemy import update
+
+from app.core.database import SessionLocal
+from app.models import Book
+from app.services.book_search import BookSearchIndex, _Facets, book_search_index
+
+pytestmark = pytest.mark.anyio
+
+
+def _book(category_id, price=100000):
+    return {"category_id": category_id, "price": price, "author": "A", "publication_year": 2020}
+
+
+def test_facet_slots_are_reused_after_remove():
+    facets = _Facets()
+    for index in range(4):
+        facets.add(f"B{index}", _book("C01"))
+    facets.remove("B1")
+    facets.remove("B2")
+    facets.add("B9", _book("C02"))
+
+    assert len(facets.book_ids) == 4
+    assert facets.slots["B9"] == 1
+    total, book_ids, counts = facets.browse({}, 0, 10)
+    assert total == 3
+    assert book_ids == ["B0", "B9", "B3"]
+    assert counts["category"] == {"C01": 2, "C02": 1}
+    assert facets.browse({"category": ["C02"]}, 0, 10)[1] == ["B9"]
+
+
+async def test_rebuild_swaps_in_new_index_and_keeps_pending_changes(database):
+    index = BookSearchIndex(session_factory=SessionLocal, refresh_seconds=0)
+    await index.rebuild()
+    assert index.size == 10
+    assert index.search("sach 3", 1)[0][0] == "B003"
+
+    # Sách bị xóa trong lúc đang nạp lại vẫn không quay lại sau khi đổi chỉ mục
+    rebuild = asyncio.create_task(index.rebuild())
+    await asyncio.sleep(0)
+    index.remove("B003")
+    await rebuild
+    assert index.size == 9
+    assert all(book_id != "B003" for book_id, _ in index.search("sach 3", 10))
+    assert index.browse({"category": ["C01"]})[0] == 4
+
+
+@pytest.fixture
+async def live_index(database, monkeypatch):
+    """Chỉ mục dùng chung của app, nạp từ DB test; trạng thái cũ được khôi phục sau test"""
+    for name in ("_index", "_suggester", "_facets", "_built_at"):
+        monkeypatch.setattr(book_search_index, name, getattr(book_search_index, name))
+    monkeypatch.setattr(book_search_index, "_refresh_seconds", 0)
+    async with SessionLocal() as db:
+        for book_id, sold in (("B001", 90), ("B003", 50), ("B007", 20)):
+            await db.execute(update(Book).where(Book.book_id == book_id).values(sold_quantity=sold))
+        await db.commit()
+    await book_search_index.rebuild()
+    return book_search_index
+
+
+async def _suggest(client, prefix, limit=5):
+    response = await client.get("/api/books/suggest", params={"prefix": prefix, "limit": limit})
+    assert response.status_code == 200
+    return [(item["type"], item["book_id"] or item["text"]) for item in response.json()]
+
+
+async def test_suggest_ranks_by_sales_and_follows_admin_changes(client, admin_headers, live_index):
+    assert await _suggest(client, "sach", 3) == [("title", "B001"), ("title", "B003"), ("title", "B007")]
+    assert await _suggest(client, "Tác") == [("author", "Tác giả")]
+
+    response = await client.post("/api/admin/books/", headers=admin_headers, json={
+        "title": "Sách mới toanh", "author": "Nguyễn Văn Mới", "category_id": "C01", "price": "50000",
+    })
+    assert response.status_code == 201
+    new_id = response.json()["book_id"]
+    assert await _suggest(client, "sach moi") == [("title", new_id)]
+    assert await _suggest(client, "nguyen") == [("author", "Nguyễn Văn Mới")]
+
+    response = await client.put("/api/admin/books/B001", headers=admin_headers, json={"title": "Truyện cổ"})
+    assert response.status_code == 200
+    assert await _suggest(client, "truyen") == [("title", "B001")]
+    assert await _suggest(client, "sach", 2) == [("title", "B003"), ("title", "B007")]
+
+    response = await client.delete("/api/admin/books/B003", headers=admin_headers)
+    assert response.status_code == 204
+    assert ("title", "B003") not in await _suggest(client, "sach", 20)
+    assert await _suggest(client, "sach", 1) == [("title", "B007")]
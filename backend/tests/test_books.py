@@ -0,0 +1,52 @@
+import pytest
+
+from app.core.database import SessionLocal
+from app.models import BookTrending
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_book_list_without_limit_returns_whole_catalog(client):
+    response = await client.get("/api/books/", params={"filter": "Tất cả"})
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+    assert "X-Next-Cursor" not in response.headers
+
+
+async def test_book_list_follows_cursor(client):
+    seen = []
+    params = {"limit": 4}
+    while True:
+        response = await client.get("/api/books/", params=params)
+        assert response.status_code == 200
+        seen += [book["book_id"] for book in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        # Trang sau chỉ cần cursor, limit mặc định 20
+        params = {"cursor": cursor}
+    assert seen == [f"B{index:03d}" for index in range(10)]
+
+
+async def test_trending_cursor_pages_through_tied_scores(client):
+    # Nhiều sách cùng điểm (giá trị không biểu diễn đúng dạng thập phân) nằm vắt qua ranh giới trang
+    tied = 0.1 + 0.2
+    scores = {"B000": 1.7, "B001": tied, "B002": tied, "B003": tied, "B004": tied, "B005": 0.05}
+    async with SessionLocal() as db:
+        db.add_all([
+            BookTrending(book_id=book_id, hot_score=score, trend_score=score)
+            for book_id, score in scores.items()
+        ])
+        await db.commit()
+
+    seen = []
+    params = {"filter": "Sách hot", "limit": 2}
+    while True:
+        response = await client.get("/api/books/", params=params)
+        assert response.status_code == 200
+        seen += [book["book_id"] for book in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"filter": "Sách hot", "limit": 2, "cursor": cursor}
+    assert seen == ["B000", "B004", "B003", "B002", "B001", "B005"]
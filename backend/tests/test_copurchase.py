@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import SessionLocal
+from app.models import BookCopurchase
+
+pytestmark = pytest.mark.anyio
+
+
+async def _shipped_order(client, user_headers, admin_headers, book_ids):
+    response = await client.post("/api/orders/", headers=user_headers, json={
+        "shipping_address": "12345 street",
+        "payment_method_id": "PM001",
+        "items": [{"book_id": book_id, "quantity": 1} for book_id in book_ids],
+    })
+    assert response.status_code == 201
+    order_id = response.json()["order_id"]
+    for new_status in ("confirmed", "shipping"):
+        response = await client.put(f"/api/orders/admin/{order_id}/status", params={"new_status": new_status},
+                                    headers=admin_headers)
+        assert response.status_code == 200
+    return order_id
+
+
+async def test_completed_orders_count_each_pair(client, user_headers, admin_headers):
+    # Cùng tập sách, thứ tự khác nhau, hoàn thành song song
+    order_ids = [
+        await _shipped_order(client, user_headers, admin_headers, books)
+        for books in (["B003", "B001", "B002"], ["B002", "B003", "B001"], ["B001", "B002"])
+    ]
+    responses = await asyncio.gather(*(
+        client.put(f"/api/orders/admin/{order_id}/status", params={"new_status": "completed"},
+                   headers=admin_headers)
+        for order_id in order_ids
+    ))
+    assert [response.status_code for response in responses] == [200, 200, 200]
+
+    async with SessionLocal() as db:
+        pairs = {
+            (row.book_id, row.related_book_id): row.order_count
+            for row in (await db.execute(select(BookCopurchase))).scalars()
+        }
+    assert pairs == {
+        ("B001", "B002"): 3, ("B002", "B001"): 3,
+        ("B001", "B003"): 2, ("B003", "B001"): 2,
+        ("B002", "B003"): 2, ("B003", "B002"): 2,
+    }
+
+    response = await client.get("/api/books/B001/related")
+    assert [book["book_id"] for book in response.json()] == ["B002", "B003"]
+
+
+async def test_related_cache_is_invalidated_after_commit(client, user_headers, admin_headers, monkeypatch):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from app.services.copurchase import related_books_cache
+
+    order_id = await _shipped_order(client, user_headers, admin_headers, ["B004", "B005"])
+    # Nạp cache khi chưa có cặp nào
+    assert (await client.get("/api/books/B004/related")).json() == []
+
+    events = []
+    commit = AsyncSession.commit
+    invalidate = related_books_cache.invalidate
+
+    async def spy_commit(self):
+        events.append("commit")
+        await commit(self)
+
+    def spy_invalidate(book_ids=None):
+        events.append(("invalidate", sorted(book_ids)))
+        invalidate(book_ids)
+
+    monkeypatch.setattr(AsyncSession, "commit", spy_commit)
+    monkeypatch.setattr(related_books_cache, "invalidate", spy_invalidate)
+
+    response = await client.put(f"/api/orders/admin/{order_id}/status", params={"new_status": "completed"},
+                                headers=admin_headers)
+    assert response.status_code == 200
+    assert events[-2:] == ["commit", ("invalidate", ["B004", "B005"])]
+
+    response = await client.get("/api/books/B004/related")
+    assert [book["book_id"] for book in response.json()] == ["B005"]
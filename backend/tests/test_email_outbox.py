@@ -0,0 +1,160 @@
+import asyncio
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import EmailOutbox
+from app.services.email_outbox import outbox_worker
+
+pytestmark = pytest.mark.anyio
+
+RETRY_SECONDS = 30
+
+
+class _Handler:
+    """SMTP server thử: nhận mọi email, trừ người nhận trong failing (trả lỗi tạm thời 451)"""
+
+    def __init__(self):
+        self.received = []
+        self.failing = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.failing.intersection(envelope.rcpt_tos):
+            return "451 Try again later"
+        self.received.append(envelope)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    handler = _Handler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    for name, value in dict(
+        MAIL_SERVER="127.0.0.1", MAIL_PORT=controller.port, MAIL_STARTTLS=False,
+        MAIL_USERNAME=None, MAIL_FROM="shop@x.com", MAIL_OUTBOX_POLL_SECONDS=0.05,
+        MAIL_OUTBOX_RETRY_SECONDS=RETRY_SECONDS, MAIL_OUTBOX_MAX_ATTEMPTS=3,
+    ).items():
+        monkeypatch.setattr(settings, name, value)
+    yield handler
+    controller.stop()
+
+
+async def _enqueue(*recipients):
+    async with SessionLocal() as db:
+        for recipient in recipients:
+            db.add(EmailOutbox(recipient=recipient, subject=f"Đơn hàng của {recipient}",
+                               html_body="<p>Cảm ơn</p>", status='pending', attempts=0))
+        await db.commit()
+
+
+async def _emails():
+    async with SessionLocal() as db:
+        return {email.recipient: email for email in (await db.execute(select(EmailOutbox))).scalars()}
+
+
+async def test_worker_delivers_pending_emails(database, smtp):
+    await _enqueue("a@x.com", "b@x.com", "c@x.com")
+    outbox_worker.start()
+    try:
+        outbox_worker.wake()
+        for _ in range(100):
+            if len(smtp.received) == 3:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await outbox_worker.stop()
+
+    assert sorted(envelope.rcpt_tos[0] for envelope in smtp.received) == ["a@x.com", "b@x.com", "c@x.com"]
+    emails = await _emails()
+    assert {email.status for email in emails.values()} == {"sent"}
+    assert all(email.attempts == 1 and email.sent_at is not None for email in emails.values())
+
+
+async def test_failed_emails_back_off_then_fail(database, smtp):
+    smtp.failing = {"bad@x.com", "flaky@x.com"}
+    await _enqueue("ok@x.com", "bad@x.com", "flaky@x.com")
+
+    try:
+        assert await outbox_worker.drain_once() == 3
+        emails = await _emails()
+        assert emails["ok@x.com"].status == "sent"
+        for recipient in ("bad@x.com", "flaky@x.com"):
+            email = emails[recipient]
+            assert (email.status, email.attempts) == ("pending", 1)
+            assert "451" in email.last_error
+            delay = (email.next_attempt_at - datetime.utcnow()).total_seconds()
+            assert RETRY_SECONDS - 5 < delay <= RETRY_SECONDS
+
+        # Chưa tới hạn thử lại
+        assert await outbox_worker.drain_once() == 0
+
+        async def _make_due():
+            async with SessionLocal() as db:
+                await db.execute(update(EmailOutbox).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+                await db.commit()
+
+        # Lần 2: backoff gấp đôi; flaky@ gửi được ở lần 3, bad@ hết số lần thử
+        await _make_due()
+        assert await outbox_worker.drain_once() == 2
+        email = (await _emails())["bad@x.com"]
+        delay = (email.next_attempt_at - datetime.utcnow()).total_seconds()
+        assert (email.attempts, 2 * RETRY_SECONDS - 5 < delay <= 2 * RETRY_SECONDS) == (2, True)
+
+        smtp.failing = {"bad@x.com"}
+        await _make_due()
+        assert await outbox_worker.drain_once() == 2
+    finally:
+        await asyncio.to_thread(outbox_worker._sender.close)
+
+    emails = await _emails()
+    assert (emails["flaky@x.com"].status, emails["flaky@x.com"].attempts) == ("sent", 3)
+    assert (emails["bad@x.com"].status, emails["bad@x.com"].attempts) == ("failed", 3)
+    assert await outbox_worker.drain_once() == 0
+    assert [envelope.rcpt_tos[0] for envelope in smtp.received] == ["ok@x.com", "flaky@x.com"]
+
+
+async def test_claimed_emails_are_leased_while_smtp_sends(database, smtp, monkeypatch):
+    await _enqueue("slow@x.com")
+    sending = threading.Event()
+    release = threading.Event()
+    send_batch = outbox_worker._sender.send_batch
+
+    def slow_send_batch(messages):
+        sending.set()
+        release.wait(5)
+        return send_batch(messages)
+
+    monkeypatch.setattr(outbox_worker._sender, "send_batch", slow_send_batch)
+    try:
+        drain = asyncio.create_task(outbox_worker.drain_once())
+        assert await asyncio.to_thread(sending.wait, 5)
+
+        # Lần nhận đã commit trước khi gửi: worker khác thấy email đang được giữ, không gửi trùng
+        email = (await _emails())["slow@x.com"]
+        lease = (email.next_attempt_at - datetime.utcnow()).total_seconds()
+        assert (email.status, email.attempts) == ("pending", 1)
+        assert settings.MAIL_OUTBOX_LEASE_SECONDS - 5 < lease <= settings.MAIL_OUTBOX_LEASE_SECONDS
+        assert await outbox_worker.drain_once() == 0
+
+        release.set()
+        assert await drain == 1
+    finally:
+        release.set()
+        await asyncio.to_thread(outbox_worker._sender.close)
+
+    email = (await _emails())["slow@x.com"]
+    assert (email.status, email.attempts) == ("sent", 1)
+    assert [envelope.rcpt_tos[0] for envelope in smtp.received] == ["slow@x.com"]
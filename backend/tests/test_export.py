@@ -0,0 +1,15 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_export_rejects_unknown_format(client, admin_headers):
+    response = await client.get("/api/admin/export/books", params={"format": "xml"}, headers=admin_headers)
+    assert response.status_code == 422
+
+
+async def test_export_books_ndjson(client, admin_headers):
+    response = await client.get("/api/admin/export/books", params={"format": "ndjson"}, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(response.text.splitlines()) == 10
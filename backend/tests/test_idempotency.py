@@ -0,0 +1,117 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+
+from app.core.database import SessionLocal
+from app.core.query_stats import count_queries
+from app.models import Book, IdempotencyKey, Order
+from app.routers import order as order_router
+from app.schemas.order import OrderCreate
+from app.services import idempotency
+from app.services import order as order_service
+
+pytestmark = pytest.mark.anyio
+
+ORDER = {
+    "shipping_address": "12345 street",
+    "payment_method_id": "PM001",
+    "items": [{"book_id": "B001", "quantity": 1}],
+}
+
+
+def _headers(user_headers, key):
+    return {**user_headers, "Idempotency-Key": key}
+
+
+async def _state():
+    """(số đơn, tồn kho B001)"""
+    async with SessionLocal() as db:
+        orders = (await db.execute(select(func.count()).select_from(Order))).scalar()
+        stock = (await db.execute(select(Book.stock_quantity).where(Book.book_id == "B001"))).scalar()
+        return orders, stock
+
+
+async def test_replay_returns_stored_body_without_touching_orders(client, user_headers):
+    headers = _headers(user_headers, "replay-1")
+    first = await client.post("/api/orders/", json=ORDER, headers=headers)
+    assert first.status_code == 201
+
+    with count_queries() as stats:
+        second = await client.post("/api/orders/", json=ORDER, headers=headers)
+    assert second.status_code == 201
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+    # Lần gửi lại chỉ đọc idempotency_keys: không khóa sách, không tạo đơn
+    assert not [shape for shape in stats.shapes if "books" in shape or "orders" in shape]
+    assert await _state() == (1, 4)
+
+
+async def test_same_key_with_different_body_is_rejected(client, user_headers):
+    headers = _headers(user_headers, "replay-2")
+    assert (await client.post("/api/orders/", json=ORDER, headers=headers)).status_code == 201
+
+    other = {**ORDER, "items": [{"book_id": "B001", "quantity": 2}]}
+    response = await client.post("/api/orders/", json=other, headers=headers)
+    assert response.status_code == 422
+    assert await _state() == (1, 4)
+
+
+async def test_concurrent_duplicate_waits_then_replays(client, user_headers, monkeypatch):
+    create_order = order_service.create_order
+
+    async def slow_create_order(*args, **kwargs):
+        # Giữ khóa đủ lâu để request thứ hai thấy 'pending' và phải chờ
+        await asyncio.sleep(0.3)
+        return await create_order(*args, **kwargs)
+
+    monkeypatch.setattr(order_router.order_service, "create_order", slow_create_order)
+
+    headers = _headers(user_headers, "replay-3")
+    first, second = await asyncio.gather(
+        client.post("/api/orders/", json=ORDER, headers=headers),
+        client.post("/api/orders/", json=ORDER, headers=headers),
+    )
+    assert first.status_code == second.status_code == 201
+    assert first.json() == second.json()
+    assert sorted(r.headers.get("Idempotent-Replayed", "") for r in (first, second)) == ["", "true"]
+    assert await _state() == (1, 4)
+
+
+async def test_stale_lock_takeover_blocks_slow_original(client, user_headers):
+    key = "replay-4"
+    payload_hash = idempotency.request_hash(
+        OrderCreate(**ORDER).model_dump(mode="json", exclude={"user_id"})
+    )
+
+    # Request đầu giữ khóa rồi treo quá IDEMPOTENCY_LOCK_SECONDS
+    claim = await idempotency.begin("USER1", key, payload_hash)
+    stale_at = claim.locked_at - timedelta(seconds=120)
+    async with SessionLocal() as db:
+        await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == "USER1", IdempotencyKey.idempotency_key == key)
+            .values(locked_at=stale_at)
+        )
+        await db.commit()
+    slow_claim = idempotency.Claim("USER1", key, stale_at)
+
+    # Retry chiếm lại khóa và tạo đơn
+    response = await client.post("/api/orders/", json=ORDER, headers=_headers(user_headers, key))
+    assert response.status_code == 201
+    assert "Idempotent-Replayed" not in response.headers
+
+    # Request đầu chạy tiếp: không được tạo đơn thứ hai
+    async with SessionLocal() as db:
+        with pytest.raises(HTTPException) as error:
+            await order_service.create_order(db, OrderCreate(**ORDER, user_id="USER1"), slow_claim)
+    assert error.value.status_code == 409
+    assert await _state() == (1, 4)
+
+    # Request đầu dọn khóa khi thất bại cũng không xóa khóa của retry
+    await idempotency.release(slow_claim)
+    replay = await client.post("/api/orders/", json=ORDER, headers=_headers(user_headers, key))
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == response.json()
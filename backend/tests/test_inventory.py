@@ -0,0 +1,23 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_bulk_stock_sync_returns_sorted_diff(client, admin_headers):
+    response = await client.patch("/api/admin/books/stock", headers=admin_headers, json={"items": [
+        {"book_id": "B007", "delta": 2},
+        {"book_id": "ZZZ", "stock_quantity": 1},
+        {"book_id": "B002", "stock_quantity": 9},
+        {"book_id": "B007", "delta": -1},
+        {"book_id": "B003", "delta": -6},
+        {"book_id": "B001", "stock_quantity": 5},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["changes"] == [
+        {"book_id": "B002", "old": 5, "new": 9},
+        {"book_id": "B007", "old": 5, "new": 6},
+    ]
+    assert body["updated"] == 2 and body["unchanged"] == 2
+    assert body["not_found"] == ["ZZZ"]
+    assert [item["book_id"] for item in body["rejected"]] == ["B003"]
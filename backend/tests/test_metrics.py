@@ -0,0 +1,40 @@
+import pytest
+
+from app.core.metrics import http_request_duration_seconds, http_requests_total
+
+pytestmark = pytest.mark.anyio
+
+
+def _count(method, route, status):
+    return http_requests_total.value(method, route, status)
+
+
+async def test_metrics_label_requests_by_route_template(client):
+    # Registry dùng chung cả tiến trình: so sánh số đếm trước và sau
+    before = {
+        "ok": _count("GET", "/api/books/{book_id}", "200"),
+        "missing": _count("GET", "/api/books/{book_id}", "404"),
+        "related": _count("GET", "/api/books/{book_id}/related", "200"),
+        "unmatched": _count("GET", "unmatched", "404"),
+    }
+
+    for path in ("/api/books/B001", "/api/books/B002", "/api/books/B003/related"):
+        assert (await client.get(path)).status_code == 200
+    assert (await client.get("/api/books/KHONGCO")).status_code == 404
+    assert (await client.get("/khong-co-route/123")).status_code == 404
+
+    assert _count("GET", "/api/books/{book_id}", "200") - before["ok"] == 2
+    assert _count("GET", "/api/books/{book_id}", "404") - before["missing"] == 1
+    assert _count("GET", "/api/books/{book_id}/related", "200") - before["related"] == 1
+    assert _count("GET", "unmatched", "404") - before["unmatched"] == 1
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/books/{book_id}",status="200"}' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/books/{book_id}/related"}' in body
+    # Không có nhãn theo đường dẫn thật (mỗi book_id một chuỗi số liệu)
+    for raw_path in ("/api/books/B001", "/api/books/B002", "/api/books/KHONGCO", "/khong-co-route"):
+        assert f'route="{raw_path}' not in body
+    assert ("GET", "/api/books/B001") not in http_request_duration_seconds._values
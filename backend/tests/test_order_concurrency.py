@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import SessionLocal
+from app.models import Book
+
+pytestmark = pytest.mark.anyio
+
+
+def _order(*items):
+    return {
+        "shipping_address": "12345 street",
+        "payment_method_id": "PM001",
+        "items": [{"book_id": book_id, "quantity": quantity} for book_id, quantity in items],
+    }
+
+
+async def _stock(book_id: str):
+    async with SessionLocal() as db:
+        book = (await db.execute(select(Book).where(Book.book_id == book_id))).scalar_one()
+        return book.stock_quantity, book.sold_quantity
+
+
+async def test_parallel_checkouts_never_oversell(client, user_headers):
+    # B001 còn 5 cuốn, 12 đơn mua cùng lúc (một số đơn mua kèm sách khác, thứ tự khác nhau)
+    orders = [
+        _order(("B001", 1)) if i % 3 == 0
+        else _order(("B001", 1), ("B002", 1)) if i % 3 == 1
+        else _order(("B003", 1), ("B001", 1))
+        for i in range(12)
+    ]
+    responses = await asyncio.gather(*(
+        client.post("/api/orders/", json=order, headers=user_headers) for order in orders
+    ))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses.count(201) == 5
+    assert set(statuses) <= {201, 400}
+    assert await _stock("B001") == (0, 5)
+
+
+async def test_cancel_restores_stock_once(client, user_headers):
+    response = await client.post("/api/orders/", json=_order(("B004", 2), ("B005", 1)), headers=user_headers)
+    assert response.status_code == 201
+    order_id = response.json()["order_id"]
+    assert await _stock("B004") == (3, 2)
+
+    # Hai lần hủy chạy song song với các đơn mới mua cùng sách
+    responses = await asyncio.gather(
+        client.put(f"/api/orders/{order_id}/cancel", headers=user_headers),
+        client.put(f"/api/orders/{order_id}/cancel", headers=user_headers),
+        *(client.post("/api/orders/", json=_order(("B004", 1)), headers=user_headers) for _ in range(3)),
+    )
+
+    cancels = sorted(response.status_code for response in responses[:2])
+    assert cancels[0] == 200 and cancels[1] in (400, 409)
+    checkouts = [response.status_code for response in responses[2:]]
+    assert checkouts == [201, 201, 201]
+    # 5 ban đầu - 3 đơn mới; đơn bị hủy đã trả đúng 2 cuốn một lần
+    assert await _stock("B004") == (2, 3)
+    assert await _stock("B005") == (5, 0)
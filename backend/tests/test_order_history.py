@@ -0,0 +1,40 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def _place_orders(client, headers, count):
+    order_ids = []
+    for index in range(count):
+        response = await client.post("/api/orders/", headers=headers, json={
+            "shipping_address": "12345 street",
+            "payment_method_id": "PM001",
+            "items": [{"book_id": f"B00{index}", "quantity": 1}],
+        })
+        assert response.status_code == 201
+        order_ids.append(response.json()["order_id"])
+    # Mới nhất trước
+    return order_ids[::-1]
+
+
+async def test_my_orders_skip_matches_cursor_pages(client, user_headers):
+    expected = await _place_orders(client, user_headers, 5)
+
+    by_skip = []
+    for skip in (0, 2, 4):
+        response = await client.get("/api/orders/my-orders", headers=user_headers,
+                                    params={"skip": skip, "limit": 2, "view": "compact"})
+        assert response.status_code == 200
+        assert response.json()["total"] == 5
+        by_skip += [order["order_id"] for order in response.json()["orders"]]
+
+    by_cursor = []
+    params = {"limit": 2, "view": "compact"}
+    while True:
+        page = (await client.get("/api/orders/my-orders", headers=user_headers, params=params)).json()
+        by_cursor += [order["order_id"] for order in page["orders"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert by_skip == by_cursor == expected
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import select
+
+from app.core import security
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.security import password_hasher
+from app.models import User
+
+pytestmark = pytest.mark.anyio
+
+LOGIN = {"phone": "0900000001", "password": "secret1"}
+
+
+async def _stored_hash():
+    async with SessionLocal() as db:
+        return (await db.execute(select(User.password).where(User.user_id == "USER1"))).scalar_one()
+
+
+async def test_login_storm_over_pending_cap_gets_503(client, monkeypatch):
+    release = threading.Event()
+    verify_password = security.verify_password
+
+    def slow_verify(plain_password, hashed_password):
+        release.wait(5)
+        return verify_password(plain_password, hashed_password)
+
+    monkeypatch.setattr(security, "verify_password", slow_verify)
+    monkeypatch.setattr(password_hasher, "_max_pending", 2)
+
+    logins = [asyncio.create_task(client.post("/api/users/login", json=LOGIN)) for _ in range(6)]
+    try:
+        # Hai yêu cầu giữ chỗ trong pool, các yêu cầu còn lại bị từ chối ngay, không xếp hàng
+        rejected = []
+        for _ in range(100):
+            rejected = [task for task in logins if task.done()]
+            if len(rejected) == 4:
+                break
+            await asyncio.sleep(0.02)
+        assert len(rejected) == 4
+        for task in rejected:
+            response = task.result()
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+    finally:
+        release.set()
+
+    responses = await asyncio.gather(*logins)
+    assert sorted(response.status_code for response in responses) == [200, 200, 503, 503, 503, 503]
+    # Hết tải thì đăng nhập bình thường
+    assert (await client.post("/api/users/login", json=LOGIN)).status_code == 200
+
+
+async def test_login_rehashes_password_with_new_cost(client, monkeypatch):
+    assert (await _stored_hash()).startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", settings.BCRYPT_ROUNDS + 1)
+    response = await client.post("/api/users/login", json=LOGIN)
+    assert response.status_code == 200
+    rehashed = await _stored_hash()
+    assert rehashed.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+    # Hash mới vẫn đăng nhập được và không bị băm lại lần nữa
+    assert (await client.post("/api/users/login", json=LOGIN)).status_code == 200
+    assert await _stored_hash() == rehashed
+
+    wrong = await client.post("/api/users/login", json={**LOGIN, "password": "wrong-password"})
+    assert wrong.status_code == 401
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import pool_metrics as pool_metrics_module
+from app.core.config import settings
+from app.core.pool_metrics import InstrumentedPool, engine_options, instrument
+
+pytestmark = pytest.mark.anyio
+
+POOL_SIZE = 2
+HOLD_SECONDS = 0.1
+
+
+@pytest.fixture
+async def pool_engine(tmp_path, monkeypatch):
+    """Engine riêng với pool nhỏ (2 kết nối, không overflow, chờ tối đa 0,5 giây)"""
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", POOL_SIZE)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(settings, "DB_POOL_TIMEOUT", 0.5)
+    # Chỉ giữ số liệu của pool trong test (không lẫn primary/replica)
+    monkeypatch.setattr(pool_metrics_module, "pool_metrics", {})
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", **engine_options("sqlite"))
+    instrument(engine, "test")
+    yield engine
+    await engine.dispose()
+
+
+async def _query(engine):
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        await asyncio.sleep(HOLD_SECONDS)
+
+
+async def test_checkout_wait_histogram_under_load(pool_engine):
+    metrics = pool_metrics_module.pool_metrics["test"]
+    assert isinstance(metrics.pool, InstrumentedPool)
+
+    # 6 truy vấn tranh 2 kết nối: 2 lấy ngay, 4 phải chờ một hoặc hai lượt giữ kết nối
+    await asyncio.gather(*(_query(pool_engine) for _ in range(6)))
+
+    stats = metrics.stats()
+    assert stats["checkouts"] == 6
+    assert stats["timeouts"] == 0
+    assert stats["connects"] == POOL_SIZE
+    histogram = stats["checkout_wait_histogram"]
+    assert histogram["+Inf"] == 6
+    # 4 lần chờ ít nhất một lượt giữ kết nối (0,1 giây)
+    assert histogram["+Inf"] - histogram["0.05"] >= 4
+    assert histogram["0.5"] == 6
+    assert stats["checkout_wait_max_ms"] >= HOLD_SECONDS * 1000
+    assert stats["checked_out"] == 0 and stats["checked_in"] == POOL_SIZE
+
+
+async def test_pool_exhaustion_counts_timeouts(pool_engine):
+    metrics = pool_metrics_module.pool_metrics["test"]
+    async with pool_engine.connect(), pool_engine.connect():
+        assert metrics.stats()["utilization"] == 1.0
+        with pytest.raises(PoolTimeoutError):
+            async with pool_engine.connect():
+                pass
+    assert metrics.timeouts == 1
+    # Checkout hết thời gian chờ không được tính vào histogram
+    assert metrics.wait_count == POOL_SIZE
+
+    lines = pool_metrics_module._collect()
+    assert 'db_pool_checkout_timeouts_total{pool="test"} 1' in lines
+    assert f'db_pool_checkout_wait_seconds_count{{pool="test"}} {POOL_SIZE}' in lines
+
+
+async def test_metrics_survive_engine_dispose(pool_engine):
+    metrics = pool_metrics_module.pool_metrics["test"]
+    await _query(pool_engine)
+    old_pool = metrics.pool
+
+    # dispose() thay pool bằng pool.recreate(): số liệu đã đếm được giữ, gauge đọc từ pool mới
+    await pool_engine.dispose()
+    assert pool_engine.sync_engine.pool is not old_pool
+    assert metrics.pool is pool_engine.sync_engine.pool
+    assert pool_engine.sync_engine.pool.metrics is metrics
+    assert (metrics.wait_count, metrics.connects) == (1, 1)
+
+    await _query(pool_engine)
+    assert (metrics.wait_count, metrics.connects) == (2, 2)
+    assert metrics.stats()["checked_in"] == 1
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from app.core.principal_cache import principal_cache
+
+pytestmark = pytest.mark.anyio
+
+
+def _counters():
+    return principal_cache.hits, principal_cache.misses
+
+
+async def test_cache_hit_miss_and_health_counters(client, user_headers):
+    hits, misses = _counters()
+    assert (await client.get("/api/users/me", headers=user_headers)).status_code == 200
+    assert _counters() == (hits, misses + 1)
+    assert (await client.get("/api/users/me", headers=user_headers)).status_code == 200
+    assert _counters() == (hits + 1, misses + 1)
+
+    response = await client.get("/health/principal-cache")
+    assert response.status_code == 200
+    stats = response.json()
+    assert (stats["hits"], stats["misses"]) == (hits + 1, misses + 1)
+    assert stats["size"] == 1
+    assert stats["hit_rate"] == round((hits + 1) / (hits + misses + 2), 4)
+    assert stats == principal_cache.stats()
+
+
+async def test_profile_update_invalidates_principal(client, user_headers):
+    assert (await client.get("/api/users/me", headers=user_headers)).status_code == 200
+    assert principal_cache.get("USER1").full_name == "Khách"
+
+    response = await client.put("/api/users/me", headers=user_headers, json={"full_name": "Tên mới"})
+    assert response.status_code == 200
+    assert principal_cache.get("USER1") is None
+
+    misses = principal_cache.misses
+    assert (await client.get("/api/users/me", headers=user_headers)).json()["full_name"] == "Tên mới"
+    assert principal_cache.misses == misses + 1
+    assert principal_cache.get("USER1").full_name == "Tên mới"
+
+
+async def test_admin_update_and_delete_invalidate_principal(client, user_headers, admin_headers):
+    # Principal của USER1 (customer) đang nằm trong cache
+    assert (await client.get("/api/admin/users/", headers=user_headers)).status_code == 403
+
+    response = await client.put("/api/admin/users/USER1", headers=admin_headers, json={"role": "admin"})
+    assert response.status_code == 200
+    # Quyền mới có hiệu lực ngay, không chờ hết TTL
+    assert (await client.get("/api/admin/users/", headers=user_headers)).status_code == 200
+
+    assert (await client.delete("/api/admin/users/USER1", headers=admin_headers)).status_code == 204
+    assert principal_cache.get("USER1") is None
+    assert (await client.get("/api/users/me", headers=user_headers)).status_code == 401
+
+
+async def test_admin_principals_use_shorter_ttl(client, user_headers, admin_headers):
+    for headers in (user_headers, admin_headers):
+        assert (await client.get("/api/users/me", headers=headers)).status_code == 200
+    now = time.monotonic()
+    ttl = {user_id: expires_at - now for user_id, (_, expires_at) in principal_cache._entries.items()}
+    stats = principal_cache.stats()
+    assert stats["admin_ttl_seconds"] < stats["ttl_seconds"]
+    assert ttl["ADMIN1"] <= stats["admin_ttl_seconds"]
+    assert stats["admin_ttl_seconds"] < ttl["USER1"] <= stats["ttl_seconds"]
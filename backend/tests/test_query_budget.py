@@ -0,0 +1,37 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_categories_list_budget(client, admin_headers, query_budget):
+    # Lần đầu nạp cache người dùng / bảng tham chiếu
+    await client.get("/api/admin/categories/", headers=admin_headers)
+    with query_budget(2):
+        response = await client.get("/api/admin/categories/", headers=admin_headers)
+    assert response.status_code == 200
+
+
+async def test_rating_summaries_budget(client, query_budget):
+    with query_budget(1):
+        response = await client.get("/api/reviews/summary", params={"book_ids": ",".join(f"B00{i}" for i in range(10))})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("books", [1, 6])
+async def test_cancel_order_budget_does_not_grow_with_items(client, user_headers, query_budget, books):
+    response = await client.post("/api/orders/", headers=user_headers, json={
+        "shipping_address": "12345 street",
+        "payment_method_id": "PM001",
+        "items": [{"book_id": f"B00{index}", "quantity": 1} for index in range(books)],
+    })
+    order_id = response.json()["order_id"]
+    with query_budget(11):
+        response = await client.put(f"/api/orders/{order_id}/cancel", headers=user_headers)
+    assert response.status_code == 200
+
+
+async def test_delete_book_budget(client, admin_headers, query_budget):
+    await client.get("/api/admin/categories/", headers=admin_headers)
+    with query_budget(6):
+        response = await client.delete("/api/admin/books/B009", headers=admin_headers)
+    assert response.status_code == 204
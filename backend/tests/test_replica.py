@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.main
+from app.core import replica
+from app.core.replica import ReplicaRouter
+from app.models import Book, Category
+from app.models.base import Base
+
+pytestmark = pytest.mark.anyio
+
+STICKY_SECONDS = 0.3
+MAX_LAG_SECONDS = 5
+
+
+@pytest.fixture
+async def router(database, tmp_path, monkeypatch):
+    """Replica là một file SQLite thứ hai chỉ có một cuốn sách, để biết truy vấn đọc đi vào đâu"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Category).values(category_id="C01", category_name="Thể loại"))
+        await conn.execute(insert(Book).values(
+            book_id="B000", title="Bản replica", author="Tác giả", category_id="C01",
+            price=1000, stock_quantity=1, sold_quantity=0
+        ))
+    test_router = ReplicaRouter(engine, sticky_seconds=STICKY_SECONDS, max_lag_seconds=MAX_LAG_SECONDS)
+
+    monkeypatch.setattr(replica, "replica_router", test_router)
+    monkeypatch.setattr(app.main, "replica_router", test_router)
+    yield test_router
+    await engine.dispose()
+
+
+async def _titles(client, headers=None):
+    response = await client.get("/api/books/", headers=headers)
+    assert response.status_code == 200
+    return [book["title"] for book in response.json()]
+
+
+async def test_reads_go_to_the_replica(client, router, user_headers):
+    assert await _titles(client) == ["Bản replica"]
+    assert await _titles(client, user_headers) == ["Bản replica"]
+    assert (router.replica_reads, router.primary_reads) == (2, 0)
+
+
+async def test_write_makes_client_sticky_to_primary(client, router, user_headers):
+    response = await client.post("/api/orders/", headers=user_headers, json={
+        "shipping_address": "12345 street",
+        "payment_method_id": "PM001",
+        "items": [{"book_id": "B001", "quantity": 1}],
+    })
+    assert response.status_code == 201
+
+    # Client vừa ghi đọc từ primary, client khác vẫn đọc replica
+    assert len(await _titles(client, user_headers)) == 10
+    assert await _titles(client) == ["Bản replica"]
+
+    await asyncio.sleep(STICKY_SECONDS + 0.1)
+    assert await _titles(client, user_headers) == ["Bản replica"]
+
+
+async def test_lagging_replica_falls_back_to_primary(client, router, monkeypatch):
+    lag = [MAX_LAG_SECONDS + 1.0]
+
+    async def measure_lag():
+        return lag[0]
+
+    monkeypatch.setattr(router, "_measure_lag", measure_lag)
+    await router.check()
+    assert not router.healthy
+    assert len(await _titles(client)) == 10
+
+    # Replica bắt kịp: đọc lại từ replica
+    lag[0] = 1.0
+    await router.check()
+    assert router.healthy
+    assert await _titles(client) == ["Bản replica"]
+
+
+async def test_export_follows_read_your_writes(client, router, admin_headers):
+    async def exported():
+        response = await client.get("/api/admin/export/books", params={"format": "ndjson"}, headers=admin_headers)
+        assert response.status_code == 200
+        return len(response.text.splitlines())
+
+    assert await exported() == 1
+
+    response = await client.post("/api/admin/books/", headers=admin_headers, json={
+        "title": "Mới", "author": "Tác giả", "category_id": "C01", "price": "50000",
+    })
+    assert response.status_code == 201
+    # Admin vừa ghi: bản xuất đọc primary nên có cả sách vừa tạo
+    assert await exported() == 11
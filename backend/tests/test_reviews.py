@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app.core.database import SessionLocal
+from app.models import BookRatingStats, Review
+
+pytestmark = pytest.mark.anyio
+
+BOOK_IDS = ["B001", "B002", "B003"]
+
+
+async def _buy(client, headers, book_ids):
+    response = await client.post("/api/orders/", headers=headers, json={
+        "shipping_address": "12345 street",
+        "payment_method_id": "PM001",
+        "items": [{"book_id": book_id, "quantity": 1} for book_id in book_ids],
+    })
+    assert response.status_code == 201
+
+
+async def _summaries(client):
+    response = await client.get("/api/reviews/summary", params={"book_ids": ",".join(BOOK_IDS)})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def _expected():
+    """Thống kê tính thẳng từ bảng reviews (như rebuild_book_rating_stats)"""
+    async with SessionLocal() as db:
+        ratings = (await db.execute(select(Review.book_id, Review.rating))).all()
+    expected = {}
+    for book_id in BOOK_IDS:
+        stars = [rating for review_book_id, rating in ratings if review_book_id == book_id]
+        expected[book_id] = {
+            "average_rating": round(sum(stars) / len(stars), 1) if stars else 0.0,
+            "total_reviews": len(stars),
+            "rating_distribution": {f"{star}_star": stars.count(star) for star in range(1, 6)},
+        }
+    return expected
+
+
+async def test_review_changes_keep_rating_stats_in_sync(client, user_headers, admin_headers):
+    await _buy(client, user_headers, ["B001", "B002"])
+    await _buy(client, admin_headers, ["B001"])
+
+    review_ids = {}
+    for headers, book_id, rating in (
+        (user_headers, "B001", 5), (admin_headers, "B001", 3), (user_headers, "B002", 4),
+    ):
+        response = await client.post("/api/reviews/", headers=headers,
+                                     json={"book_id": book_id, "rating": rating, "comment": "Hay"})
+        assert response.status_code == 201
+        review_ids[(headers["Authorization"], book_id)] = response.json()["review_id"]
+    summaries = await _summaries(client)
+    assert summaries == await _expected()
+    assert summaries["B001"]["average_rating"] == 4.0
+    assert summaries["B003"]["total_reviews"] == 0
+
+    user_b001 = review_ids[(user_headers["Authorization"], "B001")]
+    response = await client.put(f"/api/reviews/{user_b001}", headers=user_headers, json={"rating": 1})
+    assert response.status_code == 200
+    # Chỉ sửa nội dung: thống kê giữ nguyên
+    response = await client.put(f"/api/reviews/{user_b001}", headers=user_headers, json={"comment": "Đọc lại"})
+    assert response.status_code == 200
+    summaries = await _summaries(client)
+    assert summaries == await _expected()
+    assert summaries["B001"]["rating_distribution"] == {
+        "1_star": 1, "2_star": 0, "3_star": 1, "4_star": 0, "5_star": 0,
+    }
+
+    user_b002 = review_ids[(user_headers["Authorization"], "B002")]
+    assert (await client.delete(f"/api/reviews/{user_b002}", headers=user_headers)).status_code == 204
+    assert (await client.delete(f"/api/reviews/admin/{user_b001}", headers=admin_headers)).status_code == 204
+    summaries = await _summaries(client)
+    assert summaries == await _expected()
+    assert summaries["B001"]["total_reviews"] == 1
+    assert summaries["B002"]["total_reviews"] == 0
+
+
+async def test_missing_stats_row_is_seeded_from_reviews(client, user_headers, admin_headers):
+    # Review có từ trước khi có bảng tổng hợp: chưa có dòng book_rating_stats
+    async with SessionLocal() as db:
+        await db.execute(insert(Review).values(book_id="B003", user_id="ADMIN1", rating=2, comment="Cũ"))
+        await db.commit()
+        legacy_id = (await db.execute(select(Review.review_id))).scalar_one()
+        assert (await db.execute(select(BookRatingStats))).first() is None
+
+    await _buy(client, user_headers, ["B003"])
+    response = await client.post("/api/reviews/", headers=user_headers,
+                                 json={"book_id": "B003", "rating": 4, "comment": "Mới"})
+    assert response.status_code == 201
+    summaries = await _summaries(client)
+    assert summaries == await _expected()
+    assert summaries["B003"]["total_reviews"] == 2
+
+    # Xóa review cũ khi dòng thống kê lại thiếu: không ra số âm
+    async with SessionLocal() as db:
+        await db.execute(delete(BookRatingStats))
+        await db.commit()
+    assert (await client.delete(f"/api/reviews/admin/{legacy_id}", headers=admin_headers)).status_code == 204
+    summaries = await _summaries(client)
+    assert summaries == await _expected()
+    assert summaries["B003"] == {
+        "average_rating": 4.0, "total_reviews": 1,
+        "rating_distribution": {"1_star": 0, "2_star": 0, "3_star": 0, "4_star": 1, "5_star": 0},
+    }
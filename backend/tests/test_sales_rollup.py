@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.core.database import SessionLocal
+from app.models import SalesDaily, SalesDailyDelta
+from app.services.sales_rollup import sales_rollup_worker
+
+pytestmark = pytest.mark.anyio
+
+
+async def _count(model):
+    async with SessionLocal() as db:
+        return (await db.execute(select(func.count()).select_from(model))).scalar()
+
+
+async def test_deltas_visible_before_and_after_fold(client, user_headers, admin_headers):
+    order = {
+        "shipping_address": "12345 street",
+        "payment_method_id": "PM001",
+        "items": [{"book_id": "B001", "quantity": 1}],
+    }
+    created = [(await client.post("/api/orders/", json=order, headers=user_headers)).json() for _ in range(3)]
+    response = await client.put(f"/api/orders/{created[0]['order_id']}/cancel", headers=user_headers)
+    assert response.status_code == 200
+
+    # Checkout chỉ ghi delta, chưa đụng tới dòng tổng hợp
+    assert await _count(SalesDaily) == 0
+    assert await _count(SalesDailyDelta) == 5
+
+    before = (await client.get("/api/dashboard/order-status", headers=admin_headers)).json()
+    assert before["processing"]["count"] == 2
+    assert before["cancelled"]["count"] == 1
+
+    assert await sales_rollup_worker.fold_all() == 5
+    assert await _count(SalesDailyDelta) == 0
+
+    after = (await client.get("/api/dashboard/order-status", headers=admin_headers)).json()
+    assert after == before
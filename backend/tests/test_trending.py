@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import BookTrending, TrendingCancellation
+from app.services.trending import refresh_trending
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def no_lag(monkeypatch):
+    monkeypatch.setattr(settings, "TRENDING_LAG_SECONDS", 0)
+
+
+async def _order(client, headers, *items):
+    response = await client.post("/api/orders/", headers=headers, json={
+        "shipping_address": "12345 street",
+        "payment_method_id": "PM001",
+        "items": [{"book_id": book_id, "quantity": quantity} for book_id, quantity in items],
+    })
+    assert response.status_code == 201
+    return response.json()["order_id"]
+
+
+async def _cancel(client, headers, order_id):
+    response = await client.put(f"/api/orders/{order_id}/cancel", headers=headers)
+    assert response.status_code == 200
+
+
+async def _refresh():
+    async with SessionLocal() as db:
+        return await refresh_trending(db)
+
+
+async def _scores():
+    async with SessionLocal() as db:
+        rows = (await db.execute(select(BookTrending))).scalars().all()
+        pending = (await db.execute(select(func.count()).select_from(TrendingCancellation))).scalar()
+    return {row.book_id: round(row.hot_score, 3) for row in rows}, pending
+
+
+async def _raw(book_id):
+    async with SessionLocal() as db:
+        row = (await db.execute(select(BookTrending).where(BookTrending.book_id == book_id))).scalar_one()
+    return row.hot_score, row.trend_score
+
+
+async def test_cancellations_are_subtracted_once_by_the_refresh_job(client, user_headers):
+    cancelled_early = await _order(client, user_headers, ("B003", 2))
+    await _cancel(client, user_headers, cancelled_early)
+    counted = await _order(client, user_headers, ("B001", 2), ("B002", 1))
+    await _order(client, user_headers, ("B001", 1))
+
+    # Lần nạp đầu bỏ qua đơn đã hủy và dọn dòng hủy của nó
+    assert await _refresh() == 3
+    scores, pending = await _scores()
+    assert scores.keys() == {"B001", "B002"} and pending == 0
+    assert scores["B001"] > scores["B002"] > 0
+
+    # Hủy đơn đã được cộng: chỉ ghi log, điểm đổi ở lần chạy job sau
+    await _cancel(client, user_headers, counted)
+    assert await _scores() == (scores, 1)
+    await _refresh()
+    after, pending = await _scores()
+    assert pending == 0
+    assert after["B001"] == pytest.approx(scores["B001"] / 3, abs=0.01)
+    # Cộng rồi trừ cùng trọng số: sai số làm tròn được đưa về đúng 0
+    assert await _raw("B002") == (0.0, 0.0)
+
+    # Đơn mới bị hủy trước khi job kịp cộng: cộng và trừ trong cùng một lần chạy
+    late = await _order(client, user_headers, ("B004", 3))
+    await _cancel(client, user_headers, late)
+    await _refresh()
+    final, pending = await _scores()
+    assert pending == 0
+    assert await _raw("B004") == (0.0, 0.0)
+    assert final["B001"] == pytest.approx(after["B001"], abs=0.001)